@@ -9,8 +9,21 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LittLemon.settings')
+os.environ.setdefault('LITTLELEMON_ASYNC_READ_VIEWS', '1')
+# Connections belong to the thread that opened them; under ASGI requests run on many threads and
+# connections kept open past the request would pile up instead of being reused.
+os.environ.setdefault('LITTLELEMON_SQLITE_CONN_MAX_AGE', '0')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from LittleLemonAPI.streaming import EventStreamApplication
+from LittleLemonAPI.warmup import warm_up
+
+application = EventStreamApplication(django_application)
+
+if settings.WARMUP:
+    warm_up()
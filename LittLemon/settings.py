@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'LittleLemonAPI.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +52,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'LittleLemonAPI.middleware.PrimaryAfterWriteMiddleware',
 ]
 
 ROOT_URLCONF = 'LittLemon.urls'
@@ -76,13 +79,49 @@ WSGI_APPLICATION = 'LittLemon.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# SQLite connection profile shared by every alias; each value can be overridden with the
+# LITTLELEMON_SQLITE_<NAME> environment variable (e.g. LITTLELEMON_SQLITE_SYNCHRONOUS=FULL).
+# Connections are kept open between requests under WSGI only; asgi.py sets CONN_MAX_AGE to 0.
+SQLITE_PROFILE = {
+    'CONN_MAX_AGE': int(os.environ.get('LITTLELEMON_SQLITE_CONN_MAX_AGE', 600)),
+    'JOURNAL_MODE': os.environ.get('LITTLELEMON_SQLITE_JOURNAL_MODE', 'WAL'),
+    'SYNCHRONOUS': os.environ.get('LITTLELEMON_SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'MMAP_SIZE': int(os.environ.get('LITTLELEMON_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'CACHE_SIZE': int(os.environ.get('LITTLELEMON_SQLITE_CACHE_SIZE', -64 * 1024)),
+    'BUSY_TIMEOUT': float(os.environ.get('LITTLELEMON_SQLITE_BUSY_TIMEOUT', 20)),
+    # IMMEDIATE takes the write lock when a transaction starts instead of failing with
+    # "database is locked" when a read turns into a write while another writer is active.
+    'TRANSACTION_MODE': os.environ.get('LITTLELEMON_SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+}
+
+def sqlite_database(name, **extra):
+    return {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': SQLITE_PROFILE['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': SQLITE_PROFILE['BUSY_TIMEOUT'],
+            'transaction_mode': SQLITE_PROFILE['TRANSACTION_MODE'],
+            'init_command': (
+                f"PRAGMA journal_mode={SQLITE_PROFILE['JOURNAL_MODE']}; PRAGMA synchronous={SQLITE_PROFILE['SYNCHRONOUS']}; "
+                f"PRAGMA mmap_size={SQLITE_PROFILE['MMAP_SIZE']}; PRAGMA cache_size={SQLITE_PROFILE['CACHE_SIZE']}"
+            ),
+        },
+        **extra,
     }
+
+DATABASES = {
+    'default': sqlite_database(os.environ.get('LITTLELEMON_DATABASE', BASE_DIR / 'db.sqlite3')),
 }
 
+# Read replica: a copy of the primary kept current by `manage.py sync_replica`. Menu, category
+# and order listings read from it (see LittleLemonAPI/routers.py); everything else uses default.
+if os.environ.get('LITTLELEMON_REPLICA_DATABASE'):
+    DATABASES['replica'] = sqlite_database(os.environ['LITTLELEMON_REPLICA_DATABASE'], TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['LittleLemonAPI.routers.ReadReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -129,26 +168,99 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 2,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
-        'rest_framework_xml.renderers.XMLRenderer', 
+        'LittleLemonAPI.renderers.ORJSONRenderer',
+        'LittleLemonAPI.renderers.LazyBrowsableAPIRenderer',
+        'LittleLemonAPI.renderers.LazyXMLRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'LittleLemonAPI.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_FILTER_BACKENDS': [
        'rest_framework.filters.SearchFilter',
        'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-       'rest_framework.authentication.TokenAuthentication',
-       'rest_framework.authentication.SessionAuthentication',
+       'LittleLemonAPI.authentication.CachedTokenAuthentication',
+       'LittleLemonAPI.authentication.CachedSessionAuthentication',
     ),
     'DEFAULT_THROTTLE_CLASSES': (
-       'rest_framework.throttling.AnonRateThrottle',
-       'rest_framework.throttling.UserRateThrottle',
+       'LittleLemonAPI.throttling.RoleRateThrottle',
     ),
     'DEFAULT_THROTTLE_RATES': {
        'anon':'2/minute',
-       'user':'5/minute'
+       'customer':'5/minute',
+       'deliver_crew':'10/minute',
+       'manager':'20/minute'
     }
 }
 
-APPEND_SLASH = False
\ No newline at end of file
+APPEND_SLASH = False
+# Seconds a user's resolved group names are cached between requests
+ROLE_CACHE_TIMEOUT = 300
+
+# Seconds a rendered menu catalog page stays cached for a given catalog version
+CATALOG_CACHE_TIMEOUT = 3600
+
+# Serve the read-heavy GET endpoints with async views; asgi.py turns this on
+ASYNC_READ_VIEWS = os.environ.get('LITTLELEMON_ASYNC_READ_VIEWS') == '1'
+
+# Resolved token/session credentials kept per worker: maximum entries and seconds each one lives
+AUTH_CACHE_SIZE = 1024
+AUTH_CACHE_TIMEOUT = 60
+
+# SQLite file holding the throttle counters shared by every worker process
+THROTTLE_DATABASE = os.environ.get('LITTLELEMON_THROTTLE_DATABASE', BASE_DIR / 'throttle.sqlite3')
+
+# Report the SQL queries of every request in an X-Query-Count header (load tests)
+QUERY_COUNT_HEADER = os.environ.get('LITTLELEMON_QUERY_COUNT_HEADER') == '1'
+
+# LITTLELEMON_THROTTLING=0 drops the rate limits, e.g. for a server under `manage.py loadtest`
+if os.environ.get('LITTLELEMON_THROTTLING') == '0':
+    REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {}
+
+# SQLite file the per-route request metrics of every worker process are summed in, and how often (seconds) a worker writes its totals there
+METRICS_DATABASE = os.environ.get('LITTLELEMON_METRICS_DATABASE', BASE_DIR / 'metrics.sqlite3')
+METRICS_FLUSH_INTERVAL = 1
+
+# Seconds a user keeps reading from the primary after a write of theirs (everyone, after a
+# menu change), so listings never show data older than the writes; keep above the sync_replica interval
+REPLICA_LAG = 5
+
+# Order event streams (ASGI only): seconds between keep-alive comments on an idle stream, and
+# events a slow client may fall behind before its stream is closed (the browser reconnects)
+ORDER_EVENTS_HEARTBEAT = 15
+ORDER_EVENTS_QUEUE_SIZE = 100
+# SQLite file order events pass through between processes (web workers, assign_orders), and how often
+# (seconds) a process with open streams looks there for events published by the others
+ORDER_EVENTS_DATABASE = os.environ.get('LITTLELEMON_ORDER_EVENTS_DATABASE', BASE_DIR / 'order_events.sqlite3')
+ORDER_EVENTS_POLL_INTERVAL = 0.1
+
+# Background jobs (`manage.py run_jobs`): the SQLite file the queue lives in, seconds an idle worker
+# waits between polls, seconds a claimed job may run before it is handed to another worker, and
+# attempts per job with the delay before the first retry (doubling after each, up to JOBS_MAX_BACKOFF)
+JOBS_DATABASE = os.environ.get('LITTLELEMON_JOBS_DATABASE', BASE_DIR / 'jobs.sqlite3')
+JOBS_POLL_INTERVAL = 0.5
+JOBS_LEASE = 300
+JOBS_MAX_ATTEMPTS = 5
+JOBS_BACKOFF = 2
+JOBS_MAX_BACKOFF = 300
+
+# Order receipts and delivery notices are sent by the job workers
+EMAIL_BACKEND = os.environ.get('LITTLELEMON_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+
+# Warm up each WSGI/ASGI worker (URLs, serializers, role groups, catalog queries, caches) before it
+# serves its first request; LITTLELEMON_WARMUP=0 turns it off
+WARMUP = os.environ.get('LITTLELEMON_WARMUP', '1') != '0'
+
+# The cache every worker process shares: resolved roles and role groups, menu catalog pages and
+# their version, replica read markers. A SQLite file like the throttle counters; with workers on
+# more than one machine, point it at Redis or Memcached instead
+CACHES = {
+    'default': {
+        'BACKEND': 'LittleLemonAPI.cache.SQLiteCache',
+        'LOCATION': os.environ.get('LITTLELEMON_CACHE_DATABASE', BASE_DIR / 'cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
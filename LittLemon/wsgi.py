@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LittLemon.settings')
 
 application = get_wsgi_application()
+
+from LittleLemonAPI.warmup import warm_up
+
+# Under a server that loads the application before forking its workers (gunicorn --preload),
+# the workers share the warmed state copy-on-write.
+if settings.WARMUP:
+    warm_up()
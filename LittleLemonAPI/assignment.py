@@ -0,0 +1,86 @@
+import heapq
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+from .events import publish_order_change
+from .models import Order
+from .roles import DELIVER_CREW
+from . import rollups
+
+OPEN = '0'
+ASSIGNMENT_BATCH_SIZE = 100
+
+def unassigned(snapshot):
+    # The rollup buckets the given orders sat in before they had a deliver crew.
+    buckets = {}
+    for (day, status, crew), (orders, revenue) in snapshot[0].items():
+        bucket = buckets.setdefault((day, status, None), [0, Decimal(0)])
+        bucket[0] += orders
+        bucket[1] += revenue
+    return buckets, {}
+
+class AssignmentEngine:
+    # Keeps the number of open orders per deliver crew member in memory and hands each
+    # unassigned order to whoever has the fewest. The database stays the source of truth:
+    # an order is only taken if it is still unassigned, so concurrent engines never double-assign.
+    def __init__(self, batch_size=ASSIGNMENT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.refresh()
+
+    def refresh(self):
+        crew = list(User.objects.filter(groups__name=DELIVER_CREW, is_active=True).values_list('id', flat=True))
+        open_orders = dict(
+            Order.objects.filter(status=OPEN, deliver_crew__in=crew).values_list('deliver_crew').annotate(Count('id')).order_by()
+        )
+        self.loads = {member: open_orders.get(member, 0) for member in crew}
+        self.heap = [(load, member) for member, load in self.loads.items()]
+        heapq.heapify(self.heap)
+
+    def least_loaded(self):
+        # Heap entries go stale when a load changes; skip any that no longer match.
+        while True:
+            load, member = heapq.heappop(self.heap)
+            if self.loads.get(member) == load:
+                return member
+
+    def add_load(self, member, change):
+        self.loads[member] += change
+        heapq.heappush(self.heap, (self.loads[member], member))
+
+    def assign_batch(self):
+        return self._assign_batch()[1]
+
+    def _assign_batch(self):
+        # Returns how many unassigned orders were selected and how many of them this engine took.
+        if not self.loads:
+            return 0, 0
+        with transaction.atomic():
+            orders = list(
+                Order.objects.filter(status=OPEN, deliver_crew__isnull=True).order_by('date', 'id').values_list('id', 'customer')[:self.batch_size]
+            )
+            assigned = []
+            for order_id, customer_id in orders:
+                member = self.least_loaded()
+                if Order.objects.filter(pk=order_id, deliver_crew__isnull=True).update(deliver_crew=member):
+                    assigned.append(order_id)
+                    self.add_load(member, 1)
+                    # The order streams see this like an assignment made by a manager.
+                    publish_order_change(Order(pk=order_id, customer_id=customer_id, status=OPEN, deliver_crew_id=member), (OPEN, None))
+                else:
+                    heapq.heappush(self.heap, (self.loads[member], member))
+            if assigned:
+                after = rollups.snapshot(assigned)
+                rollups.apply(unassigned(after), after)
+        return len(orders), len(assigned)
+
+    def run(self):
+        # Assign until no unassigned open orders are left; returns how many were assigned.
+        # A short count of assigned orders only means another engine took some of the batch, so
+        # this stops once the batch comes back empty instead.
+        total = 0
+        while True:
+            selected, assigned = self._assign_batch()
+            total += assigned
+            if not selected:
+                return total
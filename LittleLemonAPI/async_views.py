@@ -0,0 +1,162 @@
+import asyncio
+from asgiref.sync import sync_to_async, markcoroutinefunction
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import Http404, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework import status
+from .catalog import acached_catalog_response
+from .events import order_events, user_key
+from .models import MenuItem, Category, Cart, Order
+from .renderers import ORJSONRenderer, EventStreamRenderer
+from .pagination import use_cursor_pagination, AsyncPageNumberPagination
+from .roles import aget_roles, MANAGER, DELIVER_CREW
+from .routers import reads_from_replica
+from .fast_serializers import menu_item_values, menu_item_list_data, CART_VALUES, cart_list_data
+from .serializers import MenuItemSerializer, CategorySerializer, CurrentUserSerializer, OrderSerializer
+from . import views
+
+class AsyncAPIView(APIView):
+    # DRF dispatch is synchronous: authentication, permissions and throttles
+    # run in one thread hop, then the handler awaits the async ORM.
+    # Long-lived responses turn thread_sensitive off, or the request would keep
+    # a thread of its own for as long as it is open.
+    thread_sensitive = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial, thread_sensitive=self.thread_sensitive)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+def async_reads(sync_view, async_view):
+    # One URL, two implementations: GET/HEAD go to the async view, writes stay on the sync one.
+    sync_view = sync_to_async(sync_view)
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await sync_view(request, *args, **kwargs)
+    return csrf_exempt(markcoroutinefunction(view))
+
+class MenuItemsView(AsyncAPIView):
+    permission_classes = [AllowAny]
+    async def get(self, request):
+        return await acached_catalog_response(request, 'menu-items', lambda: self.menu_items_page(request))
+    @reads_from_replica('catalog')
+    async def menu_items_page(self, request):
+        if use_cursor_pagination(request):
+            return await sync_to_async(views.menu_items_page)(request)
+        paginator = AsyncPageNumberPagination()
+        paginator.page_size = request.query_params.get('per_page', default=2)
+        result_page = await paginator.apaginate_queryset(menu_item_values(views.menu_items_queryset(request)), request)
+        return paginator.get_paginated_response(menu_item_list_data(result_page))
+
+class MenuItemsCategoryView(AsyncAPIView):
+    async def get(self, request):
+        return await acached_catalog_response(request, 'categories', self.list_categories)
+    @reads_from_replica('catalog')
+    async def list_categories(self):
+        categories = [category async for category in Category.objects.all()]
+        if categories:
+            return Response(CategorySerializer(categories, many=True).data)
+        else:
+            return Response({ "message" : "There are no categories" }, status=status.HTTP_404_NOT_FOUND)
+
+class MenuItemsSingleCategoryView(AsyncAPIView):
+    async def get(self, request, pk):
+        return await acached_catalog_response(request, f'categories/{pk}', lambda: self.list_items(pk))
+    @reads_from_replica('catalog')
+    async def list_items(self, pk):
+        if await Category.objects.filter(id=pk).aexists():
+            items = [item async for item in MenuItem.objects.select_related('category').filter(category=pk)]
+            if not items:
+                raise Http404('No MenuItem matches the given query.')
+            return Response(MenuItemSerializer(items, many=True).data)
+        else:
+            return Response({ "message" : "Category does not exist" }, status=status.HTTP_404_NOT_FOUND)
+
+class CartView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+    async def get(self, request):
+        cart = [line async for line in Cart.objects.filter(user=request.user).values(*CART_VALUES)]
+        return Response(cart_list_data(cart))
+
+class OrdersView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+    async def get(self, request):
+        roles = await aget_roles(request)
+        if MANAGER in roles:
+            queryset = views.filter_orders(request, Order.objects.all())
+        elif DELIVER_CREW in roles:
+            queryset = Order.objects.filter(deliver_crew=request.user)
+        else:
+            queryset = Order.objects.filter(customer=request.user)
+        # The order rows and their lines are two queries; run both in one thread hop.
+        return await sync_to_async(views.OrdersView().list_orders)(request, queryset, deliver_crew_view=DELIVER_CREW in roles and MANAGER not in roles)
+
+class OrderView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+    async def get(self, request, pk):
+        queryset = Order.objects.with_items()
+        if MANAGER not in await aget_roles(request):
+            queryset = queryset.filter(customer=request.user)
+        order = await queryset.filter(pk=pk).afirst()
+        if order is not None:
+            return Response(OrderSerializer(order).data)
+        else:
+            return Response({ "message" : "Order does not exist" }, status=status.HTTP_404_NOT_FOUND)
+
+class CurrentUserView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+    async def get(self, request):
+        return Response(CurrentUserSerializer(request.user).data)
+
+class OrderEventsView(AsyncAPIView):
+    # Server-sent events: status and deliver crew changes of the user's orders, as a customer or
+    # as their deliver crew, instead of polling orders/<int:pk>. Served by streaming.EventStreamApplication.
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer, EventStreamRenderer]
+    thread_sensitive = False
+    RETRY = 3000
+
+    def initial(self, request, *args, **kwargs):
+        # Runs in a shared executor thread, outside the request's connection handling.
+        close_old_connections()
+        try:
+            super().initial(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+    async def get(self, request):
+        response = StreamingHttpResponse(self.stream(user_key(request.user.pk)), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, key):
+        subscription = order_events.subscribe(key)
+        try:
+            yield b'retry: %d\n\n' % self.RETRY
+            while not subscription.overflowed:
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), settings.ORDER_EVENTS_HEARTBEAT)
+                except TimeoutError:
+                    # Keeps proxies from closing an idle connection; EventSource ignores comments.
+                    yield b': keep-alive\n\n'
+        finally:
+            order_events.unsubscribe(subscription)
@@ -0,0 +1,119 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user, user_logged_out
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication, SessionAuthentication
+from rest_framework.authtoken.models import Token
+
+def _revoked_key(key):
+    return 'littlelemon:credentials:revoked:%s:%s' % key
+
+class CredentialCache:
+    # Bounded LRU of credential -> (user, token) kept by each worker, each entry living at most `timeout`
+    # seconds. Revocations are marked in the shared cache and checked on every hit, so a deleted token,
+    # a logout or a changed user stops authenticating on all workers at once. Roles are not kept here:
+    # they come from the shared cache as well.
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        revoked = cache.get_many([_revoked_key(key), _revoked_key(('user', entry[2].pk))])
+        if any(revoked_at >= entry[1] for revoked_at in revoked.values()):
+            self.delete(key)
+            return None
+        return entry[2:]
+
+    def set(self, key, user, token, resolved_at):
+        # resolved_at: when the credential was looked up, taken before reading the database.
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, resolved_at, user, token)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def revoke(self, *keys):
+        # Keys are credentials or ('user', pk). Marked again once the change commits, for entries
+        # other workers resolved from the database before it did.
+        def mark():
+            cache.set_many({_revoked_key(key): time.time() for key in keys}, self.timeout)
+        mark()
+        transaction.on_commit(mark)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+credential_cache = CredentialCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TIMEOUT)
+
+def _resolved(entry):
+    # Each request gets its own copy of the cached user.
+    user, token = entry
+    return (copy.copy(user), token)
+
+def _remember(key, user, token, resolved_at):
+    credential_cache.set(key, user, token, resolved_at)
+    return _resolved((user, token))
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        entry = credential_cache.get(('token', key))
+        if entry is not None:
+            return _resolved(entry)
+        resolved_at = time.time()
+        user, token = super().authenticate_credentials(key)
+        return _remember(('token', key), user, token, resolved_at)
+
+class CachedSessionAuthentication(SessionAuthentication):
+    def authenticate(self, request):
+        session_key = request._request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not session_key:
+            return None
+        entry = credential_cache.get(('session', session_key))
+        if entry is not None:
+            self.enforce_csrf(request)
+            return _resolved(entry)
+        resolved_at = time.time()
+        user = get_user(request._request)
+        if not user or not user.is_active:
+            return None
+        self.enforce_csrf(request)
+        return _remember(('session', session_key), user, None, resolved_at)
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    credential_cache.revoke(('token', instance.key))
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Covers password changes and deactivation. QuerySet.update() sends no signal: code changing users
+    # that way calls credential_cache.revoke(('user', pk)) for each of them.
+    credential_cache.revoke(('user', instance.pk))
+
+@receiver(user_logged_out)
+def user_logged_out_handler(sender, request, user, **kwargs):
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        credential_cache.revoke(('session', session_key))
@@ -0,0 +1,158 @@
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Django makes a backend instance per thread and per async context; the connections live per
+# thread instead, so a request does not open the file again.
+local = threading.local()
+
+def encode(value):
+    # Integers are stored as such so incr() is one UPDATE; bool is an int too but must come back as bool.
+    if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+def decode(value):
+    return value if isinstance(value, int) else pickle.loads(value)
+
+class SQLiteCache(BaseCache):
+    # A cache every worker process on the machine shares: one row per key in a SQLite file (LOCATION),
+    # like the throttle counters. Expired rows are skipped on read and dropped now and then on write,
+    # along with the oldest writes once more than MAX_ENTRIES can expire. Entries set without a
+    # timeout, such as the catalog version, are only ever removed explicitly.
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = str(location)
+
+    @property
+    def connection(self):
+        connections = getattr(local, 'connections', None)
+        if connections is None or local.pid != os.getpid():
+            connections = local.connections = {}
+            local.pid = os.getpid()
+        connection = connections.get(self.path)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # What a power loss takes with it is only cache misses.
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache_entry (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)')
+            connections[self.path] = connection
+        return connection
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection.execute(
+            'SELECT value FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone()
+        return default if row is None else decode(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        rows = self.connection.execute(
+            f"SELECT key, value FROM cache_entry WHERE key IN ({', '.join('?' * len(keys))}) AND (expires IS NULL OR expires > ?)",
+            (*keys, time.time()),
+        )
+        return {keys[key]: decode(value) for key, value in rows}
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.connection.execute(
+            'SELECT 1 FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone() is not None
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [(self.make_and_validate_key(key, version=version), encode(value), expires) for key, value in data.items()]
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            # REPLACE gives the row a new rowid, which is what culling goes by.
+            connection.executemany('INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)', rows)
+            if random.random() < 0.01:
+                self.cull(connection)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self.connection.execute(
+            'INSERT INTO cache_entry (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache_entry.expires IS NOT NULL AND cache_entry.expires <= ?',
+            (key, encode(value), self.get_backend_timeout(timeout), time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self.connection.execute(
+            'UPDATE cache_entry SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        # One statement, so concurrent increments from different workers all count.
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection.execute(
+            "UPDATE cache_entry SET value = value + ? WHERE key = ? AND typeof(value) = 'integer' "
+            'AND (expires IS NULL OR expires > ?) RETURNING value',
+            (delta, key, time.time()),
+        ).fetchone()
+        if row is None:
+            raise ValueError("Key '%s' not found" % key)
+        return row[0]
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection.execute('DELETE FROM cache_entry WHERE key = ? RETURNING expires', (key,)).fetchone()
+        return row is not None and (row[0] is None or row[0] > time.time())
+
+    def delete_many(self, keys, version=None):
+        keys = [(self.make_and_validate_key(key, version=version),) for key in keys]
+        if keys:
+            self.connection.executemany('DELETE FROM cache_entry WHERE key = ?', keys)
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache_entry')
+
+    def cull(self, connection):
+        connection.execute('DELETE FROM cache_entry WHERE expires <= ?', (time.time(),))
+        count = connection.execute('SELECT COUNT(*) FROM cache_entry WHERE expires IS NOT NULL').fetchone()[0]
+        if count > self._max_entries:
+            # CULL_FREQUENCY 0 culls them all, as with Django's own backends.
+            limit = count // self._cull_frequency if self._cull_frequency else count
+            connection.execute(
+                'DELETE FROM cache_entry WHERE rowid IN (SELECT rowid FROM cache_entry WHERE expires IS NOT NULL ORDER BY rowid LIMIT ?)', (limit,)
+            )
+
+    # Each call is a short statement on a local file: cheaper to run on the event loop than to hand
+    # to the thread BaseCache's async methods would send it to.
+
+    async def aget(self, key, default=None, version=None):
+        return self.get(key, default, version)
+
+    async def aget_many(self, keys, version=None):
+        return self.get_many(keys, version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.set(key, value, timeout, version)
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.add(key, value, timeout, version)
+
+    async def adelete(self, key, version=None):
+        return self.delete(key, version)
@@ -0,0 +1,99 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, urlencode
+from rest_framework import status
+from rest_framework.response import Response
+from .routers import wrote_primary
+
+CATALOG_VERSION_KEY = 'littlelemon:catalog:version'
+CATALOG_PARAMS = {
+    'category': None,
+    'to_price': None,
+    'search': None,
+    'ordering': None,
+    'per_page': '2',
+    'page': '1',
+    'pagination': None,
+    'cursor': None,
+}
+
+def get_catalog_version():
+    # One number in the shared cache for every worker, so a bump reaches them all and a page has
+    # the same ETag whichever worker serves it.
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so an evicted version never reuses an older number.
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+async def aget_catalog_version():
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return version
+
+def bump_catalog_version():
+    wrote_primary('catalog')
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+def catalog_cache_key(request, name, version):
+    # Pages hold absolute next/previous links built from the scheme, host, path and every query
+    # parameter, so all of them are part of the key; the catalog's own parameters with their defaults filled in.
+    params = []
+    for param, default in CATALOG_PARAMS.items():
+        value = request.query_params.get(param, default)
+        if value is not None:
+            params.append((param, value.strip()))
+    params += sorted((param, value) for param, values in request.query_params.lists() if param not in CATALOG_PARAMS for value in values)
+    digest = hashlib.md5(f'{request.build_absolute_uri(request.path)}:{name}?{urlencode(params)}'.encode()).hexdigest()
+    return f'littlelemon:catalog:{version}:{digest}'
+
+def catalog_etag(request, key):
+    return '"%s"' % hashlib.sha1(f'{key}:{request.accepted_renderer.format}'.encode()).hexdigest()
+
+def is_not_modified(request, etag):
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    return etag in if_none_match or '*' in if_none_match
+
+def tag_catalog_response(response, etag):
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+def cached_catalog_response(request, name, build_response):
+    key = catalog_cache_key(request, name, get_catalog_version())
+    etag = catalog_etag(request, key)
+    if is_not_modified(request, etag):
+        return tag_catalog_response(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+    data = cache.get(key)
+    if data is None:
+        response = build_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+    else:
+        response = Response(data)
+    return tag_catalog_response(response, etag)
+
+async def acached_catalog_response(request, name, build_response):
+    key = catalog_cache_key(request, name, await aget_catalog_version())
+    etag = catalog_etag(request, key)
+    if is_not_modified(request, etag):
+        return tag_catalog_response(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+    data = await cache.aget(key)
+    if data is None:
+        response = await build_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        await cache.aset(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+    else:
+        response = Response(data)
+    return tag_catalog_response(response, etag)
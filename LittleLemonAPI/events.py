@@ -0,0 +1,142 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+import orjson
+from django.conf import settings
+from django.db import transaction
+
+class Subscription:
+    __slots__ = ('loop', 'queue', 'keys', 'overflowed')
+
+    def __init__(self, keys, size):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(size)
+        self.keys = keys
+        self.overflowed = False
+
+    def offer(self, event):
+        # Runs on the subscriber's loop. A client this far behind is dropped and reconnects.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+# Seconds an event is kept in the shared file; relays read it within ORDER_EVENTS_POLL_INTERVAL.
+RETENTION = 60
+
+class OrderEventBroker:
+    # Fans order changes out to the event streams open in this process. Orders are updated in
+    # request threads while streams wait on the event loop, so events cross over with
+    # call_soon_threadsafe. An idle stream costs one queue and a suspended coroutine.
+    # Every event is also written to a SQLite file shared by all processes (the web workers and
+    # assign_orders), where a relay thread in each process with streams picks up the others' events.
+    # Without a path the broker uses settings.ORDER_EVENTS_DATABASE, looked up on every use.
+    def __init__(self, queue_size, path=None):
+        self.queue_size = queue_size
+        self.path = path
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.relay_pid = None
+
+    @property
+    def connection(self):
+        path = str(self.path or settings.ORDER_EVENTS_DATABASE)
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid() or self.local.path != path:
+            connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            # AUTOINCREMENT: ids are never reused, so a relay's last seen id stays meaningful after pruning.
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS order_event ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, origin INTEGER NOT NULL, keys TEXT NOT NULL, '
+                'event TEXT NOT NULL, data BLOB NOT NULL, created REAL NOT NULL)'
+            )
+            self.local.connection, self.local.pid, self.local.path = connection, os.getpid(), path
+        return connection
+
+    def subscribe(self, *keys):
+        subscription = Subscription(keys, self.queue_size)
+        with self.lock:
+            # Threads do not survive a fork, so each process starts its own relay, with its first stream.
+            if self.relay_pid != os.getpid():
+                self.relay_pid = os.getpid()
+                last = self.connection.execute('SELECT COALESCE(MAX(id), 0) FROM order_event').fetchone()[0]
+                threading.Thread(target=self.relay, args=(self.relay_pid, last), daemon=True).start()
+            for key in keys:
+                self.subscribers.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for key in subscription.keys:
+                subscribers = self.subscribers.get(key)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscribers[key]
+
+    def publish(self, keys, event, data):
+        data = orjson.dumps(data)
+        connection = self.connection
+        event_id = connection.execute(
+            'INSERT INTO order_event (origin, keys, event, data, created) VALUES (?, ?, ?, ?, ?) RETURNING id',
+            (os.getpid(), '\n'.join(keys), event, data, time.time()),
+        ).fetchone()[0]
+        if random.random() < 0.01:
+            connection.execute('DELETE FROM order_event WHERE created < ?', (time.time() - RETENTION,))
+        return self.deliver(keys, event_id, event, data)
+
+    def relay(self, pid, last):
+        # Delivers the events other processes published after `last`, the newest when this one started relaying.
+        while self.relay_pid == pid:
+            try:
+                rows = self.connection.execute(
+                    'SELECT id, origin, keys, event, data FROM order_event WHERE id > ? ORDER BY id', (last,)
+                ).fetchall()
+            except sqlite3.Error:
+                rows = []
+            for event_id, origin, keys, event, data in rows:
+                if origin != pid:
+                    self.deliver(keys.split('\n'), event_id, event, data)
+                last = event_id
+            time.sleep(settings.ORDER_EVENTS_POLL_INTERVAL)
+
+    def deliver(self, keys, event_id, event, data):
+        # Encoded once, whatever the number of streams it goes to.
+        message = b'id: %d\nevent: %s\ndata: %s\n\n' % (event_id, event.encode(), data)
+        with self.lock:
+            subscriptions = {subscription for key in keys for subscription in self.subscribers.get(key, ())}
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                # The loop has shut down; its streams are gone.
+                pass
+        return len(subscriptions)
+
+    def connections(self):
+        with self.lock:
+            return len({subscription for subscribers in self.subscribers.values() for subscription in subscribers})
+
+order_events = OrderEventBroker(settings.ORDER_EVENTS_QUEUE_SIZE)
+
+def user_key(user_id):
+    return f'user:{user_id}'
+
+def order_state(order):
+    return (order.status, order.deliver_crew_id)
+
+def publish_order_change(order, previous):
+    # Called by the order update serializers with order_state() from before the update. Once the
+    # transaction commits, the customer and the deliver crew (the previous one too, when it
+    # changed) get the new status and crew.
+    if order_state(order) == previous:
+        return
+    keys = {user_key(user_id) for user_id in (order.customer_id, order.deliver_crew_id, previous[1]) if user_id is not None}
+    data = {'order': order.pk, 'status': order.status, 'deliver_crew': order.deliver_crew_id}
+    transaction.on_commit(lambda: order_events.publish(keys, 'order', data))
@@ -0,0 +1,63 @@
+import csv
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+from .menu_import import MENU_FIELDS
+from .models import MenuItem
+from .serializers import OrderSerializer
+
+EXPORT_CHUNK_SIZE = 500
+ORDER_CSV_HEADER = ['order_id', 'date', 'status', 'total', 'customer', 'customer_email', 'deliver_crew', 'item', 'price', 'quantity']
+
+class Echo:
+    def write(self, value):
+        return value
+
+def iter_orders(queryset):
+    # Each chunk is fetched and prefetched on its own, so only one chunk is held in memory.
+    for order in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield OrderSerializer(order).data
+
+def ndjson_rows(queryset):
+    encoder = JSONEncoder()
+    for data in iter_orders(queryset):
+        yield encoder.encode(data) + '\n'
+
+def csv_rows(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_CSV_HEADER)
+    for data in iter_orders(queryset):
+        customer = data['customer'] or {}
+        deliver_crew = data['deliver_crew'] or {}
+        order = [data['id'], data['date'], data['status'], data['total'], customer.get('first_name'), customer.get('email'), deliver_crew.get('email')]
+        if not data['items']:
+            yield writer.writerow(order + [None, None, None])
+        for line in data['items']:
+            yield writer.writerow(order + [line['item']['title'], line['item']['price'], line['quantity']])
+
+def stream_orders(queryset, export_format):
+    if export_format == 'csv':
+        response = StreamingHttpResponse(csv_rows(queryset), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="orders.csv"'
+    else:
+        response = StreamingHttpResponse(ndjson_rows(queryset), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="orders.ndjson"'
+    return response
+
+def menu_rows():
+    rows = MenuItem.objects.order_by('id').values_list('id', 'title', 'price', 'category__name', 'featured')
+    for item_id, title, price, category, featured in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [item_id, title, str(price), category, featured]
+
+def menu_csv_rows():
+    writer = csv.writer(Echo())
+    yield writer.writerow(MENU_FIELDS)
+    for row in menu_rows():
+        yield writer.writerow(row)
+
+def menu_items_export():
+    return [dict(zip(MENU_FIELDS, row)) for row in menu_rows()]
+
+def stream_menu_csv():
+    response = StreamingHttpResponse(menu_csv_rows(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="menu.csv"'
+    return response
@@ -0,0 +1,86 @@
+import decimal
+from django.db.models import QuerySet
+from django.utils import timezone
+from .models import OrderLine
+
+# Read-only counterparts of MenuItemSerializer, CartSerializer, OrderSerializer and
+# OrderDeliverCrewSerializer. They build the same data straight from .values() rows,
+# without model instances or DRF fields; tests and `manage.py bench_serialization`
+# check that both render to the same bytes.
+
+MONEY = decimal.Decimal('0.01')
+MONEY_CONTEXT = decimal.Context(prec=6)
+
+MENU_ITEM_VALUES = ('id', 'title', 'price', 'category_id', 'category__name', 'featured')
+CART_VALUES = ('item_id', 'item__title', 'item__price', 'quantity', 'itemprice')
+ORDER_VALUES = (
+    'id', 'customer__first_name', 'customer__email', 'deliver_crew_id', 'deliver_crew__first_name',
+    'deliver_crew__email', 'total', 'date', 'status',
+)
+
+def money(value):
+    # DecimalField(max_digits=6, decimal_places=2) as DRF renders it.
+    return f'{value.quantize(MONEY, context=MONEY_CONTEXT):f}'
+
+def datetime_string(value):
+    # DateTimeField in DRF's default ISO 8601 format.
+    if not value:
+        return None
+    value = value.astimezone(timezone.get_current_timezone()).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+def menu_item_values(queryset):
+    # Keeps any .extra() select (the search rank) so its ordering still applies.
+    return queryset.values(*MENU_ITEM_VALUES, *queryset.query.extra)
+
+def menu_item_list_data(rows):
+    return [
+        {
+            'id': row['id'],
+            'title': row['title'],
+            'price': money(row['price']),
+            'category': {'id': row['category_id'], 'name': row['category__name']},
+            'featured': row['featured'],
+        }
+        for row in rows
+    ]
+
+def cart_list_data(rows):
+    return [
+        {
+            'item': {'id': row['item_id'], 'title': row['item__title'], 'price': money(row['item__price'])},
+            'quantity': row['quantity'],
+            'itemprice': money(row['itemprice']),
+        }
+        for row in rows
+    ]
+
+def order_values(queryset):
+    return queryset.prefetch_related(None).values(*ORDER_VALUES)
+
+def order_list_data(orders, deliver_crew_view=False):
+    # `orders` is an Order queryset or a page of order_values() rows; either way the lines take one more query.
+    if isinstance(orders, QuerySet):
+        lines = OrderLine.objects.filter(order__in=orders.values('id'))
+        orders = list(order_values(orders))
+    else:
+        lines = OrderLine.objects.filter(order__in=[row['id'] for row in orders])
+    items = {}
+    for order_id, title, price, quantity in lines.order_by('order', 'id').values_list('order_id', 'title', 'price', 'quantity'):
+        items.setdefault(order_id, []).append({'item': {'title': title, 'price': money(price)}, 'quantity': quantity})
+    data = []
+    for row in orders:
+        order = {'id': row['id'], 'customer': {'first_name': row['customer__first_name'], 'email': row['customer__email']}}
+        if not deliver_crew_view:
+            order['deliver_crew'] = None if row['deliver_crew_id'] is None else {
+                'first_name': row['deliver_crew__first_name'],
+                'email': row['deliver_crew__email'],
+            }
+        order['items'] = items.get(row['id'], [])
+        order['total'] = money(row['total'])
+        order['date'] = datetime_string(row['date'])
+        order['status'] = str(row['status'])
+        data.append(order)
+    return data
@@ -0,0 +1,226 @@
+import json
+import multiprocessing
+import os
+import random
+import signal
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from collections import namedtuple
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import close_old_connections, connections, transaction
+from .models import Order
+
+# name -> function; a job runs as JOBS[name](**payload).
+JOBS = {}
+
+Job = namedtuple('Job', 'id name payload attempts max_attempts')
+
+def register(name):
+    def decorator(func):
+        JOBS[name] = func
+        return func
+    return decorator
+
+class JobQueue:
+    # Durable queue in a small SQLite file shared by the web and worker processes. A job is claimed
+    # by pushing its run_at a lease into the future, so the jobs of a worker that dies mid-run come
+    # back on their own once the lease runs out. Delivery is at least once: jobs must be safe to repeat.
+    # Without a path the queue is settings.JOBS_DATABASE, looked up on every use (override_settings in tests).
+    def __init__(self, path=None):
+        self.path = path
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        path = str(self.path or settings.JOBS_DATABASE)
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid() or self.local.path != path:
+            connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Unlike throttle counters, an accepted job must survive a power loss.
+            connection.execute('PRAGMA synchronous=FULL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS job ('
+                'id INTEGER PRIMARY KEY, name TEXT NOT NULL, payload TEXT NOT NULL, '
+                "state TEXT NOT NULL DEFAULT 'queued', run_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                'max_attempts INTEGER NOT NULL, worker TEXT, last_error TEXT, created_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS job_ready ON job (state, run_at)')
+            self.local.connection, self.local.pid, self.local.path = connection, os.getpid(), path
+        return connection
+
+    def enqueue(self, name, delay=0, max_attempts=None, **payload):
+        now = time.time()
+        cursor = self.connection.execute(
+            'INSERT INTO job (name, payload, run_at, max_attempts, created_at) VALUES (?, ?, ?, ?, ?)',
+            (name, json.dumps(payload), now + delay, max_attempts or settings.JOBS_MAX_ATTEMPTS, now),
+        )
+        return cursor.lastrowid
+
+    def enqueue_many(self, jobs):
+        # (name, payload) pairs in one transaction.
+        now = time.time()
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO job (name, payload, run_at, max_attempts, created_at) VALUES (?, ?, ?, ?, ?)',
+                [(name, json.dumps(payload), now, settings.JOBS_MAX_ATTEMPTS, now) for name, payload in jobs],
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def claim(self, worker, limit, lease):
+        now = time.time()
+        rows = self.connection.execute(
+            'UPDATE job SET run_at = ?, worker = ?, attempts = attempts + 1 WHERE id IN ('
+            "SELECT id FROM job WHERE state = 'queued' AND run_at <= ? ORDER BY run_at LIMIT ?"
+            ') RETURNING id, name, payload, attempts, max_attempts',
+            (now + lease, worker, now, limit),
+        ).fetchall()
+        return [Job(job_id, name, json.loads(payload), attempts, max_attempts) for job_id, name, payload, attempts, max_attempts in rows]
+
+    def complete(self, job):
+        self.connection.execute('DELETE FROM job WHERE id = ?', (job.id,))
+
+    def fail(self, job, error):
+        # Kept for inspection rather than deleted.
+        self.connection.execute("UPDATE job SET state = 'failed', worker = NULL, last_error = ? WHERE id = ?", (error, job.id))
+
+    def retry(self, job, error):
+        # Exponential backoff with jitter, until the job is out of attempts.
+        if job.attempts >= job.max_attempts:
+            return self.fail(job, error)
+        delay = min(settings.JOBS_BACKOFF * 2 ** (job.attempts - 1), settings.JOBS_MAX_BACKOFF)
+        self.connection.execute(
+            'UPDATE job SET run_at = ?, worker = NULL, last_error = ? WHERE id = ?',
+            (time.time() + delay * random.uniform(0.5, 1), error, job.id),
+        )
+
+    def counts(self):
+        # {'queued': n, 'running': n, 'failed': n}; running means claimed and within its lease.
+        now = time.time()
+        counts = {'queued': 0, 'running': 0, 'failed': 0}
+        for state, running, count in self.connection.execute(
+            'SELECT state, worker IS NOT NULL AND run_at > ?, COUNT(*) FROM job GROUP BY 1, 2', (now,)
+        ):
+            counts['running' if state == 'queued' and running else state] += count
+        return counts
+
+    def reset(self):
+        self.connection.execute('DELETE FROM job')
+
+job_queue = JobQueue()
+
+def enqueue_on_commit(name, **payload):
+    # Jobs only exist for data that was committed; without a transaction this enqueues at once.
+    transaction.on_commit(lambda: job_queue.enqueue(name, **payload))
+
+class Worker:
+    def __init__(self, queue, stop, batch_size=1, lease=None, poll_interval=None):
+        self.queue = queue
+        self.stop = stop
+        self.batch_size = batch_size
+        self.lease = lease or settings.JOBS_LEASE
+        self.poll_interval = poll_interval or settings.JOBS_POLL_INTERVAL
+        self.id = f'{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.done = self.failed = 0
+
+    def run(self, burst=False):
+        # Until stopped, or with burst until no job is ready.
+        while not self.stop.is_set():
+            jobs = self.queue.claim(self.id, self.batch_size, self.lease)
+            if not jobs:
+                if burst:
+                    return
+                self.stop.wait(self.poll_interval)
+                continue
+            for job in jobs:
+                self.perform(job)
+
+    def perform(self, job):
+        if job.attempts > job.max_attempts:
+            # Its last attempt never finished: the worker running it died (or it outran the lease).
+            self.queue.fail(job, 'Abandoned by its worker on the last attempt')
+            self.failed += 1
+            return
+        close_old_connections()
+        try:
+            func = JOBS.get(job.name)
+            if func is None:
+                raise LookupError(f'No job named {job.name!r}')
+            func(**job.payload)
+        except Exception:
+            self.queue.retry(job, traceback.format_exc())
+            self.failed += 1
+        else:
+            self.queue.complete(job)
+            self.done += 1
+        finally:
+            close_old_connections()
+
+def run_threads(queue, threads, stop, burst=False, **options):
+    workers = [Worker(queue, stop, **options) for _ in range(threads)]
+    pool = [threading.Thread(target=worker.run, args=(burst,), daemon=True) for worker in workers]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        # join() with a timeout so signals still reach the main thread.
+        while thread.is_alive():
+            thread.join(0.5)
+    return sum(worker.done for worker in workers), sum(worker.failed for worker in workers)
+
+def run_process(queue, threads, burst, options):
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    run_threads(queue, threads, stop, burst, **options)
+
+def run_pool(queue, processes=1, threads=1, stop=None, burst=False, **options):
+    # `processes` forked workers of `threads` threads each; with one process the threads run here.
+    # Returns (done, failed) when run in this process, None otherwise.
+    stop = stop or threading.Event()
+    if processes <= 1:
+        return run_threads(queue, threads, stop, burst, **options)
+    # Forked children must not share the parent's database connections.
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    children = [context.Process(target=run_process, args=(queue, threads, burst, options)) for _ in range(processes)]
+    for child in children:
+        child.start()
+    while any(child.is_alive() for child in children):
+        if stop.wait(0.5):
+            for child in children:
+                child.terminate()
+            break
+    for child in children:
+        child.join()
+    return None
+
+# Follow-up work for orders, enqueued by the views once the order is committed.
+
+@register('order_receipt')
+def order_receipt(order_id):
+    order = Order.objects.with_items().filter(pk=order_id).first()
+    if order is None or not order.customer.email:
+        return
+    lines = [f'{line.quantity} x {line.title}' for line in order.lines.all()]
+    send_mail(
+        f'Little Lemon order {order.pk}',
+        '\n'.join(lines + ['', f'Total: {order.total}']),
+        None,
+        [order.customer.email],
+    )
+
+@register('order_delivered')
+def order_delivered(order_id):
+    order = Order.objects.select_related('customer').filter(pk=order_id, status='1').first()
+    if order is None or not order.customer.email:
+        return
+    send_mail(f'Little Lemon order {order.pk} delivered', f'Your order {order.pk} has been delivered.', None, [order.customer.email])
@@ -0,0 +1,492 @@
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from urllib.parse import quote, urlsplit
+
+class HTTPConnection:
+    # Minimal keep-alive HTTP/1.1 client so load tests need nothing beyond the standard library.
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=b''):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        try:
+            status, response_headers, content = await self.read_response()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            raise
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, response_headers, content
+
+    async def read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed by server')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = (await self.reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            content = b''
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                content += await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif 'content-length' in headers:
+            content = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            content = await self.reader.read()
+            await self.close()
+        return status, headers, content
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = self.reader = None
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+async def run_closed_loop(base_url, requests, concurrency, duration, headers=None):
+    # Keeps `concurrency` clients busy for `duration` seconds, cycling through (method, path) pairs.
+    latencies, statuses, errors = [], {}, 0
+    deadline = time.perf_counter() + duration
+
+    async def client(offset):
+        nonlocal errors
+        connection = HTTPConnection(base_url)
+        position = offset
+        while time.perf_counter() < deadline:
+            method, path = requests[position % len(requests)]
+            position += 1
+            start = time.perf_counter()
+            try:
+                status, _, _ = await connection.request(method, path, headers)
+            except (OSError, ValueError, asyncio.IncompleteReadError):
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+        await connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': statuses,
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+    }
+
+# Scenario load tests (`manage.py loadtest`). Every request is recorded against the URL
+# pattern it hits, so results line up with LittleLemonAPI/urls.py run after run.
+
+LOGIN_ROUTE = 'token/login'
+LOADTEST_PASSWORD = 'loadtest-pass'
+LOADTEST_CATEGORY = 'Load test'
+
+def api_routes():
+    from .urls import urlpatterns
+    return [str(pattern.pattern) for pattern in urlpatterns] + [LOGIN_ROUTE]
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, scenario, method, route, status, latency, queries, expected):
+        sample = self.samples.setdefault((scenario, method, route), {'latencies': [], 'queries': [], 'statuses': {}, 'failures': 0, 'errors': 0})
+        sample['latencies'].append(latency)
+        if queries is not None:
+            sample['queries'].append(queries)
+        sample['statuses'][status] = sample['statuses'].get(status, 0) + 1
+        if not expected:
+            sample['failures'] += 1
+
+    def add_error(self, scenario, method, route):
+        sample = self.samples.setdefault((scenario, method, route), {'latencies': [], 'queries': [], 'statuses': {}, 'failures': 0, 'errors': 0})
+        sample['errors'] += 1
+
+    def summary(self, latencies, queries, elapsed):
+        return {
+            'requests': len(latencies),
+            'rps': len(latencies) / elapsed if elapsed else 0.0,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'max': max(latencies, default=0.0),
+            'queries_mean': sum(queries) / len(queries) if queries else None,
+            'queries_max': max(queries, default=None),
+        }
+
+    def report(self, elapsed):
+        routes, scenarios = [], {}
+        all_latencies, all_queries = [], []
+        for (scenario, method, route), sample in sorted(self.samples.items()):
+            entry = {'scenario': scenario, 'method': method, 'route': route}
+            entry.update(self.summary(sample['latencies'], sample['queries'], elapsed))
+            entry.update(statuses={str(code): count for code, count in sorted(sample['statuses'].items())}, failures=sample['failures'], errors=sample['errors'])
+            routes.append(entry)
+            totals = scenarios.setdefault(scenario, {'latencies': [], 'queries': [], 'failures': 0, 'errors': 0})
+            totals['latencies'] += sample['latencies']
+            totals['queries'] += sample['queries']
+            totals['failures'] += sample['failures']
+            totals['errors'] += sample['errors']
+            all_latencies += sample['latencies']
+            all_queries += sample['queries']
+        covered = {route for _, _, route in self.samples}
+        return {
+            'elapsed': elapsed,
+            'totals': dict(self.summary(all_latencies, all_queries, elapsed), failures=sum(r['failures'] for r in routes), errors=sum(r['errors'] for r in routes)),
+            'scenarios': {
+                name: dict(self.summary(totals['latencies'], totals['queries'], elapsed), failures=totals['failures'], errors=totals['errors'])
+                for name, totals in scenarios.items()
+            },
+            'routes': routes,
+            'uncovered_routes': [route for route in api_routes() if route not in covered],
+        }
+
+class VirtualUser:
+    # One simulated client: its own keep-alive connection and, once logged in, its own token.
+    def __init__(self, base_url, scenario, number, recorder, rng):
+        self.connection = HTTPConnection(base_url)
+        self.scenario = scenario
+        self.number = number
+        self.recorder = recorder
+        self.rng = rng
+        self.token = None
+
+    async def call(self, method, route, data=None, expect=(200,), query='', **kwargs):
+        path = '/' + route if route == LOGIN_ROUTE else '/api/' + route
+        for name, value in kwargs.items():
+            path = path.replace(f'<int:{name}>', str(value))
+        if query:
+            path += '?' + query
+        headers = {'Accept': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        body = b''
+        if data is not None:
+            headers['Content-Type'] = 'application/json'
+            body = json.dumps(data).encode()
+        start = time.perf_counter()
+        try:
+            status, response_headers, content = await self.connection.request(method, path, headers, body)
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            self.recorder.add_error(self.scenario, method, route)
+            return None, None
+        latency = (time.perf_counter() - start) * 1000
+        queries = response_headers.get('x-query-count')
+        self.recorder.add(self.scenario, method, route, status, latency, int(queries) if queries is not None else None, status in expect)
+        if response_headers.get('content-type', '').startswith('application/json'):
+            try:
+                return status, json.loads(content)
+            except ValueError:
+                pass
+        return status, content
+
+    async def login(self, username, password):
+        status, data = await self.call('POST', LOGIN_ROUTE, {'username': username, 'password': password})
+        if status != 200:
+            raise RuntimeError(f'{username} could not log in ({status}); was the data prepared against this server\'s database?')
+        self.token = data['token']
+
+def results(data):
+    return data.get('results', []) if isinstance(data, dict) else []
+
+async def anonymous_browsing(user, fixtures):
+    rng = user.rng
+    status, data = await user.call('GET', 'menu-items', query='per_page=10')
+    if status == 200 and data['count'] > 10:
+        await user.call('GET', 'menu-items', query=f"page={rng.randint(2, math.ceil(data['count'] / 10))}&per_page=10")
+    await user.call('GET', 'menu-items', query='search=item&per_page=10')
+    await user.call('GET', 'menu-items', query=f"category={quote(fixtures['category']['name'])}&ordering=price&per_page=10")
+    await user.call('GET', 'menu-items/category')
+    await user.call('GET', 'menu-items/category/<int:pk>', pk=fixtures['category']['id'])
+    await user.call('GET', 'menu-items/<int:pk>', pk=rng.choice(fixtures['items']))
+    if rng.random() < 0.05:
+        username = f'loadtest-signup-{uuid.uuid4().hex[:12]}'
+        await user.call('POST', 'users', {'name': 'Visitor', 'email': f'{username}@example.com', 'username': username, 'password': LOADTEST_PASSWORD}, expect=(201,))
+
+async def customer_checkout(user, fixtures):
+    rng = user.rng
+    items = rng.sample(fixtures['items'], 4)
+    await user.call('GET', 'users/me')
+    await user.call('GET', 'menu-items', query='per_page=10')
+    await user.call('POST', 'cart/menu-items', {'item': items[0], 'quantity': rng.randint(1, 3)}, expect=(201,))
+    await user.call('POST', 'cart/menu-items/batch', {'items': [{'item': item, 'quantity': rng.randint(1, 3)} for item in items[1:]]})
+    await user.call('GET', 'cart/menu-items')
+    await user.call('DELETE', 'cart/menu-items', {'item': items[3]})
+    await user.call('POST', 'orders', expect=(201,))
+    status, data = await user.call('GET', 'orders', query='pagination=cursor&per_page=10')
+    if status == 200 and results(data):
+        await user.call('GET', 'orders/<int:pk>', pk=results(data)[0]['id'])
+
+async def crew_status_updates(user, fixtures):
+    status, data = await user.call('GET', 'orders', query='pagination=cursor&per_page=20')
+    orders = results(data) if status == 200 else []
+    if orders:
+        order = user.rng.choice(orders)
+        # A manager may delete a delivered order between the listing and the update.
+        await user.call('PATCH', 'orders/<int:pk>', {'status': '0' if order['status'] == '1' else '1'}, pk=order['id'], expect=(200, 400))
+
+async def manager_listing(user, fixtures):
+    rng = user.rng
+    spare = fixtures['spares'][user.number % len(fixtures['spares'])]
+    status, data = await user.call('GET', 'orders', query='status=0&pagination=cursor&per_page=20')
+    unassigned = [order for order in results(data) if order['deliver_crew'] is None]
+    if unassigned:
+        order = rng.choice(unassigned)
+        await user.call('PATCH', 'orders/<int:pk>', {'deliver_crew': rng.choice(fixtures['crew'])}, pk=order['id'])
+        await user.call('GET', 'orders/<int:pk>', pk=order['id'], expect=(200, 404))
+    status, data = await user.call('GET', 'orders', query='status=1&ordering=date&pagination=cursor&per_page=5')
+    if results(data):
+        # Delivered orders are cleared out so the order table stays about the same size.
+        await user.call('DELETE', 'orders/<int:pk>', pk=results(data)[0]['id'], expect=(200, 404))
+    await user.call('GET', 'orders/export', query=f"customer={fixtures['customers'][0]}")
+    await user.call('GET', 'reports/sales', query='top=5')
+    await user.call('GET', 'metrics')
+    await user.call('GET', 'users', query='pagination=cursor&per_page=20')
+    await user.call('GET', 'groups/manager/users')
+    await user.call('GET', 'groups/deliver-crew/users')
+    await user.call('POST', 'groups/manager/users', {'username': spare['username']}, expect=(201,))
+    await user.call('DELETE', 'groups/manager/users/<int:pk>', pk=spare['id'])
+    await user.call('POST', 'groups/deliver-crew/users', {'username': spare['username']}, expect=(201,))
+    await user.call('DELETE', 'groups/deliver-crew/users/<int:pk>', pk=spare['id'])
+    await user.call('GET', 'menu-items/export')
+    item = rng.randrange(len(fixtures['items']))
+    await user.call('POST', 'menu-items/import', {'items': [{'title': f'Load test item {item}', 'price': str(fixtures['prices'][item]), 'category': LOADTEST_CATEGORY}]})
+    # A throwaway category with one item walks the remaining catalog routes.
+    name = f'loadtest-{uuid.uuid4().hex[:12]}'
+    status, category = await user.call('POST', 'menu-items/category', {'name': name}, expect=(201,))
+    if status != 201:
+        return
+    await user.call('POST', 'menu-items', {'title': name, 'price': '5.00', 'category': category['id']}, expect=(201,))
+    status, items = await user.call('GET', 'menu-items/category/<int:pk>', pk=category['id'])
+    if status == 200 and items:
+        await user.call('PATCH', 'menu-items/<int:pk>', {'price': '6.00'}, pk=items[0]['id'])
+        await user.call('DELETE', 'menu-items/<int:pk>', pk=items[0]['id'])
+    await user.call('PATCH', 'menu-items/category/<int:pk>', {'name': name + '-renamed'}, pk=category['id'])
+    await user.call('DELETE', 'menu-items/category/<int:pk>', pk=category['id'])
+
+SCENARIOS = {
+    'anonymous': anonymous_browsing,
+    'customer': customer_checkout,
+    'deliver_crew': crew_status_updates,
+    'manager': manager_listing,
+}
+
+async def run_scenarios(base_url, scenarios, users, duration, fixtures, seed=0):
+    # Runs `users` virtual users per scenario side by side for `duration` seconds; role users
+    # log in through token/login first. Returns Recorder.report() for the run.
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user(scenario, number):
+        user = VirtualUser(base_url, scenario, number, recorder, random.Random(f'{seed}:{scenario}:{number}'))
+        try:
+            if scenario != 'anonymous':
+                accounts = fixtures['accounts'][scenario]
+                await user.login(accounts[number % len(accounts)], fixtures['password'])
+            # Every virtual user gets through its scenario at least once, however short the run.
+            while True:
+                await SCENARIOS[scenario](user, fixtures)
+                if time.perf_counter() >= deadline:
+                    break
+        finally:
+            await user.connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(scenario, number) for scenario in scenarios for number in range(users)))
+    return recorder.report(time.perf_counter() - started)
+
+# Event stream load test (`manage.py loadtest_events`): many idle orders/events streams held
+# open at once, then order updates whose fan-out to those streams is timed.
+
+class EventStream:
+    def __init__(self, base_url, token):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.token = token
+        self.reader = self.writer = None
+        self.buffer = b''
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write((
+            f'GET /api/orders/events HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n'
+            f'Accept: text/event-stream\r\nAuthorization: Token {self.token}\r\n\r\n'
+        ).encode())
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed by server')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = (await self.reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        self.chunked = headers.get('transfer-encoding', '').lower() == 'chunked'
+        return status
+
+    async def read(self):
+        if not self.chunked:
+            data = await self.reader.read(65536)
+            if not data:
+                raise asyncio.IncompleteReadError(b'', None)
+            return data
+        size = int((await self.reader.readline()).strip(), 16)
+        data = await self.reader.readexactly(size + 2)
+        if size == 0:
+            raise asyncio.IncompleteReadError(b'', None)
+        return data[:-2]
+
+    async def events(self):
+        # Yields (fields, arrival) per event; comments come back as {'comment': ...}.
+        while True:
+            while b'\n\n' not in self.buffer:
+                self.buffer += await self.read()
+            block, self.buffer = self.buffer.split(b'\n\n', 1)
+            fields = {}
+            for line in block.decode().splitlines():
+                name, _, value = line.partition(': ')
+                fields[name or 'comment'] = value
+            yield fields, time.perf_counter()
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = self.reader = None
+
+async def run_event_streams(base_url, fixtures, connections, idle, updates, on_idle=None, connect_concurrency=100, timeout=5):
+    # Opens `connections` streams spread over the fixture customers (and one for the crew), leaves
+    # them idle for `idle` seconds, then makes `updates` status changes one after another as the
+    # deliver crew and times how long each takes to reach every stream that should get it.
+    customers = fixtures['customers']
+    opened, refused, connect_latencies, keep_alives, dropped = [], {}, [], 0, 0
+    delivery_latencies, missed = [], 0
+    pending = {}
+    gate = asyncio.Semaphore(connect_concurrency)
+
+    async def hold(number, token, orders):
+        nonlocal keep_alives, dropped
+        stream = EventStream(base_url, token)
+        connected = False
+        try:
+            async with gate:
+                start = time.perf_counter()
+                status = await stream.open()
+                if status != 200:
+                    refused[status] = refused.get(status, 0) + 1
+                    return
+                events = stream.events()
+                await anext(events)
+            connect_latencies.append((time.perf_counter() - start) * 1000)
+            opened.append((number, orders))
+            connected = True
+            async for fields, arrival in events:
+                if fields.get('event') != 'order':
+                    keep_alives += 'comment' in fields
+                    continue
+                data = json.loads(fields['data'])
+                update = pending.get((data['order'], data['status']))
+                if update is not None and number in update['waiting']:
+                    delivery_latencies.append((arrival - update['sent']) * 1000)
+                    update['waiting'].discard(number)
+                    if not update['waiting']:
+                        update['done'].set()
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            if connected:
+                dropped += 1
+            else:
+                refused['error'] = refused.get('error', 0) + 1
+        finally:
+            await stream.close()
+
+    streams = [
+        asyncio.ensure_future(hold(number, customers[number % len(customers)]['token'], {customers[number % len(customers)]['order']}))
+        for number in range(connections - 1)
+    ]
+    streams.append(asyncio.ensure_future(hold(connections - 1, fixtures['crew']['token'], {customer['order'] for customer in customers})))
+    started = time.perf_counter()
+    while len(opened) + sum(refused.values()) < connections and time.perf_counter() - started < timeout + connections / connect_concurrency:
+        await asyncio.sleep(0.05)
+    connect_elapsed = time.perf_counter() - started
+    await asyncio.sleep(idle)
+    if on_idle is not None:
+        on_idle()
+
+    crew = HTTPConnection(base_url)
+    statuses = {customer['order']: '0' for customer in customers}
+    update_latencies, update_errors = [], 0
+    for number in range(updates):
+        order = customers[number % len(customers)]['order']
+        statuses[order] = '1' if statuses[order] == '0' else '0'
+        update = pending[(order, statuses[order])] = {
+            'sent': time.perf_counter(),
+            'waiting': {stream for stream, orders in opened if order in orders},
+            'done': asyncio.Event(),
+        }
+        status, _, _ = await crew.request('PATCH', f'/api/orders/{order}', {
+            'Authorization': f"Token {fixtures['crew']['token']}", 'Content-Type': 'application/json', 'Accept': 'application/json',
+        }, json.dumps({'status': statuses[order]}).encode())
+        update_latencies.append((time.perf_counter() - update['sent']) * 1000)
+        if status != 200:
+            update_errors += 1
+            update['waiting'] = set()
+        elif update['waiting']:
+            try:
+                await asyncio.wait_for(update['done'].wait(), timeout)
+            except TimeoutError:
+                pass
+        missed += len(update['waiting'])
+        del pending[(order, statuses[order])]
+    await crew.close()
+
+    for stream in streams:
+        stream.cancel()
+    await asyncio.gather(*streams, return_exceptions=True)
+    return {
+        'connections': connections,
+        'opened': len(opened),
+        'refused': {str(status): count for status, count in refused.items()},
+        'connect_seconds': connect_elapsed,
+        'connect_p50': percentile(connect_latencies, 0.50),
+        'connect_p99': percentile(connect_latencies, 0.99),
+        'dropped': dropped,
+        'keep_alives': keep_alives,
+        'updates': updates,
+        'update_errors': update_errors,
+        'update_p50': percentile(update_latencies, 0.50),
+        'update_p99': percentile(update_latencies, 0.99),
+        'deliveries': len(delivery_latencies),
+        'missed': missed,
+        'delivery_p50': percentile(delivery_latencies, 0.50),
+        'delivery_p99': percentile(delivery_latencies, 0.99),
+        'delivery_max': max(delivery_latencies, default=0.0),
+    }
@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from LittleLemonAPI.assignment import AssignmentEngine, ASSIGNMENT_BATCH_SIZE
+
+class Command(BaseCommand):
+    help = 'Assign unassigned open orders to the least-loaded deliver crew members, once or on an interval.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ASSIGNMENT_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, help='Keep running, looking for new orders every this many seconds.')
+
+    def handle(self, *args, **options):
+        engine = AssignmentEngine(batch_size=options['batch_size'])
+        while True:
+            start = time.perf_counter()
+            assigned = engine.run()
+            elapsed = time.perf_counter() - start
+            if assigned or options['interval'] is None:
+                self.stdout.write(f'Assigned {assigned} orders to {len(engine.loads)} crew members in {elapsed:.2f}s '
+                                  f'({assigned / elapsed if elapsed else 0:.0f} assignments/sec)')
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+            # Other engines and managers change loads too; start each round from the database.
+            engine.refresh()
@@ -0,0 +1,52 @@
+import random
+import time
+from decimal import Decimal
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from LittleLemonAPI.assignment import AssignmentEngine, OPEN
+from LittleLemonAPI.models import Order
+from LittleLemonAPI.roles import DELIVER_CREW
+from LittleLemonAPI import rollups
+
+class Command(BaseCommand):
+    help = 'Seed unassigned orders and crew members, run the assignment engine and report assignments/sec (rolled back afterwards).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--crew', type=int, default=20)
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 1000])
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'batch size':>10}{'assigned':>10}{'seconds':>9}{'per sec':>9}{'min load':>9}{'max load':>9}")
+        for batch_size in options['batch_sizes']:
+            with transaction.atomic():
+                crew = self.seed(options)
+                engine = AssignmentEngine(batch_size=batch_size)
+                start = time.perf_counter()
+                assigned = engine.run()
+                elapsed = time.perf_counter() - start
+                loads = [engine.loads[member.id] for member in crew]
+                assert not Order.objects.filter(status=OPEN, deliver_crew__isnull=True).exists()
+                assert not rollups.compare()
+                self.stdout.write(f'{batch_size:>10}{assigned:>10}{elapsed:>9.2f}{assigned / elapsed:>9.0f}{min(loads):>9}{max(loads):>9}')
+                transaction.set_rollback(True)
+
+    def seed(self, options):
+        rng = random.Random(0)
+        crew_group, _ = Group.objects.get_or_create(name=DELIVER_CREW)
+        crew = User.objects.bulk_create(User(username=f'bench-assign-crew-{i}') for i in range(options['crew']))
+        crew_group.user_set.add(*crew)
+        customers = User.objects.bulk_create(User(username=f'bench-assign-{i}') for i in range(100))
+        # Some crew members already have work, so the engine has to balance around it.
+        Order.objects.bulk_create(
+            (Order(customer=rng.choice(customers), deliver_crew=rng.choice(crew[:options['crew'] // 2 or 1]), total=Decimal('25.00'))
+             for _ in range(options['orders'] // 10)),
+            batch_size=5000,
+        )
+        Order.objects.bulk_create(
+            (Order(customer=rng.choice(customers), total=Decimal('25.00')) for _ in range(options['orders'])),
+            batch_size=5000,
+        )
+        rollups.rebuild()
+        return crew
@@ -0,0 +1,39 @@
+import asyncio
+from django.core.management.base import BaseCommand, CommandError
+from LittleLemonAPI.loadtest import run_closed_loop
+
+READ_PATHS = [
+    '/api/menu-items',
+    '/api/menu-items/category',
+    '/api/cart/menu-items',
+    '/api/orders',
+    '/api/users/me',
+]
+
+class Command(BaseCommand):
+    help = ('Compare requests/sec and latency of the read endpoints on a WSGI and an ASGI server, e.g.\n'
+            '  gunicorn LittLemon.wsgi -b 127.0.0.1:8001 -w 4 --threads 8\n'
+            '  uvicorn LittLemon.asgi:application --port 8002 --workers 4\n'
+            '  manage.py bench_async_reads --wsgi http://127.0.0.1:8001 --asgi http://127.0.0.1:8002 --token <key>\n'
+            'Both servers need throttle rates high enough not to answer 429.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi', help='Base URL of the WSGI server')
+        parser.add_argument('--asgi', help='Base URL of the ASGI server')
+        parser.add_argument('--token', help='Auth token sent as "Authorization: Token <key>"')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200, 1000])
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--path', action='append', dest='paths', help='Endpoint to request (repeatable)')
+
+    def handle(self, *args, **options):
+        servers = [(name, options[name]) for name in ('wsgi', 'asgi') if options[name]]
+        if not servers:
+            raise CommandError('Pass --wsgi and/or --asgi')
+        headers = {'Authorization': f"Token {options['token']}"} if options['token'] else {}
+        requests = [('GET', path) for path in options['paths'] or READ_PATHS]
+        self.stdout.write(f"{'server':<6}{'clients':>8}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}  statuses")
+        for concurrency in options['concurrency']:
+            for name, url in servers:
+                result = asyncio.run(run_closed_loop(url, requests, concurrency, options['duration'], headers))
+                self.stdout.write(f"{name:<6}{concurrency:>8}{result['rps']:>10.1f}{result['p50']:>9.1f}"
+                                  f"{result['p99']:>9.1f}{result['errors']:>8}  {result['statuses']}")
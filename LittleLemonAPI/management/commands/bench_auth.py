@@ -0,0 +1,67 @@
+import statistics
+import time
+from functools import partial
+from decimal import Decimal
+from django.contrib.auth import get_user
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.functional import SimpleLazyObject
+from rest_framework.authentication import TokenAuthentication, SessionAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+from LittleLemonAPI.authentication import CachedTokenAuthentication, CachedSessionAuthentication, credential_cache
+from LittleLemonAPI.models import Category, MenuItem, Cart
+from LittleLemonAPI.views import CurrentUserView, CartView
+
+class Command(BaseCommand):
+    help = 'Compare per-request cost of DRF token/session authentication with the cached classes (rolled back afterwards).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=500)
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        backends = {
+            'drf': [TokenAuthentication, SessionAuthentication],
+            'cached': [CachedTokenAuthentication, CachedSessionAuthentication],
+        }
+        with transaction.atomic():
+            user = User.objects.create_user('bench-auth', password='bench')
+            category = Category.objects.create(name='Bench')
+            for i in range(5):
+                item = MenuItem.objects.create(title=f'Bench item {i}', price=Decimal('4.50'), category=category)
+                Cart.objects.create(user=user, item=item, quantity=1, itemprice=item.price)
+            token = Token.objects.create(user=user)
+            session = SessionStore()
+            session['_auth_user_id'] = str(user.pk)
+            session['_auth_user_backend'] = 'django.contrib.auth.backends.ModelBackend'
+            session['_auth_user_hash'] = user.get_session_auth_hash()
+            session.create()
+            credentials = {
+                'token': lambda request: request.META.update(HTTP_AUTHORIZATION=f'Token {token.key}'),
+                'session': lambda request: request.COOKIES.update({settings.SESSION_COOKIE_NAME: session.session_key}),
+            }
+            self.stdout.write(f"{'view':<16}{'credential':<11}{'backend':<8}{'median us':>11}{'queries':>9}")
+            for name, view_class, path in (('CurrentUserView', CurrentUserView, '/api/users/me'), ('CartView', CartView, '/api/cart/menu-items')):
+                for credential, attach in credentials.items():
+                    for backend, classes in backends.items():
+                        view = view_class.as_view(authentication_classes=classes, throttle_classes=[])
+                        credential_cache.clear()
+                        timings = []
+                        for _ in range(options['repeat']):
+                            request = factory.get(path)
+                            attach(request)
+                            # What SessionMiddleware and AuthenticationMiddleware attach to every request.
+                            request.session = SessionStore(session.session_key)
+                            request.user = SimpleLazyObject(partial(get_user, request))
+                            with CaptureQueriesContext(connection) as queries:
+                                start = time.perf_counter()
+                                response = view(request)
+                                timings.append((time.perf_counter() - start) * 1_000_000)
+                            assert response.status_code == 200, response.data
+                        self.stdout.write(f'{name:<16}{credential:<11}{backend:<8}{statistics.median(timings):>11.0f}{len(queries):>9}')
+            transaction.set_rollback(True)
@@ -0,0 +1,45 @@
+import statistics
+import time
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from LittleLemonAPI.models import Category, MenuItem, Cart
+from LittleLemonAPI.views import OrdersView
+
+class Command(BaseCommand):
+    help = 'Time OrdersView.post checkouts for carts of different sizes (rolled back afterwards).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 20, 200])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        view = OrdersView.as_view(throttle_classes=[])
+        factory = APIRequestFactory()
+        with transaction.atomic():
+            category = Category.objects.create(name='Bench')
+            items = MenuItem.objects.bulk_create(
+                MenuItem(title=f'Bench item {i}', price=Decimal('4.50'), category=category) for i in range(max(options['sizes']))
+            )
+            self.stdout.write(f"{'cart size':>10}{'median ms':>12}{'p95 ms':>10}{'queries':>9}")
+            for size in options['sizes']:
+                user = User.objects.create_user(f'bench-checkout-{size}')
+                timings = []
+                for _ in range(options['repeat']):
+                    Cart.objects.bulk_create(
+                        Cart(user=user, item=item, quantity=2, itemprice=item.price * 2) for item in items[:size]
+                    )
+                    request = factory.post('/api/orders')
+                    force_authenticate(request, user=user)
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        response = view(request)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    assert response.status_code == 201, response.data
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                self.stdout.write(f'{size:>10}{statistics.median(timings):>12.2f}{p95:>10.2f}{len(queries):>9}')
+            transaction.set_rollback(True)
@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from LittleLemonAPI.loadtest import percentile
+from LittleLemonAPI.routers import sync_replica
+
+# Django's own SQLite behaviour before the connection profile: rollback journal, FULL sync,
+# 5s busy timeout, deferred transactions and a new connection per request.
+PROFILES = {
+    'django-default': {
+        'LITTLELEMON_SQLITE_CONN_MAX_AGE': '0',
+        'LITTLELEMON_SQLITE_JOURNAL_MODE': 'DELETE',
+        'LITTLELEMON_SQLITE_SYNCHRONOUS': 'FULL',
+        'LITTLELEMON_SQLITE_MMAP_SIZE': '0',
+        'LITTLELEMON_SQLITE_CACHE_SIZE': '-2000',
+        'LITTLELEMON_SQLITE_BUSY_TIMEOUT': '5',
+        'LITTLELEMON_SQLITE_TRANSACTION_MODE': 'DEFERRED',
+    },
+    'tuned': {},
+    'tuned+replica': {},
+}
+
+class Command(BaseCommand):
+    help = ('Run customer processes (browse, fill the cart, check out, list orders) against copies of the database '
+            'under each connection profile and report throughput and "database is locked" errors. '
+            'The current database is only read.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, nargs='+', default=[4, 8])
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--profile', action='append', dest='profiles', choices=list(PROFILES))
+        parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+        parser.add_argument('--start', type=float, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker'] is not None:
+            return self.work(options['worker'], options['start'], options['duration'])
+        self.stdout.write(f"{'profile':<16}{'procs':>6}{'ops':>8}{'ops/s':>9}{'locked':>8}{'lock %':>8}{'p50 ms':>9}{'p99 ms':>9}")
+        for profile in options['profiles'] or list(PROFILES):
+            for processes in options['processes']:
+                result = self.run(profile, processes, options['duration'])
+                ops = result['ops'] + result['locked']
+                self.stdout.write(f"{profile:<16}{processes:>6}{result['ops']:>8}{result['ops'] / options['duration']:>9.1f}{result['locked']:>8}"
+                                  f"{100 * result['locked'] / ops if ops else 0:>7.1f}%{percentile(result['latencies'], 0.5):>9.1f}{percentile(result['latencies'], 0.99):>9.1f}")
+
+    def run(self, profile, processes, duration):
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, 'db.sqlite3')
+            # The primary may be in WAL mode with pages still in its -wal file; the backup API sees them.
+            sync_replica(settings.DATABASES['default']['NAME'], database)
+            env = {
+                **os.environ,
+                **PROFILES[profile],
+                'DJANGO_SETTINGS_MODULE': 'LittLemon.settings',
+                'LITTLELEMON_DATABASE': database,
+                'LITTLELEMON_THROTTLING': '0',
+                'LITTLELEMON_THROTTLE_DATABASE': os.path.join(directory, 'throttle.sqlite3'),
+                'LITTLELEMON_METRICS_DATABASE': os.path.join(directory, 'metrics.sqlite3'),
+                'LITTLELEMON_CACHE_DATABASE': os.path.join(directory, 'cache.sqlite3'),
+                'LITTLELEMON_ORDER_EVENTS_DATABASE': os.path.join(directory, 'order_events.sqlite3'),
+            }
+            if profile.endswith('+replica'):
+                replica = os.path.join(directory, 'replica.sqlite3')
+                shutil.copyfile(database, replica)
+                env['LITTLELEMON_REPLICA_DATABASE'] = replica
+            start = time.time() + 3
+            workers = [
+                subprocess.Popen(
+                    [sys.executable, sys.argv[0], 'bench_concurrency', '--worker', str(number), '--start', str(start), '--duration', str(duration)],
+                    env=env, stdout=subprocess.PIPE, text=True,
+                )
+                for number in range(processes)
+            ]
+            result = {'ops': 0, 'locked': 0, 'latencies': []}
+            for worker in workers:
+                output, _ = worker.communicate()
+                worker_result = json.loads(output.strip().splitlines()[-1])
+                for key in result:
+                    result[key] += worker_result[key]
+            return result
+
+    def work(self, number, start, duration):
+        from django.contrib.auth.models import User
+        from django.db import OperationalError
+        from django.test import Client
+        from rest_framework.authtoken.models import Token
+        from LittleLemonAPI.models import MenuItem
+        user, _ = User.objects.get_or_create(username=f'bench-concurrency-{number}')
+        token, _ = Token.objects.get_or_create(user=user)
+        items = list(MenuItem.objects.values_list('id', flat=True))
+        client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {token.key}')
+        rng = random.Random(number)
+        steps = [
+            lambda: client.get('/api/menu-items', {'per_page': 10}),
+            lambda: client.post('/api/cart/menu-items/batch', {'items': [{'item': item, 'quantity': 1} for item in rng.sample(items, min(3, len(items)))]}, content_type='application/json'),
+            lambda: client.post('/api/orders'),
+            lambda: client.get('/api/orders', {'pagination': 'cursor', 'per_page': 10}),
+        ]
+        result = {'ops': 0, 'locked': 0, 'latencies': []}
+        time.sleep(max(0, start - time.time()))
+        deadline = start + duration
+        while time.time() < deadline:
+            for step in steps:
+                began = time.perf_counter()
+                try:
+                    step()
+                except OperationalError as exc:
+                    if 'locked' not in str(exc):
+                        raise
+                    result['locked'] += 1
+                    continue
+                result['latencies'].append((time.perf_counter() - began) * 1000)
+                result['ops'] += 1
+        self.stdout.write(json.dumps(result))
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from LittleLemonAPI.jobs import JobQueue, register, run_pool
+from LittleLemonAPI.loadtest import percentile
+
+@register('bench_noop')
+def noop_job(number):
+    pass
+
+@register('bench_io')
+def io_job(number):
+    # Stands in for a mail server or webhook round trip.
+    time.sleep(0.005)
+
+# (processes, threads, batch)
+POOLS = [(1, 1, 1), (1, 1, 10), (1, 4, 10), (2, 2, 10), (4, 1, 10), (1, 16, 10)]
+
+class Command(BaseCommand):
+    help = 'Measure job queue enqueue latency and how many jobs per second worker pools of each shape get through. Uses temporary queue files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        count = options['jobs']
+        with tempfile.TemporaryDirectory() as directory:
+            queue = JobQueue(os.path.join(directory, 'enqueue.sqlite3'))
+            latencies = []
+            for number in range(count):
+                start = time.perf_counter()
+                queue.enqueue('bench_noop', number=number)
+                latencies.append((time.perf_counter() - start) * 1e6)
+            self.stdout.write(f'enqueue: {count} jobs, p50 {percentile(latencies, 0.5):.0f} us, p99 {percentile(latencies, 0.99):.0f} us per job')
+
+            self.stdout.write(f"{'job':<8}{'procs':>6}{'threads':>8}{'batch':>6}{'jobs/s':>10}")
+            for name, jobs in (('bench_noop', count), ('bench_io', count // 5)):
+                for processes, threads, batch in POOLS:
+                    queue = JobQueue(os.path.join(directory, f'{name}-{processes}-{threads}-{batch}.sqlite3'))
+                    queue.enqueue_many([(name, {'number': number}) for number in range(jobs)])
+                    start = time.perf_counter()
+                    run_pool(queue, processes, threads, burst=True, batch_size=batch)
+                    elapsed = time.perf_counter() - start
+                    left = queue.counts()
+                    note = '' if not any(left.values()) else f'  left {left}'
+                    self.stdout.write(f"{name[6:]:<8}{processes:>6}{threads:>8}{batch:>6}{jobs / elapsed:>10.0f}{note}")
@@ -0,0 +1,73 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from LittleLemonAPI.models import Category, MenuItem
+from LittleLemonAPI.search import search_menu_items
+
+WORDS = ['pasta', 'salad', 'lemon', 'grilled', 'chicken', 'greek', 'bruschetta', 'soup', 'cake', 'tart',
+         'spicy', 'garlic', 'roasted', 'lamb', 'olive', 'feta', 'tomato', 'basil', 'mushroom', 'risotto']
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'tu', 'ne', 'so', 'vi', 'da', 'pe', 'zu', 'fo']
+QUERIES = [
+    ({'search': 'lemon'}, 'common word'),
+    ({'search': 'kalomi'}, 'rare word'),
+    ({'search': 'kalo'}, 'rare prefix'),
+    ({'search': 'grilled chick'}, 'two words'),
+    ({'search': 'kalomi', 'category': 'Mains'}, 'rare + category'),
+    ({'search': 'pasta', 'to_price': '10'}, 'common + to_price'),
+    ({'search': 'soup', 'ordering': '-price'}, 'common + ordering'),
+]
+
+class Command(BaseCommand):
+    help = 'Compare the FTS5 menu search with the title__icontains scan on a seeded catalog (rolled back afterwards).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['items'])
+            self.stdout.write(f"{'query':<20}{'icontains ms':>14}{'fts5 ms':>10}{'speedup':>9}{'rows':>8}")
+            for params, label in QUERIES:
+                icontains = self.measure(params, False, options)
+                fts = self.measure(params, True, options)
+                self.stdout.write(f'{label:<20}{icontains[0]:>14.2f}{fts[0]:>10.2f}{icontains[0] / fts[0]:>8.1f}x{fts[1]:>8}')
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        rng = random.Random(0)
+        # A long tail of rare words next to a few very common ones, like a real catalog.
+        rare = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+        categories = [Category.objects.create(name=name) for name in ('Mains', 'Starters', 'Desserts', 'Drinks')]
+        batch = []
+        for i in range(count):
+            title = ' '.join(rng.sample(WORDS, 2) + [rng.choice(rare)]).title()
+            batch.append(MenuItem(title=f'{title} {i}', price=Decimal(rng.randint(100, 5000)) / 100, category=rng.choice(categories)))
+            if len(batch) == 5000:
+                MenuItem.objects.bulk_create(batch)
+                batch = []
+        MenuItem.objects.bulk_create(batch)
+
+    def measure(self, params, use_fts, options):
+        timings = []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            items = MenuItem.objects.select_related('category')
+            if 'category' in params:
+                items = items.filter(category__name=params['category'])
+            if 'to_price' in params:
+                items = items.filter(price__lte=params['to_price'])
+            if use_fts:
+                items = search_menu_items(items, params['search'], ranked='ordering' not in params)
+            else:
+                items = items.filter(title__icontains=params['search'])
+            if 'ordering' in params:
+                items = items.order_by(params['ordering'])
+            rows = items.count()
+            list(items[:options['page_size']])
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), rows
@@ -0,0 +1,96 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from LittleLemonAPI.models import Category, MenuItem, Order
+
+class Command(BaseCommand):
+    help = ('Seed a large dataset (rolled back afterwards) and report EXPLAIN QUERY PLAN and timings for the '
+            'order and menu filters, with and without the indexes declared on the models.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--items', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--limit', type=int, default=100)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            crew, customer = self.seed(options)
+            queries = self.queries(crew, customer)
+            indexes = [index.name for model in (Category, MenuItem, Order) for index in model._meta.indexes]
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for name in indexes:
+                        cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+                before = self.run(queries, options)
+                transaction.set_rollback(True)
+            after = self.run(queries, options)
+            for label in queries:
+                self.stdout.write(f'\n{label}')
+                self.stdout.write(f'  before: {before[label][0]:8.2f} ms  {before[label][1]}')
+                self.stdout.write(f'  after:  {after[label][0]:8.2f} ms  {after[label][1]}')
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        rng = random.Random(0)
+        users = User.objects.bulk_create(User(username=f'bench-plan-{i}') for i in range(220))
+        crew, customers = users[:20], users[20:]
+        categories = Category.objects.bulk_create(Category(name=f'Bench category {i}') for i in range(40))
+        MenuItem.objects.bulk_create(
+            (MenuItem(title=f'Bench item {i}', price=Decimal(rng.randint(100, 9999)) / 100,
+                      category=rng.choice(categories), featured=rng.random() < 0.05)
+             for i in range(options['items'])),
+            batch_size=5000,
+        )
+        Order.objects.bulk_create(
+            (Order(customer=rng.choice(customers), deliver_crew=rng.choice(crew + [None]),
+                   total=Decimal('25.00'), status=rng.choice('0011'))
+             for _ in range(options['orders'])),
+            batch_size=5000,
+        )
+        # bulk_create stamps every row with the same auto_now_add date; spread them out.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE "{Order._meta.db_table}" SET date = datetime(date, \'-\' || (id * 7 % 100000) || \' minutes\') '
+                f'WHERE customer_id IN (SELECT id FROM auth_user WHERE username LIKE \'bench-plan-%%\')'
+            )
+        return crew[0], customers[0]
+
+    def queries(self, crew, customer):
+        orders = Order.objects.all()
+        items = MenuItem.objects.all()
+        return {
+            'orders ?status=1': orders.filter(status='1'),
+            'orders ?deliver_crew=': orders.filter(deliver_crew__username=crew.username),
+            'orders ?deliver_crew=&status=1&ordering=date': orders.filter(deliver_crew__username=crew.username, status='1').order_by('date'),
+            'orders ?customer=&ordering=-date': orders.filter(customer__username=customer.username).order_by('-date'),
+            'orders ?ordering=-date': orders.order_by('-date'),
+            'orders (deliver crew view)': orders.filter(deliver_crew=crew).order_by('date'),
+            'orders (customer view)': orders.filter(customer=customer).order_by('-date', '-id'),
+            'menu-items ?category=': items.filter(category__name='Bench category 7'),
+            'menu-items ?to_price=5': items.filter(price__lte=5),
+            'menu-items ?category=&to_price=20': items.filter(category__name='Bench category 7', price__lte=20),
+            'menu-items ?ordering=price': items.order_by('price', 'id'),
+            'menu-items featured': items.filter(featured=True),
+        }
+
+    def run(self, queries, options):
+        results = {}
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            for label, queryset in queries.items():
+                queryset = queryset[:options['limit']]
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = '; '.join(row[3] for row in cursor.fetchall())
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    list(queryset.all())
+                    timings.append((time.perf_counter() - start) * 1000)
+                results[label] = (statistics.median(timings), plan)
+        return results
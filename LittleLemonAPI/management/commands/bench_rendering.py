@@ -0,0 +1,52 @@
+import io
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from LittleLemonAPI.management.commands.bench_serialization import Command as SerializationCommand
+from LittleLemonAPI.models import MenuItem, Order
+from LittleLemonAPI.parsers import ORJSONParser
+from LittleLemonAPI.renderers import ORJSONRenderer
+from LittleLemonAPI.serializers import MenuItemSerializer, OrderSerializer
+
+class Command(BaseCommand):
+    help = ('Seed menu items and orders (rolled back afterwards) and compare DRF JSONRenderer/JSONParser '
+            'with the orjson renderer and parser on the same payloads.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def best(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'payload':<12}{'rows':>8}{'step':>8}{'drf ms':>10}{'orjson ms':>11}{'speedup':>9}{'bytes':>12}")
+        for size in options['sizes']:
+            with transaction.atomic():
+                SerializationCommand().seed(size)
+                payloads = [
+                    ('menu items', MenuItemSerializer(MenuItem.objects.filter(title__startswith='Bench').select_related('category').order_by('id'), many=True).data),
+                    ('orders', OrderSerializer(Order.objects.filter(customer__username__startswith='bench-serialize').with_items().order_by('id'), many=True).data),
+                ]
+                for name, data in payloads:
+                    body = JSONRenderer().render(data)
+                    if ORJSONRenderer().render(data) != body:
+                        raise AssertionError(f'{name}: orjson output differs from JSONRenderer at {size} rows')
+                    if ORJSONParser().parse(io.BytesIO(body)) != JSONParser().parse(io.BytesIO(body)):
+                        raise AssertionError(f'{name}: orjson parser disagrees with JSONParser at {size} rows')
+                    steps = [
+                        ('render', lambda: JSONRenderer().render(data), lambda: ORJSONRenderer().render(data)),
+                        ('parse', lambda: JSONParser().parse(io.BytesIO(body)), lambda: ORJSONParser().parse(io.BytesIO(body))),
+                    ]
+                    for step, drf, fast in steps:
+                        drf_ms = self.best(drf, options['repeat'])
+                        fast_ms = self.best(fast, options['repeat'])
+                        self.stdout.write(f'{name:<12}{size:>8}{step:>8}{drf_ms:>10.2f}{fast_ms:>11.2f}{drf_ms / fast_ms:>8.1f}x{len(body):>12}')
+                transaction.set_rollback(True)
@@ -0,0 +1,68 @@
+import time
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from LittleLemonAPI.fast_serializers import menu_item_values, menu_item_list_data, CART_VALUES, cart_list_data, order_list_data
+from LittleLemonAPI.models import Category, MenuItem, Cart, Order, OrderLine
+from LittleLemonAPI.serializers import MenuItemSerializer, CartSerializer, OrderSerializer
+
+class Command(BaseCommand):
+    help = ('Seed menu items, cart lines and orders (rolled back afterwards) and compare the DRF serializers '
+            'with the values()-based fast path: rendered bytes must match, timings are reported.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        self.stdout.write(f"{'payload':<12}{'rows':>8}{'drf ms':>10}{'fast ms':>10}{'speedup':>9}{'bytes':>12}")
+        for size in options['sizes']:
+            with transaction.atomic():
+                user = self.seed(size)
+                menu = MenuItem.objects.filter(title__startswith='Bench').order_by('id')
+                cart = Cart.objects.filter(user=user).order_by('id')
+                orders = Order.objects.filter(customer__username__startswith='bench-serialize').order_by('id')
+                payloads = [
+                    ('menu items', lambda: MenuItemSerializer(menu.select_related('category'), many=True).data,
+                     lambda: menu_item_list_data(menu_item_values(menu))),
+                    ('cart', lambda: CartSerializer(cart.select_related('item'), many=True).data,
+                     lambda: cart_list_data(cart.values(*CART_VALUES))),
+                    ('orders', lambda: OrderSerializer(orders.with_items(), many=True).data,
+                     lambda: order_list_data(orders)),
+                ]
+                for name, drf, fast in payloads:
+                    start = time.perf_counter()
+                    drf_bytes = renderer.render(drf())
+                    drf_ms = (time.perf_counter() - start) * 1000
+                    start = time.perf_counter()
+                    fast_bytes = renderer.render(fast())
+                    fast_ms = (time.perf_counter() - start) * 1000
+                    if drf_bytes != fast_bytes:
+                        raise AssertionError(f'{name}: fast path output differs from the serializer at {size} rows')
+                    self.stdout.write(f'{name:<12}{size:>8}{drf_ms:>10.1f}{fast_ms:>10.1f}{drf_ms / fast_ms:>8.1f}x{len(fast_bytes):>12}')
+                transaction.set_rollback(True)
+
+    def seed(self, size):
+        category = Category.objects.create(name='Bench')
+        items = MenuItem.objects.bulk_create(
+            (MenuItem(title=f'Bench item {i}', price=Decimal(100 + i % 9000) / 100, category=category, featured=i % 7 == 0) for i in range(size)),
+            batch_size=5000,
+        )
+        user = User.objects.create_user('bench-serialize-cart')
+        Cart.objects.bulk_create(
+            (Cart(user=user, item=item, quantity=2, itemprice=item.price * 2) for item in items),
+            batch_size=5000,
+        )
+        customers = User.objects.bulk_create(User(username=f'bench-serialize-{i}', first_name=f'Customer {i}', email=f'c{i}@example.com') for i in range(100))
+        crew = User.objects.create_user('bench-serialize-crew', email='crew@example.com')
+        orders = Order.objects.bulk_create(
+            (Order(customer=customers[i % 100], deliver_crew=crew if i % 2 else None, total=Decimal('26.00')) for i in range(size)),
+            batch_size=5000,
+        )
+        OrderLine.objects.bulk_create(
+            (OrderLine(order=order, item=item, quantity=1 + j, title=item.title, price=item.price) for order in orders for j, item in enumerate(items[:3])),
+            batch_size=5000,
+        )
+        return user
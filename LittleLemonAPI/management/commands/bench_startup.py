@@ -0,0 +1,180 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+from LittleLemonAPI.roles import MANAGER
+
+# (route, path, account whose token the request carries)
+ROUTES = [
+    ('menu-items', '/api/menu-items', None),
+    ('menu-items/category', '/api/menu-items/category', None),
+    ('users/me', '/api/users/me', 'customer'),
+    ('cart/menu-items', '/api/cart/menu-items', 'customer'),
+    ('orders', '/api/orders', 'manager'),
+    ('groups/manager/users', '/api/groups/manager/users', 'manager'),
+]
+
+# (server, mode, LITTLELEMON_WARMUP, fork after loading): forked is a worker of a server that loads
+# the application once and then forks (gunicorn --preload); ASGI servers load it in every worker.
+MODES = [
+    ('wsgi', 'cold', '0', False),
+    ('wsgi', 'warm', '1', False),
+    ('wsgi', 'forked', '1', True),
+    ('asgi', 'cold', '0', False),
+    ('asgi', 'warm', '1', False),
+]
+
+# Runs in a fresh interpreter: loads the application the way a server worker does, then times each
+# route's first request and then a second round, to the first byte of the body.
+WORKER = r'''
+import asyncio, io, json, os, sys, time
+server, fork, routes = sys.argv[1], sys.argv[2] == '1', json.loads(sys.argv[3])
+
+def wsgi_request(application, path, token):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+        'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+    }
+    if token:
+        environ['HTTP_AUTHORIZATION'] = f'Token {token}'
+    status = []
+    start = time.perf_counter()
+    body = application(environ, lambda code, headers, exc_info=None: status.append(int(code.split()[0])))
+    chunks = iter(body)
+    next(chunks, b'')
+    elapsed = time.perf_counter() - start
+    for chunk in chunks:
+        pass
+    body.close()
+    return status[0], elapsed
+
+async def asgi_request(application, path, token):
+    headers = [(b'host', b'localhost')] + ([(b'authorization', f'Token {token}'.encode())] if token else [])
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http', 'path': path,
+        'raw_path': path.encode(), 'query_string': b'', 'root_path': '', 'headers': headers, 'client': ('127.0.0.1', 40000), 'server': ('localhost', 80),
+    }
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()
+    result = {}
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            result['status'] = message['status']
+        elif 'elapsed' not in result:
+            result['elapsed'] = time.perf_counter() - start
+    start = time.perf_counter()
+    await application(scope, receive, send)
+    return result['status'], result['elapsed']
+
+async def serve_asgi():
+    # Imported inside the event loop, as uvicorn does.
+    start = time.perf_counter()
+    from LittLemon.asgi import application
+    loaded = time.perf_counter() - start
+    return loaded, [[await asgi_request(application, path, token) for path, token in routes] for _ in range(2)]
+
+if server == 'asgi':
+    loaded, rounds = asyncio.run(serve_asgi())
+else:
+    start = time.perf_counter()
+    from LittLemon.wsgi import application
+    loaded = time.perf_counter() - start
+    if fork:
+        pid = os.fork()
+        if pid:
+            os.waitpid(pid, 0)
+            sys.exit()
+        loaded = 0.0
+    rounds = [[wsgi_request(application, path, token) for path, token in routes] for _ in range(2)]
+print(json.dumps({'loaded': loaded, 'rounds': rounds}), flush=True)
+if fork:
+    os._exit(0)
+'''
+
+def prepare():
+    # Idempotent: a manager and a customer with tokens, in the database the workers will use.
+    tokens = {}
+    with transaction.atomic():
+        for role in ('manager', 'customer'):
+            user, _ = User.objects.get_or_create(username=f'bench-startup-{role}', defaults={'first_name': role, 'email': f'bench-startup-{role}@example.com'})
+            if role == 'manager':
+                user.groups.add(Group.objects.get_or_create(name=MANAGER)[0])
+            tokens[role] = Token.objects.get_or_create(user=user)[0].key
+    return tokens
+
+def cleanup():
+    User.objects.filter(username__startswith='bench-startup-').delete()
+
+class Command(BaseCommand):
+    help = ('Start fresh worker processes with and without the startup warmup and measure, per worker, how long loading '
+            'LittLemon.wsgi / LittLemon.asgi takes and the time to first byte of its first request on each route (then of a '
+            'second round, for comparison). Requests are made in-process against this settings\' database; throttling is off.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=5, help='Worker processes started per server and mode')
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], action='append', help='Only this server (repeatable)')
+
+    def handle(self, *args, **options):
+        servers = options['server'] or ['wsgi', 'asgi']
+        tokens = prepare()
+        routes = [(path, tokens.get(account)) for _, path, account in ROUTES]
+        results = {}
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for server, mode, warmup, fork in MODES:
+                    if server not in servers:
+                        continue
+                    env = dict(
+                        os.environ,
+                        LITTLELEMON_WARMUP=warmup,
+                        LITTLELEMON_THROTTLING='0',
+                        LITTLELEMON_THROTTLE_DATABASE=os.path.join(directory, 'throttle.sqlite3'),
+                        LITTLELEMON_METRICS_DATABASE=os.path.join(directory, 'metrics.sqlite3'),
+                        LITTLELEMON_JOBS_DATABASE=os.path.join(directory, 'jobs.sqlite3'),
+                        LITTLELEMON_CACHE_DATABASE=os.path.join(directory, 'cache.sqlite3'),
+                        LITTLELEMON_ORDER_EVENTS_DATABASE=os.path.join(directory, 'order_events.sqlite3'),
+                    )
+                    results[server, mode] = [self.start_worker(server, fork, routes, env) for _ in range(options['workers'])]
+        finally:
+            cleanup()
+        for server in servers:
+            self.print_report(server, {mode: runs for (name, mode), runs in results.items() if name == server})
+
+    def start_worker(self, server, fork, routes, env):
+        process = subprocess.run(
+            [sys.executable, '-c', WORKER, server, '1' if fork else '0', json.dumps(routes)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if process.returncode or not process.stdout.strip():
+            raise CommandError(f'{server} worker failed:\n{process.stderr}')
+        run = json.loads(process.stdout.strip().splitlines()[-1])
+        failed = {ROUTES[i][0]: status for i, (status, _) in enumerate(run['rounds'][0]) if status >= 500 or status in (401, 403, 429)}
+        if failed:
+            raise CommandError(f'{server} worker got {failed}:\n{process.stderr}')
+        return run
+
+    def print_report(self, server, runs):
+        def median(values):
+            return statistics.median(values) * 1000
+        modes = list(runs)
+        title = f'{server} workers, ms (median of {len(runs[modes[0]])})'
+        self.stdout.write(f'{title:<34}' + ''.join(f'{mode:>10}' for mode in modes))
+        rows = [('load application', {mode: median([run['loaded'] for run in runs[mode]]) for mode in modes})]
+        for i, (route, _, _) in enumerate(ROUTES):
+            rows.append((f'  first {route}', {mode: median([run['rounds'][0][i][1] for run in runs[mode]]) for mode in modes}))
+        rows.append(('load + first byte', {mode: median([run['loaded'] + run['rounds'][0][0][1] for run in runs[mode]]) for mode in modes}))
+        rows.append(('first round total', {mode: median([sum(elapsed for _, elapsed in run['rounds'][0]) for run in runs[mode]]) for mode in modes}))
+        rows.append(('second round total', {mode: median([sum(elapsed for _, elapsed in run['rounds'][1]) for run in runs[mode]]) for mode in modes}))
+        for label, values in rows:
+            self.stdout.write(f'{label:<34}' + ''.join(f'{values[mode]:>10.1f}' for mode in modes))
+        self.stdout.write('')
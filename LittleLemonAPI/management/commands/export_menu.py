@@ -0,0 +1,16 @@
+import json
+from django.core.management.base import BaseCommand
+from LittleLemonAPI.exports import menu_csv_rows, menu_items_export
+
+class Command(BaseCommand):
+    help = 'Write every menu item to stdout as CSV or JSON, in the format import_menu reads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+
+    def handle(self, *args, **options):
+        if options['format'] == 'csv':
+            for line in menu_csv_rows():
+                self.stdout.write(line, ending='')
+        else:
+            self.stdout.write(json.dumps(menu_items_export(), indent=2))
@@ -0,0 +1,24 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from LittleLemonAPI.menu_import import read_menu_rows, import_menu_rows, IMPORT_BATCH_SIZE
+
+class Command(BaseCommand):
+    help = 'Create or update menu items in bulk from a CSV or JSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'json'])
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or ('csv' if options['path'].endswith('.csv') else 'json')
+        try:
+            with open(options['path'], 'rb') as menu_file:
+                rows = read_menu_rows(menu_file.read(), file_format)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not read {options['path']}: {exc}")
+        report = import_menu_rows(rows, batch_size=options['batch_size'])
+        self.stdout.write(f"Created {report['created']}, updated {report['updated']} menu items "
+                          f"and {report['categories_created']} categories")
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
@@ -0,0 +1,144 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from LittleLemonAPI import rollups
+from LittleLemonAPI.catalog import bump_catalog_version
+from LittleLemonAPI.loadtest import SCENARIOS, LOADTEST_PASSWORD, LOADTEST_CATEGORY, run_scenarios
+from LittleLemonAPI.models import Category, MenuItem
+from LittleLemonAPI.roles import MANAGER, DELIVER_CREW
+
+LOADTEST_ITEMS = 20
+
+def prepare(users):
+    # Idempotent: the accounts and menu the scenarios use, created through the ORM in the
+    # database the server under test uses. Passwords are only hashed for new accounts.
+    groups = {MANAGER: Group.objects.get_or_create(name=MANAGER)[0], DELIVER_CREW: Group.objects.get_or_create(name=DELIVER_CREW)[0]}
+
+    def account(username, group=None):
+        user, created = User.objects.get_or_create(username=username, defaults={'first_name': username, 'email': f'{username}@example.com'})
+        if created:
+            user.set_password(LOADTEST_PASSWORD)
+            user.save()
+            if group:
+                user.groups.add(groups[group])
+        return user
+
+    with transaction.atomic():
+        accounts = {
+            'customer': [account(f'loadtest-customer-{i}') for i in range(users)],
+            'deliver_crew': [account(f'loadtest-crew-{i}', DELIVER_CREW) for i in range(users)],
+            'manager': [account(f'loadtest-manager-{i}', MANAGER) for i in range(users)],
+        }
+        spares = [account(f'loadtest-spare-{i}') for i in range(users)]
+        category = Category.objects.get_or_create(name=LOADTEST_CATEGORY)[0]
+        items = [
+            MenuItem.objects.get_or_create(title=f'Load test item {i}', defaults={'price': Decimal(250 + 75 * i) / 100, 'category': category})[0]
+            for i in range(LOADTEST_ITEMS)
+        ]
+    bump_catalog_version()
+    return {
+        'password': LOADTEST_PASSWORD,
+        'accounts': {scenario: [user.username for user in users] for scenario, users in accounts.items()},
+        'customers': [user.username for user in accounts['customer']],
+        'crew': [user.id for user in accounts['deliver_crew']],
+        'spares': [{'id': user.id, 'username': user.username} for user in spares],
+        'category': {'id': category.id, 'name': category.name},
+        'items': [item.id for item in items],
+        'prices': [item.price for item in items],
+    }
+
+def cleanup():
+    # Deleting the users cascades to their carts and orders behind the rollups' back, so rebuild them.
+    with transaction.atomic():
+        User.objects.filter(username__startswith='loadtest-').delete()
+        Category.objects.filter(name__startswith='loadtest-').delete()
+        Category.objects.filter(name=LOADTEST_CATEGORY).delete()
+    rollups.rebuild()
+    bump_catalog_version()
+
+class Command(BaseCommand):
+    help = ('Run scripted load scenarios (anonymous browsing, customer cart->checkout, deliver crew status updates, '
+            'manager listing) over every API route and token/login against a running server, e.g.\n'
+            '  LITTLELEMON_THROTTLING=0 LITTLELEMON_QUERY_COUNT_HEADER=1 manage.py runserver --noreload\n'
+            '  LITTLELEMON_THROTTLING=0 LITTLELEMON_QUERY_COUNT_HEADER=1 gunicorn LittLemon.wsgi -w 4\n'
+            '  manage.py loadtest --url http://127.0.0.1:8000 --output run.json [--baseline previous.json]\n'
+            'Test accounts and menu items are created in this settings\' database, which must be the server\'s. '
+            'Run against a copy of the database; --cleanup removes the load test data afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server under test')
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=list(SCENARIOS), help='Scenario to run (repeatable, default all)')
+        parser.add_argument('--users', type=int, default=5, help='Virtual users per scenario')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='Results JSON of an earlier run to compare with')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the load test accounts, menu items and their orders afterwards')
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'] or list(SCENARIOS)
+        fixtures = prepare(options['users'])
+        started_at = datetime.now(timezone.utc).isoformat()
+        try:
+            report = asyncio.run(run_scenarios(options['url'], scenarios, options['users'], options['duration'], fixtures, options['seed']))
+        except (OSError, RuntimeError) as exc:
+            raise CommandError(str(exc))
+        finally:
+            if options['cleanup']:
+                cleanup()
+        report = {
+            'url': options['url'],
+            'started_at': started_at,
+            'scenarios_run': scenarios,
+            'users': options['users'],
+            'duration': options['duration'],
+            'seed': options['seed'],
+            **report,
+        }
+        self.print_report(report)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                self.print_comparison(json.load(baseline), report)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+    def print_report(self, report):
+        def row(label, stats):
+            queries = '-' if stats['queries_mean'] is None else f"{stats['queries_mean']:.1f}"
+            return (f"{label:<52}{stats['requests']:>8}{stats['rps']:>9.1f}{stats['p50']:>9.1f}{stats['p95']:>9.1f}"
+                    f"{stats['p99']:>9.1f}{queries:>9}{stats['failures'] + stats['errors']:>7}")
+
+        self.stdout.write(f"{'scenario / route':<52}{'reqs':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'fail':>7}")
+        for route in report['routes']:
+            self.stdout.write(row(f"{route['scenario']:<13}{route['method']:<7}{route['route']}", route))
+        for scenario, stats in report['scenarios'].items():
+            self.stdout.write(row(f'{scenario} (all)', stats))
+        self.stdout.write(row('total', report['totals']))
+        if report['totals']['queries_mean'] is None:
+            self.stdout.write('No X-Query-Count headers: start the server with LITTLELEMON_QUERY_COUNT_HEADER=1 to report SQL queries.')
+        if report['uncovered_routes']:
+            self.stdout.write(self.style.WARNING(f"Routes not exercised: {', '.join(report['uncovered_routes'])}"))
+        for route in report['routes']:
+            if route['failures'] or route['errors']:
+                self.stdout.write(self.style.WARNING(f"{route['method']} {route['route']} ({route['scenario']}): statuses {route['statuses']}, {route['errors']} connection errors"))
+
+    def print_comparison(self, baseline, report):
+        previous = {(route['scenario'], route['method'], route['route']): route for route in baseline['routes']}
+        self.stdout.write(f"\n{'compared with ' + baseline.get('started_at', 'baseline'):<52}{'req/s':>11}{'p95 ms':>17}{'queries':>15}")
+        for route in report['routes']:
+            before = previous.get((route['scenario'], route['method'], route['route']))
+            if before is None:
+                continue
+            queries = '' if route['queries_mean'] is None or before['queries_mean'] is None else f"{before['queries_mean']:.1f}->{route['queries_mean']:.1f}"
+            self.stdout.write(f"{route['scenario']:<13}{route['method']:<7}{route['route']:<32}{self.change(before['rps'], route['rps']):>11}"
+                              f"{self.change(before['p95'], route['p95']):>17}{queries:>15}")
+
+    def change(self, before, after):
+        if not before:
+            return f'{after:.1f}'
+        return f'{after:.1f} ({(after - before) / before:+.0%})'
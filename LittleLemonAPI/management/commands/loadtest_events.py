@@ -0,0 +1,104 @@
+import asyncio
+import json
+import resource
+from decimal import Decimal
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+from LittleLemonAPI import rollups
+from LittleLemonAPI.loadtest import run_event_streams
+from LittleLemonAPI.models import Order
+from LittleLemonAPI.roles import DELIVER_CREW
+
+def prepare(customers):
+    # Idempotent: customers with a token and one order each, all assigned to one deliver crew
+    # member. Every order starts the run as not delivered.
+    def account(username):
+        user, created = User.objects.get_or_create(username=username, defaults={'first_name': username, 'email': f'{username}@example.com'})
+        if created:
+            user.set_unusable_password()
+            user.save()
+        return user, Token.objects.get_or_create(user=user)[0].key
+
+    with transaction.atomic():
+        crew, crew_token = account('loadtest-events-crew')
+        crew.groups.add(Group.objects.get_or_create(name=DELIVER_CREW)[0])
+        fixtures = {'crew': {'id': crew.id, 'token': crew_token}, 'customers': []}
+        for i in range(customers):
+            customer, token = account(f'loadtest-events-{i}')
+            order = Order.objects.filter(customer=customer).first() or Order.objects.create(customer=customer, deliver_crew=crew, total=Decimal('0.00'))
+            fixtures['customers'].append({'id': customer.id, 'token': token, 'order': order.id})
+        Order.objects.filter(customer__username__startswith='loadtest-events-').update(status='0', deliver_crew=crew)
+    # The orders were written behind the rollups' back.
+    rollups.rebuild()
+    return fixtures
+
+def cleanup():
+    with transaction.atomic():
+        User.objects.filter(username__startswith='loadtest-events-').delete()
+    rollups.rebuild()
+
+def process_status(pid):
+    with open(f'/proc/{pid}/status') as status:
+        fields = dict(line.split(':', 1) for line in status)
+    return {'rss_kb': int(fields['VmRSS'].split()[0]), 'threads': int(fields['Threads'])}
+
+class Command(BaseCommand):
+    help = ('Hold many idle orders/events streams open against a running ASGI server, then time how long deliver crew '
+            'status updates take to reach them, e.g.\n'
+            '  LITTLELEMON_THROTTLING=0 uvicorn LittLemon.asgi:application --workers 1 --port 8000\n'
+            '  manage.py loadtest_events --url http://127.0.0.1:8000 --connections 5000 --pid <uvicorn pid>\n'
+            'With several workers, --pid reports one of them. Test accounts and orders are '
+            'created in this settings\' database, which must be the server\'s; --cleanup removes them afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the ASGI server under test')
+        parser.add_argument('--connections', type=int, default=2000, help='Streams to hold open')
+        parser.add_argument('--customers', type=int, default=50, help='Customers the streams are spread over, one order each')
+        parser.add_argument('--idle', type=float, default=20, help='Seconds to hold every stream idle before the updates')
+        parser.add_argument('--updates', type=int, default=50, help='Order status updates to time')
+        parser.add_argument('--pid', type=int, help='Server process to report memory and threads of')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the load test accounts and orders afterwards')
+
+    def handle(self, *args, **options):
+        # One socket per stream, plus the server's side when it runs on this machine.
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < options['connections'] + 100:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        fixtures = prepare(options['customers'])
+        server = {}
+        try:
+            if options['pid']:
+                server['before'] = process_status(options['pid'])
+            report = asyncio.run(run_event_streams(
+                options['url'], fixtures, options['connections'], options['idle'], options['updates'],
+                # Sampled once every stream has been open and idle for --idle seconds.
+                on_idle=(lambda: server.update(held=process_status(options['pid']))) if options['pid'] else None,
+            ))
+        except (OSError, RuntimeError) as exc:
+            raise CommandError(str(exc))
+        finally:
+            if options['cleanup']:
+                cleanup()
+        report.update(url=options['url'], customers=options['customers'], idle=options['idle'], server=server)
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+    def print_report(self, report):
+        self.stdout.write(f"streams      {report['opened']}/{report['connections']} opened in {report['connect_seconds']:.1f}s "
+                          f"(connect p50 {report['connect_p50']:.1f} ms, p99 {report['connect_p99']:.1f} ms), {report['dropped']} dropped")
+        if report['refused']:
+            self.stdout.write(self.style.WARNING(f"refused      {report['refused']}"))
+        self.stdout.write(f"idle         {report['idle']:.0f}s, {report['keep_alives']} keep-alives received")
+        self.stdout.write(f"updates      {report['updates']} ({report['update_errors']} failed), PATCH p50 {report['update_p50']:.1f} ms, p99 {report['update_p99']:.1f} ms")
+        self.stdout.write(f"deliveries   {report['deliveries']} received, {report['missed']} missed; latency p50 {report['delivery_p50']:.1f} ms, "
+                          f"p99 {report['delivery_p99']:.1f} ms, max {report['delivery_max']:.1f} ms")
+        if 'held' in report['server']:
+            before, held = report['server']['before'], report['server']['held']
+            per_stream = (held['rss_kb'] - before['rss_kb']) / report['opened'] if report['opened'] else 0
+            self.stdout.write(f"server       RSS {before['rss_kb'] / 1024:.1f} -> {held['rss_kb'] / 1024:.1f} MiB ({per_stream:.1f} KiB per stream), "
+                              f"threads {before['threads']} -> {held['threads']}")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from LittleLemonAPI import rollups
+from LittleLemonAPI.models import DailySales, ItemSales
+
+class Command(BaseCommand):
+    help = 'Rebuild the sales rollups behind reports/sales from Order and OrderLine, then check them against a full scan.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only compare the stored rollups with a full scan.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            rollups.rebuild(batch_size=options['batch_size'])
+            self.stdout.write(f'Rebuilt {DailySales.objects.count()} daily and {ItemSales.objects.count()} item rollups')
+        differences = rollups.compare()
+        for kind, key, stored, scanned in differences:
+            self.stderr.write(f'{kind} {key}: stored {stored}, full scan {scanned}')
+        if differences:
+            raise CommandError(f'{len(differences)} rollups differ from a full scan')
+        self.stdout.write('Rollups match a full scan')
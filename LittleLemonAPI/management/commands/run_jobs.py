@@ -0,0 +1,24 @@
+import signal
+import threading
+from django.core.management.base import BaseCommand
+from LittleLemonAPI.jobs import job_queue, run_pool
+
+class Command(BaseCommand):
+    help = ('Run the background job workers: --processes forked processes of --threads threads each, '
+            'polling the job queue until stopped (SIGTERM or Ctrl-C; jobs in progress are finished first).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--batch', type=int, default=1, help='Jobs each worker claims at a time')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is ready instead of polling')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: stop.set())
+        self.stdout.write(f"Running {options['processes']} x {options['threads']} job workers; queue {job_queue.counts()}")
+        result = run_pool(job_queue, options['processes'], options['threads'], stop, options['burst'], batch_size=options['batch'])
+        if result is not None:
+            self.stdout.write(f'{result[0]} jobs done, {result[1]} failed attempts')
+        self.stdout.write(f'Queue {job_queue.counts()}')
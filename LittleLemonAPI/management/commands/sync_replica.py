@@ -0,0 +1,24 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from LittleLemonAPI.routers import REPLICA, sync_replica
+
+class Command(BaseCommand):
+    help = 'Copy the primary database into the read replica (LITTLELEMON_REPLICA_DATABASE), once or on an interval.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep running, copying every this many seconds (keep below REPLICA_LAG).')
+
+    def handle(self, *args, **options):
+        if REPLICA not in settings.DATABASES:
+            raise CommandError('No replica configured; set LITTLELEMON_REPLICA_DATABASE')
+        primary, replica = settings.DATABASES['default']['NAME'], settings.DATABASES[REPLICA]['NAME']
+        if options['interval'] is not None and options['interval'] >= settings.REPLICA_LAG:
+            self.stderr.write(f'Warning: an interval of {options["interval"]}s lets the replica fall further behind than REPLICA_LAG ({settings.REPLICA_LAG}s)')
+        while True:
+            start = time.perf_counter()
+            sync_replica(primary, replica)
+            if options['interval'] is None:
+                self.stdout.write(f'Copied {primary} to {replica} in {time.perf_counter() - start:.2f}s')
+                return
+            time.sleep(options['interval'])
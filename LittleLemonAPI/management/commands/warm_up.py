@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from LittleLemonAPI.warmup import warm_up
+
+class Command(BaseCommand):
+    help = ('Run the warmup steps wsgi.py and asgi.py run before a worker serves requests, and report how long each took. '
+            'With a shared cache backend this also primes that cache for the running workers.')
+
+    def handle(self, *args, **options):
+        for name, seconds, error in warm_up():
+            line = f'{name:<14}{seconds * 1000:>8.1f} ms'
+            if error is None:
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.WARNING(f'{line}  failed: {error!r}'))
@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+from django.db import transaction
+from rest_framework import serializers
+from .catalog import bump_catalog_version
+from .models import Category, MenuItem
+
+MENU_FIELDS = ['id', 'title', 'price', 'category', 'featured']
+IMPORT_BATCH_SIZE = 500
+
+class MenuItemImportSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False, allow_null=True)
+    title = serializers.CharField(max_length=255)
+    price = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0)
+    category = serializers.CharField(max_length=255)
+    featured = serializers.BooleanField(default=False)
+
+def read_menu_rows(content, file_format):
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    if file_format == 'csv':
+        # Empty CSV cells mean "not given", e.g. no id for a new item.
+        return [{key: value for key, value in row.items() if value not in ('', None)} for row in csv.DictReader(io.StringIO(content))]
+    rows = json.loads(content)
+    return rows.get('items', []) if isinstance(rows, dict) else rows
+
+def import_menu_rows(rows, batch_size=IMPORT_BATCH_SIZE):
+    valid, errors = [], []
+    # A row is matched by its id, or without one by its title. When two rows would match the same
+    # item, or create the same title twice, only the first one is imported.
+    first_rows = {}
+    for number, row in enumerate(rows, start=1):
+        serializer = MenuItemImportSerializer(data=row)
+        if not serializer.is_valid():
+            errors.append({ "row" : number, "errors" : serializer.errors })
+            continue
+        data = serializer.validated_data
+        key = ('id', data['id']) if data.get('id') else ('title', data['title'])
+        if key in first_rows:
+            errors.append({ "row" : number, "errors" : { key[0] : [f"Also on row {first_rows[key]}"] } })
+            continue
+        first_rows[key] = number
+        first_rows.setdefault(('title', data['title']), number)
+        valid.append((number, data))
+
+    with transaction.atomic():
+        # Looked up inside the transaction, which takes the write lock as it begins (IMMEDIATE), so a concurrent
+        # import cannot add the same titles in between.
+        ids = {data['id'] for _, data in valid if data.get('id')}
+        by_id = MenuItem.objects.in_bulk(ids)
+        by_title = dict(MenuItem.objects.filter(title__in={data['title'] for _, data in valid}).values_list('title', 'id'))
+        to_create, to_update, updated_rows = [], [], {}
+        for number, data in valid:
+            item_id = data.get('id') or by_title.get(data['title'])
+            if data.get('id') and item_id not in by_id:
+                errors.append({ "row" : number, "errors" : { "id" : ["Menu item does not exist"] } })
+                continue
+            if item_id in updated_rows:
+                # One row names the item by id and another by its current title.
+                errors.append({ "row" : number, "errors" : { "id" if data.get('id') else "title" : [f"Also on row {updated_rows[item_id]}"] } })
+                continue
+            item = MenuItem(id=item_id, title=data['title'], price=data['price'], featured=data['featured'])
+            item.category_name = data['category']
+            if item_id:
+                updated_rows[item_id] = number
+                to_update.append(item)
+            else:
+                to_create.append(item)
+
+        names = {item.category_name for item in to_create + to_update}
+        categories = dict(Category.objects.filter(name__in=names).order_by('-id').values_list('name', 'id'))
+        missing = [Category(name=name) for name in sorted(names - categories.keys())]
+        for category in Category.objects.bulk_create(missing, batch_size=batch_size):
+            categories[category.name] = category.id
+        for item in to_create + to_update:
+            item.category_id = categories[item.category_name]
+        MenuItem.objects.bulk_create(to_create, batch_size=batch_size)
+        MenuItem.objects.bulk_update(to_update, ['title', 'price', 'category', 'featured'], batch_size=batch_size)
+        if to_create or to_update:
+            transaction.on_commit(bump_catalog_version)
+
+    errors.sort(key=lambda error: error['row'])
+    return { "created" : len(to_create), "updated" : len(to_update), "categories_created" : len(missing), "errors" : errors }
@@ -0,0 +1,251 @@
+import atexit
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from django.conf import settings
+
+# The worker id the totals of exited workers are folded into.
+RETIRED = 'retired'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help); histogram series are stored as <name>_bucket, _sum and _count.
+FAMILIES = {
+    'littlelemon_requests_total': ('counter', 'Requests handled, by route, method and status.'),
+    'littlelemon_request_duration_seconds': ('histogram', 'Time from the first middleware to the last response byte.'),
+    'littlelemon_db_queries_total': ('counter', 'SQL queries run while handling requests.'),
+    'littlelemon_db_query_seconds_total': ('counter', 'Time spent running SQL queries.'),
+    'littlelemon_serialization_seconds_total': ('counter', 'Time spent rendering response data to bytes.'),
+    'littlelemon_response_bytes_total': ('counter', 'Response body bytes sent.'),
+}
+
+# The stats of the request being handled. A context variable rather than a thread local so
+# it follows async views into the threads sync_to_async runs their ORM calls in.
+request_stats = contextvars.ContextVar('request_stats', default=None)
+
+class RequestStats:
+    __slots__ = ('start', 'queries', 'sql', 'serialization')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.serialization = 0.0
+
+def record_query(execute, sql, params, many, context):
+    stats = request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.sql += time.perf_counter() - start
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+def record_serialization(seconds):
+    stats = request_stats.get()
+    if stats is not None:
+        stats.serialization += seconds
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsStore:
+    # Each worker process keeps its totals in memory and a background thread writes them every
+    # `flush_interval` seconds, as absolute values under the worker's own id, to a SQLite file
+    # shared by all workers. A scrape sums the rows, so counters add up across workers and never
+    # go backwards when a worker is restarted: an exiting worker folds its totals into the RETIRED
+    # rows, and a scrape does the same for workers that died without exiting cleanly, so the file
+    # holds one set of rows per running worker plus one. Without a path the store uses
+    # settings.METRICS_DATABASE, looked up on every use (override_settings in tests).
+    def __init__(self, path, flush_interval):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # Held while writing, so nothing is flushed under a worker id after it has been retired.
+        self.writing = threading.Lock()
+        self.pid = None
+        self.closed = False
+        atexit.register(self.close)
+
+    @property
+    def connection(self):
+        path = str(self.path or settings.METRICS_DATABASE)
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid() or self.local.path != path:
+            connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS metrics_series ('
+                'worker TEXT NOT NULL, name TEXT NOT NULL, labels TEXT NOT NULL, le TEXT NOT NULL, value REAL NOT NULL, '
+                'PRIMARY KEY (worker, name, labels, le)) WITHOUT ROWID'
+            )
+            connection.execute('CREATE TABLE IF NOT EXISTS metrics_worker (worker TEXT PRIMARY KEY, pid INTEGER NOT NULL) WITHOUT ROWID')
+            self.local.connection, self.local.pid, self.local.path = connection, os.getpid(), path
+        return connection
+
+    def worker(self):
+        # A process forked from one that already counted (gunicorn --preload) starts from zero under a new id.
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.worker_id = uuid.uuid4().hex
+            self.series = {}
+            self.dirty = set()
+            self.flushed = time.monotonic()
+            # Threads do not survive a fork, so every worker starts its own flusher.
+            threading.Thread(target=self.flush_periodically, args=(self.worker_id,), daemon=True).start()
+        return self.worker_id
+
+    def flush_periodically(self, worker_id):
+        while True:
+            time.sleep(self.flush_interval)
+            if self.worker_id != worker_id:
+                return
+            self.flush()
+
+    def add(self, name, labels, value, le=''):
+        key = (name, labels, le)
+        self.series[key] = self.series.get(key, 0) + value
+        self.dirty.add(key)
+
+    def observe(self, route, method, status, seconds, stats, size):
+        labels = f'method="{label_value(method)}",route="{label_value(route)}"'
+        with self.lock:
+            self.worker()
+            self.add('littlelemon_requests_total', f'{labels},status="{status}"', 1)
+            for bucket in LATENCY_BUCKETS:
+                if seconds <= bucket:
+                    self.add('littlelemon_request_duration_seconds_bucket', labels, 1, repr(bucket))
+            self.add('littlelemon_request_duration_seconds_bucket', labels, 1, '+Inf')
+            self.add('littlelemon_request_duration_seconds_sum', labels, seconds)
+            self.add('littlelemon_request_duration_seconds_count', labels, 1)
+            self.add('littlelemon_db_queries_total', labels, stats.queries)
+            self.add('littlelemon_db_query_seconds_total', labels, stats.sql)
+            self.add('littlelemon_serialization_seconds_total', labels, stats.serialization)
+            self.add('littlelemon_response_bytes_total', labels, size)
+
+    def flush(self, force=False):
+        with self.writing:
+            with self.lock:
+                if self.closed:
+                    return
+                worker = self.worker()
+                if not self.dirty or (not force and time.monotonic() - self.flushed < self.flush_interval):
+                    return
+                rows = self.dirty_rows(worker)
+            self.write(worker, rows)
+
+    def close(self):
+        # Run when the worker exits: what it counted since its last flush is written, and its
+        # totals are folded into the retired ones. Later flushes do nothing.
+        with self.writing:
+            with self.lock:
+                if self.closed:
+                    return
+                self.closed = True
+                if self.pid != os.getpid():
+                    # Nothing counted in this process.
+                    return
+                worker = self.worker_id
+                rows = self.dirty_rows(worker)
+            self.write(worker, rows, retire=True)
+
+    def dirty_rows(self, worker):
+        rows = [(worker, name, labels, le, self.series[(name, labels, le)]) for name, labels, le in self.dirty]
+        self.dirty = set()
+        self.flushed = time.monotonic()
+        return rows
+
+    def write(self, worker, rows, retire=False):
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('INSERT OR IGNORE INTO metrics_worker (worker, pid) VALUES (?, ?)', (worker, os.getpid()))
+            connection.executemany(
+                'INSERT INTO metrics_series (worker, name, labels, le, value) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (worker, name, labels, le) DO UPDATE SET value = excluded.value',
+                rows,
+            )
+            if retire:
+                self.retire(connection, [worker])
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def retire(self, connection, workers):
+        # Adds the workers' totals to the retired rows and drops theirs: the sums stay the same.
+        marks = ', '.join('?' * len(workers))
+        connection.execute(
+            f'INSERT INTO metrics_series (worker, name, labels, le, value) '
+            f'SELECT ?, name, labels, le, SUM(value) FROM metrics_series WHERE worker IN ({marks}) GROUP BY name, labels, le '
+            f'ON CONFLICT (worker, name, labels, le) DO UPDATE SET value = value + excluded.value',
+            (RETIRED, *workers),
+        )
+        connection.execute(f'DELETE FROM metrics_series WHERE worker IN ({marks})', workers)
+        connection.execute(f'DELETE FROM metrics_worker WHERE worker IN ({marks})', workers)
+
+    def retire_dead_workers(self):
+        # Workers killed before they could close, and rows written before workers were registered.
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            dead = [worker for worker, pid in connection.execute('SELECT worker, pid FROM metrics_worker') if not is_running(pid)]
+            dead += [worker for worker, in connection.execute(
+                'SELECT DISTINCT worker FROM metrics_series WHERE worker != ? AND worker NOT IN (SELECT worker FROM metrics_worker)', (RETIRED,)
+            )]
+            if dead:
+                self.retire(connection, dead)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def collect(self):
+        # (name, labels, le) -> value, summed over every worker that ever wrote to the file.
+        self.retire_dead_workers()
+        rows = self.connection.execute('SELECT name, labels, le, SUM(value) FROM metrics_series GROUP BY name, labels, le')
+        return {(name, labels, le): value for name, labels, le, value in rows}
+
+    def exposition(self):
+        # Prometheus text format 0.0.4.
+        series = self.collect()
+        lines = []
+        for family, (kind, description) in FAMILIES.items():
+            lines += [f'# HELP {family} {description}', f'# TYPE {family} {kind}']
+            suffixes = ('_bucket', '_sum', '_count') if kind == 'histogram' else ('',)
+            keys = [key for key in series if key[0] in {family + suffix for suffix in suffixes}]
+            keys.sort(key=lambda key: (key[1], suffixes.index(key[0][len(family):]), float(key[2] or 0)))
+            for name, labels, le in keys:
+                value = series[(name, labels, le)]
+                if le:
+                    labels = f'{labels},le="{le}"'
+                lines.append(f'{name}{{{labels}}} {int(value) if float(value).is_integer() else repr(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            self.pid = None
+        self.connection.execute('DELETE FROM metrics_series')
+        self.connection.execute('DELETE FROM metrics_worker')
+
+metrics_store = MetricsStore(None, settings.METRICS_FLUSH_INTERVAL)
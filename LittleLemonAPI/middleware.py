@@ -0,0 +1,129 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from .metrics import RequestStats, request_stats, install_query_recorder, metrics_store
+from .routers import REPLICA, wrote_primary
+
+class InstrumentationMiddleware:
+    # First in MIDDLEWARE. Records count, latency, SQL queries and time, serialization time and
+    # response size per resolved route into metrics_store, and sends the timings in Server-Timing.
+    # With QUERY_COUNT_HEADER on it also sends X-Query-Count for `manage.py loadtest`.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_recorder, dispatch_uid='littlelemon_query_recorder')
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_stats.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_stats.reset(token)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        match = request.resolver_match
+        route = match.route if match is not None else 'unmatched'
+        elapsed = time.perf_counter() - stats.start
+        response['Server-Timing'] = (
+            f'db;dur={stats.sql * 1000:.1f};desc="{stats.queries} queries", '
+            f'serialize;dur={stats.serialization * 1000:.1f}, app;dur={elapsed * 1000:.1f}'
+        )
+        if settings.QUERY_COUNT_HEADER:
+            response['X-Query-Count'] = str(stats.queries)
+        if response.streaming:
+            # Exports stream their body after the view returns; record once the last chunk is out.
+            if response.is_async:
+                response.streaming_content = self.astream(response.streaming_content, route, request.method, response.status_code, stats)
+            else:
+                response.streaming_content = self.stream(response.streaming_content, route, request.method, response.status_code, stats)
+        else:
+            metrics_store.observe(route, request.method, response.status_code, elapsed, stats, len(response.content))
+        return response
+
+    def stream(self, content, route, method, status, stats):
+        size = 0
+        try:
+            for chunk in self.counted(content, stats):
+                size += len(chunk)
+                yield chunk
+        finally:
+            metrics_store.observe(route, method, status, time.perf_counter() - stats.start, stats, size)
+
+    def counted(self, content, stats):
+        # Queries the body generator runs belong to this request too.
+        iterator = iter(content)
+        while True:
+            token = request_stats.set(stats)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                request_stats.reset(token)
+            yield chunk
+
+    async def astream(self, content, route, method, status, stats):
+        size = 0
+        try:
+            async for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            metrics_store.observe(route, method, status, time.perf_counter() - stats.start, stats, size)
+
+class PrimaryAfterWriteMiddleware:
+    # After a successful write, the user's listings read from the primary for REPLICA_LAG seconds
+    # (read your own writes). Only installed when a replica is configured.
+    sync_capable = True
+    async_capable = True
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        if REPLICA not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.remember(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if request.method not in self.SAFE_METHODS:
+            # request.user may still be the lazy session user, which needs the ORM.
+            await sync_to_async(self.remember)(request, response)
+        return response
+
+    def remember(self, request, response):
+        # DRF sets the user it authenticated on the underlying request as well.
+        user = getattr(request, 'user', None)
+        if request.method not in self.SAFE_METHODS and response.status_code < 400 and user is not None and user.is_authenticated:
+            wrote_primary(f'user:{user.pk}')
+
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+FORWARD_SQL = [
+    """CREATE VIRTUAL TABLE "LittleLemonAPI_menuitem_fts" USING fts5(title, category, prefix='2 3')""",
+    """CREATE TRIGGER "LittleLemonAPI_menuitem_fts_insert" AFTER INSERT ON "LittleLemonAPI_menuitem" BEGIN
+        INSERT INTO "LittleLemonAPI_menuitem_fts" (rowid, title, category)
+        SELECT new.id, new.title, name FROM "LittleLemonAPI_category" WHERE id = new.category_id;
+    END""",
+    """CREATE TRIGGER "LittleLemonAPI_menuitem_fts_update" AFTER UPDATE OF title, category_id ON "LittleLemonAPI_menuitem" BEGIN
+        DELETE FROM "LittleLemonAPI_menuitem_fts" WHERE rowid = old.id;
+        INSERT INTO "LittleLemonAPI_menuitem_fts" (rowid, title, category)
+        SELECT new.id, new.title, name FROM "LittleLemonAPI_category" WHERE id = new.category_id;
+    END""",
+    """CREATE TRIGGER "LittleLemonAPI_menuitem_fts_delete" AFTER DELETE ON "LittleLemonAPI_menuitem" BEGIN
+        DELETE FROM "LittleLemonAPI_menuitem_fts" WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER "LittleLemonAPI_category_fts_update" AFTER UPDATE OF name ON "LittleLemonAPI_category" BEGIN
+        UPDATE "LittleLemonAPI_menuitem_fts" SET category = new.name
+        WHERE rowid IN (SELECT id FROM "LittleLemonAPI_menuitem" WHERE category_id = new.id);
+    END""",
+    """INSERT INTO "LittleLemonAPI_menuitem_fts" (rowid, title, category)
+    SELECT m.id, m.title, c.name FROM "LittleLemonAPI_menuitem" m
+    JOIN "LittleLemonAPI_category" c ON c.id = m.category_id""",
+]
+
+BACKWARD_SQL = [
+    'DROP TRIGGER IF EXISTS "LittleLemonAPI_category_fts_update"',
+    'DROP TRIGGER IF EXISTS "LittleLemonAPI_menuitem_fts_delete"',
+    'DROP TRIGGER IF EXISTS "LittleLemonAPI_menuitem_fts_update"',
+    'DROP TRIGGER IF EXISTS "LittleLemonAPI_menuitem_fts_insert"',
+    'DROP TABLE IF EXISTS "LittleLemonAPI_menuitem_fts"',
+]
+
+def run_sql(statements):
+    def run(apps, schema_editor):
+        # The full-text index is SQLite specific; other backends keep the icontains search.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sql(FORWARD_SQL), run_sql(BACKWARD_SQL)),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    # Written against the historical models rather than with LittleLemonAPI.rollups, which follows
+    # the current ones: here order lines are still OrderItem rows linked through Order.items.
+    Order = apps.get_model('LittleLemonAPI', 'Order')
+    DailySales = apps.get_model('LittleLemonAPI', 'DailySales')
+    ItemSales = apps.get_model('LittleLemonAPI', 'ItemSales')
+    rows = Order.objects.annotate(day=TruncDate('date')).values('day', 'status', 'deliver_crew').annotate(orders=Count('id'), revenue=Sum('total'))
+    DailySales.objects.bulk_create(
+        [DailySales(day=row['day'], status=row['status'], deliver_crew_id=row['deliver_crew'], orders=row['orders'], revenue=row['revenue']) for row in rows],
+        batch_size=1000,
+    )
+    rows = Order.items.through.objects.values('orderitem__item').annotate(quantity=Sum('orderitem__quantity'))
+    ItemSales.objects.bulk_create(
+        [ItemSales(item_id=row['orderitem__item'], quantity=row['quantity']) for row in rows if row['quantity']],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0003_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=255)),
+                ('orders', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('deliver_crew', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('day', 'status', 'deliver_crew')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='LittleLemonAPI.menuitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-quantity'], name='itemsales_quantity_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
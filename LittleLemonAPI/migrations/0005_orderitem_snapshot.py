@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:16
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_snapshots(apps, schema_editor):
+    # What each line was ordered at is not recorded anywhere, so existing lines take the menu's
+    # current title and price. Walks the table in id order, one batch at a time.
+    OrderItem = apps.get_model('LittleLemonAPI', 'OrderItem')
+    last_id = 0
+    while True:
+        lines = list(OrderItem.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'item__title', 'item__price')[:BATCH_SIZE])
+        if not lines:
+            break
+        OrderItem.objects.bulk_update(
+            [OrderItem(id=line_id, title=title, price=price) for line_id, title, price in lines],
+            ['title', 'price'],
+        )
+        last_id = lines[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0004_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='title',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:20
+
+from django.db import migrations, transaction
+from django.db.models import Max
+
+BATCH_SIZE = 1000
+
+
+def split_order_items(apps, schema_editor):
+    # Gives every order its own copy of each OrderItem row it shared with the customer's other
+    # orders. Orders are walked in id order and each batch commits on its own, so if this is
+    # interrupted, running migrate again carries on after the last order that already has lines.
+    Order = apps.get_model('LittleLemonAPI', 'Order')
+    OrderLine = apps.get_model('LittleLemonAPI', 'OrderLine')
+    OrderItems = Order.items.through
+    alias = schema_editor.connection.alias
+    last_id = OrderLine.objects.using(alias).aggregate(last=Max('order'))['last'] or 0
+    while True:
+        order_ids = list(Order.objects.using(alias).filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not order_ids:
+            break
+        rows = OrderItems.objects.using(alias).filter(order__in=order_ids).order_by('order', 'orderitem').values_list(
+            'order', 'orderitem__item', 'orderitem__quantity', 'orderitem__title', 'orderitem__price'
+        )
+        with transaction.atomic(using=alias):
+            OrderLine.objects.using(alias).bulk_create(
+                OrderLine(order_id=order_id, item_id=item_id, quantity=quantity, title=title, price=price)
+                for order_id, item_id, quantity, title, price in rows
+            )
+        last_id = order_ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Commits batch by batch; see split_order_items.
+    atomic = False
+
+    dependencies = [
+        ('LittleLemonAPI', '0006_orderline'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_order_items, migrations.RunPython.noop),
+    ]
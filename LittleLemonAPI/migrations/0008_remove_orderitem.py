@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0007_split_order_items'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='order',
+            name='items',
+        ),
+        migrations.DeleteModel(
+            name='OrderItem',
+        ),
+    ]
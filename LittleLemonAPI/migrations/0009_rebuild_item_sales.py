@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:40
+
+from django.db import migrations
+from django.db.models import Sum
+
+
+def rebuild_item_sales(apps, schema_editor):
+    # 0004 summed the shared OrderItem rows; the item totals now come from each order's own lines.
+    ItemSales = apps.get_model('LittleLemonAPI', 'ItemSales')
+    OrderLine = apps.get_model('LittleLemonAPI', 'OrderLine')
+    alias = schema_editor.connection.alias
+    ItemSales.objects.using(alias).all().delete()
+    totals = OrderLine.objects.using(alias).values('item').annotate(quantity=Sum('quantity')).order_by()
+    ItemSales.objects.using(alias).bulk_create(
+        (ItemSales(item_id=row['item'], quantity=row['quantity']) for row in totals if row['quantity']),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0008_remove_orderitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_item_sales, migrations.RunPython.noop),
+    ]
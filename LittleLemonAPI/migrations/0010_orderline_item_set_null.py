@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0009_rebuild_item_sales'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderline',
+            name='item',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='LittleLemonAPI.menuitem'),
+        ),
+    ]
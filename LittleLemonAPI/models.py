@@ -5,6 +5,11 @@ from django.contrib.auth.models import User
 
 class Category(models.Model):
     name = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='category_name_idx'),
+        ]
     def __str__(self):
         return self.name
 
@@ -14,6 +19,13 @@ class MenuItem(models.Model):
     category = models.ForeignKey('Category', on_delete=models.CASCADE)
     featured = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['price'], name='menuitem_price_idx'),
+            models.Index(fields=['featured'], name='menuitem_featured_idx'),
+            models.Index(fields=['category', 'price'], name='menuitem_category_price_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -28,27 +40,77 @@ class Cart(models.Model):
     def __str__(self):
         return self.user
 
-class OrderItem(models.Model):
-    customer = models.ForeignKey(User, on_delete=models.CASCADE)
-    item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
-    quantity = models.PositiveBigIntegerField(default=1)
-
-    class Meta:
-        unique_together = ('customer', 'item')
-    def __str__(self):
-            return f"{self.customer} - {self.item} - {self.quantity}"
-
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        return self.select_related('customer', 'deliver_crew').prefetch_related(
+            models.Prefetch('lines', queryset=OrderLine.objects.order_by('order', 'id'))
+        )
 
 class Order(models.Model):
     customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="customer")
     deliver_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name="delivery_crew", null=True)
-    items = models.ManyToManyField(OrderItem)
     total = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=255, default=0)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='order_status_idx'),
+            models.Index(fields=['date'], name='order_date_idx'),
+            models.Index(fields=['deliver_crew', 'status', 'date'], name='order_crew_status_date_idx'),
+            models.Index(fields=['deliver_crew', 'date'], name='order_crew_date_idx'),
+            models.Index(fields=['customer', 'date'], name='order_customer_date_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.customer}"
 
+class OrderLine(models.Model):
+    # One row per item of one order, only ever bulk inserted: changing an order's items replaces its lines.
+    # Title and unit price are the menu item's when it was ordered, so orders render and total up without MenuItem,
+    # and a line outlives its menu item being deleted.
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines', db_index=False)
+    item = models.ForeignKey(MenuItem, on_delete=models.SET_NULL, null=True)
+    quantity = models.PositiveBigIntegerField(default=1)
+    title = models.CharField(max_length=255)
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            # An order's lines, in order, are one range scan.
+            models.Index(fields=['order', 'id'], name='orderline_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} - {self.item_id} - {self.quantity}"
 
 
+
+
+class DailySales(models.Model):
+    # Incrementally maintained by rollups.py; rebuild with `manage.py rebuild_sales_rollups`.
+    day = models.DateField()
+    status = models.CharField(max_length=255)
+    deliver_crew = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    orders = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('day', 'status', 'deliver_crew')
+
+    def __str__(self):
+        return f"{self.day} - {self.status} - {self.deliver_crew}"
+
+class ItemSales(models.Model):
+    item = models.OneToOneField(MenuItem, on_delete=models.CASCADE)
+    quantity = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-quantity'], name='itemsales_quantity_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item} - {self.quantity}"
@@ -0,0 +1,123 @@
+import json
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+def use_cursor_pagination(request):
+    return request.query_params.get('pagination') == 'cursor'
+
+class KeysetPagination(CursorPagination):
+    # Seeks on an indexed ordering instead of OFFSET and never runs COUNT(*). Every ordering ends
+    # with the primary key and the cursor holds the whole tuple of the row it stopped at. DRF seeks
+    # on the first field only and steps over ties with an offset, which scans a long run of equal
+    # prices. Here the rows after (x, y) are fetched one branch at a time: price = x AND id > y
+    # first, then price > x. Each branch is a range on one index, so every page costs the same.
+    page_size_query_param = 'per_page'
+    max_page_size = 100
+    orderings = {}
+
+    def get_ordering(self, request, queryset, view):
+        return self.orderings.get(request.query_params.get('ordering'), self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse, current_position = (self.cursor.reverse, self.cursor.position) if self.cursor else (False, None)
+        ordering = tuple(field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        limit = self.page_size + 1
+        if current_position is None:
+            results = list(queryset[:limit])
+        else:
+            values = self.decode_position(current_position)
+            results = []
+            for depth in range(len(ordering), 0, -1):
+                *equal, after = ordering[:depth]
+                lookups = {field.lstrip('-'): value for field, value in zip(equal, values)}
+                lookups[after.lstrip('-') + ('__lt' if after.startswith('-') else '__gt')] = values[depth - 1]
+                results += queryset.filter(**lookups)[:limit - len(results)]
+                if len(results) == limit:
+                    break
+        # From here on as in CursorPagination; positions are unique, so its offsets stay 0.
+        self.page = results[:self.page_size]
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def decode_position(self, position):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            values = None
+        if not isinstance(values, list) or len(values) != len(self.ordering) or not all(isinstance(value, str) for value in values):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [instance[field.lstrip('-')] if isinstance(instance, dict) else getattr(instance, field.lstrip('-')) for field in ordering]
+        return json.dumps([str(value) for value in values], separators=(',', ':'))
+
+class MenuItemCursorPagination(KeysetPagination):
+    ordering = ('price', 'id')
+    orderings = {
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'id': ('id',),
+        '-id': ('-id',),
+    }
+
+class OrderCursorPagination(KeysetPagination):
+    ordering = ('-date', '-id')
+    orderings = {
+        'date': ('date', 'id'),
+        '-date': ('-date', '-id'),
+        'id': ('id',),
+        '-id': ('-id',),
+    }
+
+class UserCursorPagination(KeysetPagination):
+    ordering = ('id',)
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    async def apaginate_queryset(self, queryset, request):
+        # Same as paginate_queryset, with the COUNT and the page fetched through the async ORM.
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        self.page.object_list = [item async for item in self.page.object_list]
+        return list(self.page)
@@ -1,8 +1,9 @@
 from rest_framework.permissions import BasePermission
+from .roles import is_manager
 
 class ManagerRole(BasePermission):
     def has_permission(self, request, view):
-        if request.user.groups.filter(name="Manager").exists():
+        if is_manager(request):
             return True
         else:
-            return False
\ No newline at end of file
+            return False
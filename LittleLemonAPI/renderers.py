@@ -0,0 +1,71 @@
+import time
+import orjson
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from .metrics import record_serialization
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+LINE_SEPARATORS = (b'\xe2\x80\xa8', b'\xe2\x80\xa9')
+
+def encode_default(obj):
+    # orjson writes str, int, float, dict, list, tuple and datetime itself; DRF's encoder covers
+    # the rest (Decimal as float, lazy strings, QuerySets, ...) exactly as JSONRenderer would.
+    return JSONEncoder().default(obj)
+
+class ORJSONRenderer(JSONRenderer):
+    # Same bytes as JSONRenderer for compact output, encoded by orjson straight to bytes.
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        start = time.perf_counter()
+        ret = self.encode(data, accepted_media_type, renderer_context)
+        record_serialization(time.perf_counter() - start)
+        return ret
+
+    def encode(self, data, accepted_media_type, renderer_context):
+        if data is None:
+            return b''
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
+        # JSONRenderer escapes U+2028 and U+2029 so the output stays a JavaScript subset.
+        if b'\xe2\x80' in ret:
+            ret = ret.replace(LINE_SEPARATORS[0], b'\\u2028').replace(LINE_SEPARATORS[1], b'\\u2029')
+        return ret
+
+class LazyRenderer(BaseRenderer):
+    # Content negotiation only needs media_type and format; the real renderer is
+    # imported and built the first time a client actually asks for it.
+    renderer_path = None
+
+    @cached_property
+    def renderer(self):
+        return import_string(self.renderer_path)()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        start = time.perf_counter()
+        ret = self.renderer.render(data, accepted_media_type, renderer_context)
+        record_serialization(time.perf_counter() - start)
+        return ret
+
+class LazyBrowsableAPIRenderer(LazyRenderer):
+    media_type = 'text/html'
+    format = 'api'
+    charset = 'utf-8'
+    renderer_path = 'rest_framework.renderers.BrowsableAPIRenderer'
+
+class LazyXMLRenderer(LazyRenderer):
+    media_type = 'application/xml'
+    format = 'xml'
+    charset = 'utf-8'
+    renderer_path = 'rest_framework_xml.renderers.XMLRenderer'
+
+class EventStreamRenderer(BaseRenderer):
+    # Lets EventSource clients (Accept: text/event-stream) through content negotiation. The stream
+    # itself is a StreamingHttpResponse; only errors such as 401 or 429 are rendered, as one event.
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b'event: error\ndata: %s\n\n' % orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
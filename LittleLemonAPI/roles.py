@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+MANAGER = 'Manager'
+DELIVER_CREW = 'Deliver Crew'
+
+def _cache_key(user_id):
+    return f'littlelemon:roles:{user_id}'
+
+def _group_cache_key(name):
+    return f"littlelemon:group:{name.replace(' ', '_')}"
+
+def get_roles(request):
+    # Resolved once per request, then shared across requests and workers through the cache.
+    roles = getattr(request, '_roles', None)
+    if roles is None:
+        user = request.user
+        if user is None or not user.is_authenticated:
+            roles = frozenset()
+        else:
+            roles = cache.get(_cache_key(user.pk))
+            if roles is None:
+                roles = frozenset(user.groups.values_list('name', flat=True))
+                cache.set(_cache_key(user.pk), roles, settings.ROLE_CACHE_TIMEOUT)
+        request._roles = roles
+    return roles
+
+async def aget_roles(request):
+    roles = getattr(request, '_roles', None)
+    if roles is None:
+        user = request.user
+        if user is None or not user.is_authenticated:
+            roles = frozenset()
+        else:
+            roles = await cache.aget(_cache_key(user.pk))
+            if roles is None:
+                roles = frozenset([name async for name in user.groups.values_list('name', flat=True)])
+                await cache.aset(_cache_key(user.pk), roles, settings.ROLE_CACHE_TIMEOUT)
+        request._roles = roles
+    return roles
+
+def is_manager(request):
+    return MANAGER in get_roles(request)
+
+def is_deliver_crew(request):
+    return DELIVER_CREW in get_roles(request)
+
+def invalidate_roles(*user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+def get_group(name):
+    # The role groups' rows, which the group membership views need on every write.
+    group = cache.get(_group_cache_key(name))
+    if group is None:
+        group = Group.objects.get(name=name)
+        cache.set(_group_cache_key(name), group, settings.ROLE_CACHE_TIMEOUT)
+    return group
+
+def prime_roles():
+    # Staff are few and make most of the authenticated requests; everyone else has no groups.
+    roles = {}
+    for user_id, name in User.groups.through.objects.values_list('user_id', 'group__name'):
+        roles.setdefault(user_id, set()).add(name)
+    cache.set_many({_cache_key(user_id): frozenset(names) for user_id, names in roles.items()}, settings.ROLE_CACHE_TIMEOUT)
+    return len(roles)
+
+@receiver(pre_save, sender=Group)
+def group_renamed(sender, instance, **kwargs):
+    # A renamed group is cached under the name it had.
+    if instance.pk is not None:
+        cache.delete_many([_group_cache_key(name) for name in Group.objects.filter(pk=instance.pk).values_list('name', flat=True)])
+
+@receiver([post_save, post_delete], sender=Group)
+def group_changed(sender, instance, **kwargs):
+    cache.delete(_group_cache_key(instance.name))
+
+@receiver(m2m_changed, sender=User.groups.through)
+def groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_roles(instance.pk)
+    elif action == 'pre_clear':
+        invalidate_roles(*instance.user_set.values_list('pk', flat=True))
+    elif pk_set:
+        invalidate_roles(*pk_set)
@@ -0,0 +1,94 @@
+from collections import Counter
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from .models import Order, OrderLine, DailySales, ItemSales
+
+def order_buckets(orders):
+    # (day, status, deliver crew) -> [orders, revenue] for the given Order queryset.
+    rows = orders.annotate(day=TruncDate('date')).values('day', 'status', 'deliver_crew').annotate(orders=Count('id'), revenue=Sum('total'))
+    return {(row['day'], row['status'], row['deliver_crew']): [row['orders'], row['revenue']] for row in rows}
+
+def item_quantities(lines):
+    # item -> quantity over the given order lines; lines of deleted menu items have no item to count under.
+    rows = lines.exclude(item=None).values('item').annotate(quantity=Sum('quantity'))
+    return {row['item']: row['quantity'] for row in rows}
+
+def snapshot(order_ids, lines=None):
+    # Capture what the given orders and order lines contribute before and after a write;
+    # the difference between the two is applied to the rollups by `apply`.
+    return (
+        order_buckets(Order.objects.filter(pk__in=order_ids)) if order_ids else {},
+        item_quantities(OrderLine.objects.filter(lines)) if lines is not None else {},
+    )
+
+def apply(before, after):
+    # Must run inside the transaction that made the write, so the rollups commit or roll back with it.
+    buckets = {}
+    for key in before[0].keys() | after[0].keys():
+        orders, revenue = after[0].get(key, [0, Decimal(0)])
+        old_orders, old_revenue = before[0].get(key, [0, Decimal(0)])
+        if (orders, revenue) != (old_orders, old_revenue):
+            buckets[key] = (orders - old_orders, revenue - old_revenue)
+    if buckets:
+        match = Q()
+        for day, status, deliver_crew in buckets:
+            match |= Q(day=day, status=status, deliver_crew=deliver_crew)
+        rows = {}
+        for row in DailySales.objects.select_for_update().filter(match):
+            rows.setdefault((row.day, row.status, row.deliver_crew_id), row)
+        for key, (orders, revenue) in buckets.items():
+            if key in rows:
+                rows[key].orders += orders
+                rows[key].revenue += revenue
+        DailySales.objects.bulk_update([row for key, row in rows.items() if key in buckets], ['orders', 'revenue'])
+        DailySales.objects.bulk_create(
+            [DailySales(day=day, status=status, deliver_crew_id=crew, orders=orders, revenue=revenue) for (day, status, crew), (orders, revenue) in buckets.items() if (day, status, crew) not in rows]
+        )
+    items = Counter(after[1])
+    items.subtract(before[1])
+    items = {item: quantity for item, quantity in items.items() if quantity}
+    if items:
+        # One locked read and one upsert, however many items the order touched.
+        current = dict(ItemSales.objects.select_for_update().filter(item_id__in=items).values_list('item_id', 'quantity'))
+        ItemSales.objects.bulk_create(
+            [ItemSales(item_id=item, quantity=current.get(item, 0) + quantity) for item, quantity in items.items()],
+            update_conflicts=True,
+            unique_fields=['item'],
+            update_fields=['quantity'],
+        )
+
+def full_scan():
+    return order_buckets(Order.objects.all()), item_quantities(OrderLine.objects.all())
+
+def stored():
+    buckets = {}
+    for row in DailySales.objects.values('day', 'status', 'deliver_crew', 'orders', 'revenue'):
+        bucket = buckets.setdefault((row['day'], row['status'], row['deliver_crew']), [0, Decimal(0)])
+        bucket[0] += row['orders']
+        bucket[1] += row['revenue']
+    return (
+        {key: value for key, value in buckets.items() if value[0] or value[1]},
+        {item: quantity for item, quantity in ItemSales.objects.values_list('item', 'quantity') if quantity},
+    )
+
+@transaction.atomic
+def rebuild(batch_size=1000):
+    DailySales.objects.all().delete()
+    ItemSales.objects.all().delete()
+    buckets, items = full_scan()
+    DailySales.objects.bulk_create(
+        [DailySales(day=day, status=status, deliver_crew_id=crew, orders=orders, revenue=revenue) for (day, status, crew), (orders, revenue) in buckets.items()],
+        batch_size=batch_size,
+    )
+    ItemSales.objects.bulk_create([ItemSales(item_id=item, quantity=quantity) for item, quantity in items.items() if quantity], batch_size=batch_size)
+
+def compare():
+    # Differences between the stored rollups and a full scan, as (kind, key, stored, scanned).
+    differences = []
+    for kind, rollup, scan in zip(('daily', 'item'), stored(), full_scan()):
+        for key in sorted(rollup.keys() | scan.keys(), key=str):
+            if rollup.get(key) != scan.get(key):
+                differences.append((kind, key, rollup.get(key), scan.get(key)))
+    return differences
@@ -0,0 +1,89 @@
+import contextvars
+import functools
+import sqlite3
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+REPLICA = 'replica'
+# The models the listing endpoints read; their queries (joins included) can run on the replica.
+REPLICA_MODELS = {
+    'LittleLemonAPI.menuitem',
+    'LittleLemonAPI.category',
+    'LittleLemonAPI.order',
+    'LittleLemonAPI.orderline',
+}
+RECENT_WRITE_KEY = 'littlelemon:replica:recent-write'
+
+use_replica = contextvars.ContextVar('use_replica', default=False)
+
+def wrote_primary(*scopes):
+    # Reads in these scopes stay on the primary until the replica has caught up with the write. The
+    # markers are in the shared cache, so the next request sees them whichever worker it lands on.
+    if REPLICA not in settings.DATABASES:
+        return
+    cache.set_many({f'{RECENT_WRITE_KEY}:{scope}': True for scope in scopes}, settings.REPLICA_LAG)
+
+def replica_is_current(scopes):
+    return not cache.get_many([f'{RECENT_WRITE_KEY}:{scope}' for scope in scopes])
+
+@contextmanager
+def replica_reads(*scopes):
+    token = use_replica.set(REPLICA in settings.DATABASES and replica_is_current(scopes))
+    try:
+        yield
+    finally:
+        use_replica.reset(token)
+
+def reads_from_replica(*scopes):
+    # Runs a listing on the replica unless the request's user, or anyone in `scopes`, wrote recently.
+    def decorator(func):
+        def scopes_for(args):
+            # The request is an argument, or the view the method belongs to holds it.
+            for arg in args:
+                request = arg if hasattr(arg, 'user') else getattr(arg, 'request', None)
+                if request is not None:
+                    if request.user and request.user.is_authenticated:
+                        return (*scopes, f'user:{request.user.pk}')
+                    break
+            return scopes
+
+        if iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with replica_reads(*scopes_for(args)):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with replica_reads(*scopes_for(args)):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and model._meta.label_lower in REPLICA_MODELS:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or instances read from the replica would be saved back to it.
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+def sync_replica(primary, replica):
+    # An online, consistent copy of the whole primary; replica readers keep their snapshot meanwhile.
+    source = sqlite3.connect(str(primary))
+    target = sqlite3.connect(str(replica), timeout=settings.SQLITE_PROFILE['BUSY_TIMEOUT'])
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
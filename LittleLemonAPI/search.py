@@ -0,0 +1,27 @@
+import re
+from django.db import connection
+
+MENU_ITEM_FTS_TABLE = 'LittleLemonAPI_menuitem_fts'
+
+def fts_query(search):
+    # Every word must match, each as a prefix: "pas sal" -> "pas"* "sal"*
+    return ' '.join(f'"{term}"*' for term in re.findall(r'\w+', search))
+
+def search_menu_items(items, search, ranked=True):
+    if connection.vendor != 'sqlite':
+        return items.filter(title__icontains=search)
+    match = fts_query(search)
+    if not match:
+        return items
+    # Join the FTS table on rowid so the full-text index drives the query.
+    select = {'search_rank': f'bm25("{MENU_ITEM_FTS_TABLE}", 10.0, 1.0)'} if ranked else None
+    items = items.extra(
+        select=select,
+        tables=[MENU_ITEM_FTS_TABLE],
+        where=[f'"{MENU_ITEM_FTS_TABLE}".rowid = "LittleLemonAPI_menuitem"."id"', f'"{MENU_ITEM_FTS_TABLE}" MATCH %s'],
+        params=[match],
+    )
+    if ranked:
+        # bm25 is lower for better matches; titles weigh more than category names.
+        items = items.order_by('search_rank', 'id')
+    return items
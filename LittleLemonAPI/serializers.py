@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import MenuItem, Category, Cart, Order, OrderItem
+from .models import MenuItem, Category, Cart, Order, OrderLine
+from .events import order_state, publish_order_change
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -94,6 +95,22 @@ class CartCreateSerializer(serializers.ModelSerializer):
             },
         }
 
+class CartBatchItemSerializer(serializers.Serializer):
+    item = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class CartBatchSerializer(serializers.Serializer):
+    items = CartBatchItemSerializer(many=True, required=False, max_length=100)
+    remove = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=100)
+
+    def validate(self, data):
+        item_ids = [line["item"] for line in data.get("items", [])]
+        if len(item_ids) != len(set(item_ids)):
+            raise serializers.ValidationError("Each item can only appear once")
+        if set(item_ids) & set(data.get("remove", [])):
+            raise serializers.ValidationError("An item cannot be both set and removed")
+        return data
+
 class CustomerOrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -104,16 +121,25 @@ class DeliverCrewOrderSerializer(serializers.ModelSerializer):
         model = User
         fields = ["first_name", "email"]
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    customer_id = serializers.IntegerField(write_only=True)
+class OrderLineSnapshotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderLine
+        fields = ["title", "price"]
+
+class OrderLineSerializer(serializers.ModelSerializer):
     item_id = serializers.IntegerField(write_only=True)
-    item = OrderItemCartSerializer(read_only=True)
+    # Same shape as the menu item, read from the line's own snapshot.
+    item = OrderLineSnapshotSerializer(source="*", read_only=True)
     class Meta:
-        model = OrderItem
-        fields = ["customer_id", "item_id", "item", "quantity"]
+        model = OrderLine
+        fields = ["item_id", "item", "quantity", "title", "price"]
+        extra_kwargs = {
+            "title": {"write_only": True},
+            "price": {"write_only": True},
+        }
 
 class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True)
+    items = OrderLineSerializer(many=True, source="lines")
     customer = CustomerOrderSerializer(read_only=True)
     deliver_crew = DeliverCrewOrderSerializer(read_only=True)
     customer_id = serializers.IntegerField(write_only=True)
@@ -123,30 +149,26 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ["id", "customer_id", "customer", "deliver_crew", "items", "total", "date", "status"]
     
     def create(self, validated_data):
-        items_data = validated_data.pop("items")
-        customer_id = validated_data.pop("customer_id")
-        customer = User.objects.get(id=customer_id)
-        order = Order.objects.create(customer=customer, **validated_data)
-        for item in items_data:
-            item["customer_id"] = customer_id
-            item_id = item.pop("item_id")
-            quantity = item.pop("quantity")
-            item, created = OrderItem.objects.get_or_create(customer_id=customer_id, item_id=item_id, defaults={'quantity': quantity})
-            if not created:
-                item.quantity = quantity
-                item.save()
-            order.items.add(item)
+        items_data = validated_data.pop("lines")
+        order = Order.objects.create(**validated_data)
+        OrderLine.objects.bulk_create([OrderLine(order=order, **item) for item in items_data])
         return order
 
-class OrderItemUpdateSerializer(serializers.ModelSerializer):
-    customer_id = serializers.IntegerField(write_only=True)
+class OrderLineUpdateSerializer(serializers.ModelSerializer):
     item = serializers.IntegerField(write_only=True)
     class Meta:
-        model = OrderItem
-        fields = ["customer_id", "item_id", "item", "quantity"]
+        model = OrderLine
+        fields = ["item", "quantity", "title", "price"]
+
+def replace_lines(order, items_data):
+    # Lines belong to one order and are never updated in place; the new set replaces the old one.
+    order.lines.all().delete()
+    OrderLine.objects.bulk_create(
+        [OrderLine(order=order, item_id=item["item"], quantity=item["quantity"], title=item["title"], price=item["price"]) for item in items_data]
+    )
 
 class OrderUpdateCompleteManagerSerializer(serializers.ModelSerializer):
-    items = OrderItemUpdateSerializer(many=True)
+    items = OrderLineUpdateSerializer(many=True, source="lines")
     customer_id = serializers.IntegerField(write_only=True)
     total = str
     class Meta:
@@ -154,27 +176,17 @@ class OrderUpdateCompleteManagerSerializer(serializers.ModelSerializer):
         fields = ["id", "customer_id", "customer", "deliver_crew", "items", "total", "date", "status"]
     
     def update(self, instance, validated_data):
-        items_data = validated_data.pop("items")
+        items_data = validated_data.pop("lines")
         customer_id = validated_data.pop("customer_id")
-        current_item_ids = set(instance.items.values_list("item", flat=True))
-        new_item_ids = set(item["item"] for item in items_data)
-        items_to_delete = current_item_ids - new_item_ids
-        OrderItem.objects.filter(item__in=items_to_delete).delete()
+        previous = order_state(instance)
         instance.customer_id = customer_id
         instance.status = validated_data.get('status', instance.status)
         instance.total = validated_data.get('total', instance.total)
         instance.date = validated_data.get('date', instance.date)
         instance.deliver_crew = validated_data.get('deliver_crew', instance.deliver_crew)
         instance.save()
-        for item in items_data:
-            item["customer_id"] = customer_id
-            item_id = item.get("item")
-            quantity = item.get("quantity")
-            item, created = OrderItem.objects.get_or_create(customer_id=customer_id, item_id=item_id, defaults={'quantity': quantity})
-            if not created:
-                item.quantity = quantity
-                item.save()
-            instance.items.add(item)
+        replace_lines(instance, items_data)
+        publish_order_change(instance, previous)
         return instance
 
     def to_representation(self, instance):
@@ -190,16 +202,18 @@ class OrderUpdatePartialManagerSerializer(serializers.ModelSerializer):
         fields = ["id", "customer_id", "customer", "deliver_crew", "date", "status"]
     
     def update(self, instance, validated_data):
+        previous = order_state(instance)
         instance.customer_id = validated_data.get('customer_id', instance.customer_id)
         instance.status = validated_data.get('status', instance.status)
         instance.total = validated_data.get('total', instance.total)
         instance.date = validated_data.get('date', instance.date)
         instance.deliver_crew = validated_data.get('deliver_crew', instance.deliver_crew)
         instance.save()
+        publish_order_change(instance, previous)
         return instance
     
 class OrderCustomerSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True)
+    items = OrderLineSerializer(many=True, source="lines")
     customer_id = serializers.IntegerField(write_only=True)
     class Meta:
         model = Order
@@ -207,30 +221,18 @@ class OrderCustomerSerializer(serializers.ModelSerializer):
 
 class OrderUpdateCustomerSerializer(serializers.ModelSerializer):
     customer_id = serializers.IntegerField(write_only=True)
-    items = OrderItemUpdateSerializer(many=True)
+    items = OrderLineUpdateSerializer(many=True, source="lines")
     class Meta:
         model = Order
         fields = ["id", "customer_id", "deliver_crew", "items", "total", "date", "status"]
 
     def update(self, instance, validated_data):
-        items_data = validated_data.pop("items")
+        items_data = validated_data.pop("lines")
         customer_id = validated_data.pop("customer_id")
-        current_item_ids = set(instance.items.values_list("item", flat=True))
-        new_item_ids = set(item["item"] for item in items_data)
-        items_to_delete = current_item_ids - new_item_ids
-        OrderItem.objects.filter(item__in=items_to_delete).delete()
         instance.customer_id = customer_id
         instance.total = validated_data.get('total', instance.total)
         instance.save()
-        for item in items_data:
-            item["customer_id"] = customer_id
-            item_id = item.get("item")
-            quantity = item.get("quantity")
-            item, created = OrderItem.objects.get_or_create(customer_id=customer_id, item_id=item_id, defaults={'quantity': quantity})
-            if not created:
-                item.quantity = quantity
-                item.save()
-            instance.items.add(item)
+        replace_lines(instance, items_data)
         return instance
     
     def to_representation(self, instance):
@@ -240,7 +242,7 @@ class OrderUpdateCustomerSerializer(serializers.ModelSerializer):
         return representation
 
 class OrderDeliverCrewSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True)
+    items = OrderLineSerializer(many=True, source="lines")
     customer = CustomerOrderSerializer(read_only=True)
     customer_id = serializers.IntegerField(write_only=True)
     class Meta:
@@ -253,8 +255,10 @@ class OrderUpdateDeliverCrewSerializer(serializers.ModelSerializer):
         fields = ["status"]
     
     def update(self, instance, validated_data):
+        previous = order_state(instance)
         instance.status = validated_data.get("status", instance.status)
         instance.save()
+        publish_order_change(instance, previous)
         return instance
 
         
@@ -0,0 +1,62 @@
+import asyncio
+import io
+from importlib import import_module
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.handlers.exception import response_for_exception
+from .async_views import OrderEventsView
+
+# Served by EventStreamApplication rather than through the URLconf: under WSGI a stream would
+# tie up a worker for as long as it is open.
+STREAMS = {
+    '/api/orders/events': OrderEventsView.as_view(),
+}
+
+class EventStreamApplication:
+    # ASGI entry point (see LittLemon/asgi.py) that serves the event stream views itself and hands
+    # every other request to Django. Django's handler gives each request a thread of its own for
+    # as long as it runs, which for a stream is as long as the client stays connected; here the
+    # view's synchronous steps run in the shared executor and an idle stream is only a coroutine.
+    # Middleware is skipped, so streams do not show up in the request metrics; the session, which
+    # session authentication needs, is attached here the way SessionMiddleware would.
+    def __init__(self, application):
+        self.application = application
+        self.SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] in STREAMS:
+            return await self.stream(STREAMS[scope['path']], scope, receive, send)
+        return await self.application(scope, receive, send)
+
+    async def stream(self, view, scope, receive, send):
+        request = ASGIRequest(scope, io.BytesIO())
+        request.session = self.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        try:
+            response = await view(request)
+        except Exception as exc:
+            response = await sync_to_async(response_for_exception, thread_sensitive=False)(request, exc)
+        if hasattr(response, 'render') and not response.is_rendered:
+            # Errors come back as DRF Responses, which Django's handler would render.
+            response.render()
+        sending = asyncio.ensure_future(self.send_response(response, send))
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        await asyncio.wait((sending, disconnected), return_when=asyncio.FIRST_COMPLETED)
+        for task in (sending, disconnected):
+            task.cancel()
+        await asyncio.gather(sending, disconnected, return_exceptions=True)
+
+    async def wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def send_response(self, response, send):
+        headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in response.items()]
+        headers += [(b'Set-Cookie', cookie.output(header='').encode('ascii').strip()) for cookie in response.cookies.values()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        if response.streaming:
+            async for chunk in response:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body'})
+        else:
+            await send({'type': 'http.response.body', 'body': response.content})
@@ -1,3 +1,1477 @@
-from django.test import TestCase
+import asyncio
+import atexit
+import gc
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from importlib import import_module
+import multiprocessing
+from contextlib import closing
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count
+from django.conf import settings
+from django.test import AsyncRequestFactory, LiveServerTestCase, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, force_authenticate
+from rest_framework_xml.renderers import XMLRenderer
+from . import async_views, views
+from .assignment import AssignmentEngine
+from .authentication import credential_cache
+from .cache import SQLiteCache
+from .loadtest import SCENARIOS, run_scenarios
+from .metrics import RETIRED, MetricsStore, RequestStats, metrics_store
+from .management.commands.loadtest import prepare as prepare_loadtest
+from .fast_serializers import menu_item_values, menu_item_list_data, CART_VALUES, cart_list_data, order_values, order_list_data
+from .catalog import bump_catalog_version, get_catalog_version
+from .events import order_events, user_key
+from .jobs import JobQueue, Worker, job_queue, register, run_pool
+from .models import Category, MenuItem, Cart, Order, OrderLine
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer, LazyXMLRenderer
+from . import rollups
+from .roles import get_group, get_roles, _cache_key as role_cache_key
+from .routers import ReadReplicaRouter, reads_from_replica, replica_is_current, replica_reads, sync_replica, wrote_primary
+from .search import search_menu_items
+from .streaming import EventStreamApplication
+from .serializers import MenuItemSerializer, CartSerializer, OrderSerializer, OrderDeliverCrewSerializer
+from .throttling import throttle_store, SlidingWindowStore
+from .urls import urlpatterns
+from .warmup import warm_up
 
-# Create your tests here.
+# The SQLite files named in settings are shared with the running workers: the tests get their own.
+TEST_FILES = tempfile.mkdtemp(prefix='littlelemon-tests-')
+override_settings(
+    THROTTLE_DATABASE=os.path.join(TEST_FILES, 'throttle.sqlite3'),
+    METRICS_DATABASE=os.path.join(TEST_FILES, 'metrics.sqlite3'),
+    JOBS_DATABASE=os.path.join(TEST_FILES, 'jobs.sqlite3'),
+    ORDER_EVENTS_DATABASE=os.path.join(TEST_FILES, 'order_events.sqlite3'),
+    CACHES={'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(TEST_FILES, 'cache.sqlite3')}},
+).enable()
+
+@atexit.register
+def remove_test_files():
+    # Before the metrics store's own exit, which then has nothing left to do.
+    metrics_store.close()
+    shutil.rmtree(TEST_FILES, ignore_errors=True)
+
+# Maximum number of SQL queries each route may issue, per HTTP method.
+# Read budgets must not depend on the number of rows being returned.
+QUERY_BUDGETS = {
+    'menu-items/category': {'get': 3, 'post': 3},
+    'menu-items/category/<int:pk>': {'get': 2, 'patch': 4, 'delete': 8},
+    'menu-items': {'get': 2, 'post': 3},
+    'menu-items/import': {'post': 12},
+    'menu-items/export': {'get': 2},
+    'menu-items/<int:pk>': {'get': 1, 'patch': 4, 'delete': 6},
+    'cart/menu-items': {'get': 1, 'post': 9, 'delete': 2},
+    'cart/menu-items/batch': {'post': 6},
+    'orders': {'get': 3, 'post': 15},
+    'orders/export': {'get': 4},
+    'orders/<int:pk>': {'get': 3, 'patch': 9, 'delete': 11},
+    'reports/sales': {'get': 4},
+    'metrics': {'get': 0},
+    'users': {'get': 2},
+    'users/me': {'get': 0},
+    'groups/manager/users': {'get': 2, 'post': 8},
+    'groups/manager/users/<int:pk>': {'delete': 6},
+    'groups/deliver-crew/users': {'get': 2, 'post': 8},
+    'groups/deliver-crew/users/<int:pk>': {'delete': 6},
+}
+
+def run_other_worker(read, results, asked):
+    results.put(read())
+    asked.wait(5)
+    results.put(read())
+
+class OtherWorker:
+    # A forked process standing in for another running worker: it reads once when started and again
+    # when asked, so a test can check that a change made here reaches it. `read` must not touch the
+    # database, which in a forked test process is a copy.
+    def __init__(self, read):
+        context = multiprocessing.get_context('fork')
+        self.results, self.asked = context.Queue(), context.Event()
+        self.process = context.Process(target=run_other_worker, args=(read, self.results, self.asked))
+        self.process.start()
+        self.first = self.results.get(timeout=5)
+
+    def read_again(self):
+        self.asked.set()
+        result = self.results.get(timeout=5)
+        self.process.join()
+        return result
+
+def clear_caches():
+    cache.clear()
+    throttle_store.reset()
+    metrics_store.reset()
+
+class ApiTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager_group = Group.objects.create(name='Manager')
+        cls.crew_group = Group.objects.create(name='Deliver Crew')
+        cls.manager = User.objects.create_user('alfred', 'alfred@example.com', 'pass')
+        cls.manager.groups.add(cls.manager_group)
+        cls.crew = User.objects.create_user('daniel', 'daniel@example.com', 'pass')
+        cls.crew.groups.add(cls.crew_group)
+        cls.customer = User.objects.create_user('brian', 'brian@example.com', 'pass')
+        cls.mains = Category.objects.create(name='Mains')
+        cls.desserts = Category.objects.create(name='Desserts')
+        cls.items = [
+            MenuItem.objects.create(title='Pasta', price=Decimal('8.50'), category=cls.mains),
+            MenuItem.objects.create(title='Pizza', price=Decimal('9.00'), category=cls.mains),
+            MenuItem.objects.create(title='Cake', price=Decimal('4.25'), category=cls.desserts),
+        ]
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+
+    def seed_orders(self, count, customer=None):
+        customer = customer or self.customer
+        orders = [Order.objects.create(customer=customer, deliver_crew=self.crew, total=Decimal('43.50')) for _ in range(count)]
+        OrderLine.objects.bulk_create(
+            OrderLine(order=order, item=item, quantity=2, title=item.title, price=item.price) for order in orders for item in self.items
+        )
+        return orders
+
+    def seed_menu(self, count):
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f'Special {i}', price=Decimal('5.00'), category=self.mains) for i in range(count)
+        )
+
+    def request(self, user, method, path, data=None):
+        clear_caches()
+        if user is not None:
+            # Real requests find the roles in the shared cache (see roles.py).
+            get_roles(SimpleNamespace(user=user))
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, data, format='json')
+        return response, len(queries)
+
+    def assertWithinBudget(self, route, method, user, path, data=None):
+        response, count = self.request(user, method, path, data)
+        budget = QUERY_BUDGETS[route][method]
+        self.assertLessEqual(count, budget, f'{method.upper()} {path} ran {count} queries (budget {budget})')
+        return response, count
+
+    def assertConstantQueries(self, route, user, path, grow):
+        response, small = self.assertWithinBudget(route, 'get', user, path)
+        self.assertEqual(response.status_code, 200, getattr(response, 'data', None))
+        grow()
+        response, large = self.assertWithinBudget(route, 'get', user, path)
+        self.assertEqual(response.status_code, 200, getattr(response, 'data', None))
+        self.assertEqual(small, large, f'GET {path} query count grew from {small} to {large}')
+
+
+class QueryBudgetTestCase(ApiTestCase):
+    def test_every_route_has_a_budget(self):
+        for pattern in urlpatterns:
+            self.assertIn(str(pattern.pattern), QUERY_BUDGETS)
+
+    def test_category_list(self):
+        self.assertConstantQueries('menu-items/category', self.customer, '/api/menu-items/category',
+                                   lambda: Category.objects.bulk_create(Category(name=f'C{i}') for i in range(20)))
+
+    def test_category_create(self):
+        response, _ = self.assertWithinBudget('menu-items/category', 'post', self.manager,
+                                              '/api/menu-items/category', {'name': 'Drinks'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_single_category(self):
+        path = f'/api/menu-items/category/{self.mains.id}'
+        self.assertConstantQueries('menu-items/category/<int:pk>', self.customer, path, lambda: self.seed_menu(20))
+
+    def test_single_category_writes(self):
+        path = f'/api/menu-items/category/{self.desserts.id}'
+        response, _ = self.assertWithinBudget('menu-items/category/<int:pk>', 'patch', self.manager, path, {'name': 'Sweets'})
+        self.assertEqual(response.status_code, 200)
+        response, _ = self.assertWithinBudget('menu-items/category/<int:pk>', 'delete', self.manager, path)
+        self.assertEqual(response.status_code, 200)
+
+    def test_menu_items(self):
+        self.assertConstantQueries('menu-items', self.customer, '/api/menu-items?per_page=50', lambda: self.seed_menu(20))
+
+    def test_menu_items_create(self):
+        data = {'title': 'Soup', 'price': '3.00', 'category': self.mains.id}
+        response, _ = self.assertWithinBudget('menu-items', 'post', self.manager, '/api/menu-items', data)
+        self.assertEqual(response.status_code, 201)
+
+    def test_single_menu_item(self):
+        path = f'/api/menu-items/{self.items[0].id}'
+        self.assertWithinBudget('menu-items/<int:pk>', 'get', self.customer, path)
+        response, _ = self.assertWithinBudget('menu-items/<int:pk>', 'patch', self.manager, path, {'price': '7.00'})
+        self.assertEqual(response.status_code, 200)
+        response, _ = self.assertWithinBudget('menu-items/<int:pk>', 'delete', self.manager, path)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cart(self):
+        def fill_cart():
+            for item in self.items:
+                Cart.objects.create(user=self.customer, item=item, quantity=1, itemprice=item.price)
+        self.assertConstantQueries('cart/menu-items', self.customer, '/api/cart/menu-items', fill_cart)
+
+    def test_cart_writes(self):
+        data = {'item': self.items[0].id, 'quantity': 2}
+        response, _ = self.assertWithinBudget('cart/menu-items', 'post', self.customer, '/api/cart/menu-items', data)
+        self.assertEqual(response.status_code, 201)
+        response, _ = self.assertWithinBudget('cart/menu-items', 'delete', self.customer, '/api/cart/menu-items',
+                                              {'item': self.items[0].id})
+        self.assertEqual(response.status_code, 200)
+
+    def test_cart_batch(self):
+        Cart.objects.create(user=self.customer, item=self.items[0], quantity=1, itemprice=self.items[0].price)
+        Cart.objects.create(user=self.customer, item=self.items[1], quantity=1, itemprice=self.items[1].price)
+        data = {
+            'items': [{'item': self.items[0].id, 'quantity': 4}, {'item': self.items[2].id, 'quantity': 2}],
+            'remove': [self.items[1].id],
+        }
+        response, _ = self.assertWithinBudget('cart/menu-items/batch', 'post', self.customer, '/api/cart/menu-items/batch', data)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            sorted((line['item']['id'], line['quantity'], line['itemprice']) for line in response.data),
+            [(self.items[0].id, 4, '34.00'), (self.items[2].id, 2, '8.50')],
+        )
+
+    def test_cart_batch_rejects_unknown_items(self):
+        data = {'items': [{'item': self.items[0].id, 'quantity': 1}, {'item': 999, 'quantity': 1}]}
+        response, _ = self.assertWithinBudget('cart/menu-items/batch', 'post', self.customer, '/api/cart/menu-items/batch', data)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['items'], [999])
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_orders_as_manager(self):
+        self.seed_orders(1)
+        self.assertConstantQueries('orders', self.manager, '/api/orders', lambda: self.seed_orders(25))
+
+    def test_orders_as_deliver_crew(self):
+        self.seed_orders(1)
+        self.assertConstantQueries('orders', self.crew, '/api/orders', lambda: self.seed_orders(25))
+
+    def test_orders_as_customer(self):
+        self.seed_orders(1)
+        self.assertConstantQueries('orders', self.customer, '/api/orders', lambda: self.seed_orders(25))
+
+    def test_orders_checkout(self):
+        for item in self.items:
+            Cart.objects.create(user=self.customer, item=item, quantity=1, itemprice=item.price)
+        response, _ = self.assertWithinBudget('orders', 'post', self.customer, '/api/orders')
+        self.assertEqual(response.status_code, 201)
+
+    def test_checkout_queries_do_not_grow_with_cart(self):
+        counts = []
+        for customer, items in ((self.customer, self.items[:1]), (self.crew, self.items)):
+            self.seed_orders(1, customer=customer)
+            Cart.objects.bulk_create(
+                Cart(user=customer, item=item, quantity=3, itemprice=item.price * 3) for item in items
+            )
+            response, count = self.assertWithinBudget('orders', 'post', customer, '/api/orders')
+            self.assertEqual(response.status_code, 201)
+            counts.append(count)
+            order = Order.objects.filter(customer=customer).latest('id')
+            self.assertEqual(order.total, sum(item.price * 3 for item in items))
+            self.assertEqual(sorted(order.lines.values_list('item_id', 'quantity')), [(item.id, 3) for item in items])
+            self.assertFalse(Cart.objects.filter(user=customer).exists())
+        self.assertEqual(counts[0], counts[1])
+
+    def test_checkout_empty_cart(self):
+        response, _ = self.assertWithinBudget('orders', 'post', self.customer, '/api/orders')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_orders_export(self):
+        self.seed_orders(1)
+        counts = []
+        for grow in (0, 25):
+            self.seed_orders(grow)
+            clear_caches()
+            self.client.force_authenticate(self.manager)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/orders/export?as=csv')
+                rows = b''.join(response.streaming_content).decode().splitlines()
+            self.assertEqual(len(rows), 1 + Order.objects.count() * len(self.items))
+            self.assertLessEqual(len(queries), QUERY_BUDGETS['orders/export']['get'])
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_orders_export_filters(self):
+        orders = self.seed_orders(2)
+        Order.objects.filter(pk=orders[0].pk).update(status='1')
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/orders/export?status=1')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [orders[0].pk])
+        self.assertEqual(len(rows[0]['items']), len(self.items))
+
+    def test_single_order(self):
+        order = self.seed_orders(1)[0]
+        for user in (self.manager, self.customer):
+            response, _ = self.assertWithinBudget('orders/<int:pk>', 'get', user, f'/api/orders/{order.id}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['items']), len(self.items))
+
+    def test_single_order_writes(self):
+        order = self.seed_orders(1)[0]
+        path = f'/api/orders/{order.id}'
+        response, _ = self.assertWithinBudget('orders/<int:pk>', 'patch', self.crew, path, {'status': '1'})
+        self.assertEqual(response.status_code, 200)
+        response, _ = self.assertWithinBudget('orders/<int:pk>', 'delete', self.manager, path)
+        self.assertEqual(response.status_code, 200)
+
+    def test_sales_report(self):
+        self.assertConstantQueries('reports/sales', self.manager, '/api/reports/sales', lambda: self.seed_orders(5))
+
+    def test_metrics(self):
+        self.assertConstantQueries('metrics', self.manager, '/api/metrics', lambda: self.client.get('/api/menu-items'))
+
+    def test_users(self):
+        self.assertConstantQueries('users', self.manager, '/api/users',
+                                   lambda: User.objects.bulk_create(User(username=f'user{i}') for i in range(20)))
+
+    def test_current_user(self):
+        response, _ = self.assertWithinBudget('users/me', 'get', self.customer, '/api/users/me')
+        self.assertEqual(response.status_code, 200)
+
+    def test_group_members(self):
+        for route, group in (('groups/manager/users', self.manager_group),
+                             ('groups/deliver-crew/users', self.crew_group)):
+            def grow():
+                for user in User.objects.bulk_create(User(username=f'{group.id}-{i}') for i in range(10)):
+                    user.groups.add(group)
+            self.assertConstantQueries(route, self.manager, f'/api/{route}', grow)
+
+    def test_group_membership_writes(self):
+        for route, group in (('groups/manager/users', self.manager_group),
+                             ('groups/deliver-crew/users', self.crew_group)):
+            response, _ = self.assertWithinBudget(route, 'post', self.manager, f'/api/{route}', {'username': 'brian'})
+            self.assertEqual(response.status_code, 201)
+            response, _ = self.assertWithinBudget(f'{route}/<int:pk>', 'delete', self.manager,
+                                                  f'/api/{route}/{self.customer.id}')
+            self.assertEqual(response.status_code, 200)
+
+
+class RoleCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager_group = Group.objects.create(name='Manager')
+        cls.crew_group = Group.objects.create(name='Deliver Crew')
+        cls.manager = User.objects.create_user('alfred', 'alfred@example.com', 'pass')
+        cls.manager.groups.add(cls.manager_group)
+        cls.customer = User.objects.create_user('brian', 'brian@example.com', 'pass')
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_roles_are_cached_across_requests(self):
+        self.client.get('/api/users')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'auth_group' in q['sql']])
+
+    def test_group_views_invalidate_roles(self):
+        self.assertEqual(get_roles(SimpleNamespace(user=self.customer)), frozenset())
+        response = self.client.post('/api/groups/deliver-crew/users', {'username': 'brian'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(get_roles(SimpleNamespace(user=self.customer)), frozenset(['Deliver Crew']))
+        response = self.client.delete(f'/api/groups/deliver-crew/users/{self.customer.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_roles(SimpleNamespace(user=self.customer)), frozenset())
+
+    def test_role_changes_reach_other_workers(self):
+        self.client.post('/api/groups/manager/users', {'username': 'brian'}, format='json')
+        self.assertEqual(get_roles(SimpleNamespace(user=self.customer)), frozenset(['Manager']))
+        worker = OtherWorker(lambda: cache.get(role_cache_key(self.customer.pk)))
+        self.assertEqual(worker.first, frozenset(['Manager']))
+        response = self.client.delete(f'/api/groups/manager/users/{self.customer.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(worker.read_again())
+
+    def test_renamed_groups_are_not_cached_under_their_old_name(self):
+        self.assertEqual(get_group('Manager'), self.manager_group)
+        self.manager_group.name = 'Managers'
+        self.manager_group.save()
+        with self.assertRaises(Group.DoesNotExist):
+            get_group('Manager')
+
+
+class SQLiteCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+
+    def test_workers_share_entries(self):
+        workers = [SQLiteCache(self.path, {'OPTIONS': {'MAX_ENTRIES': 10}}) for _ in range(2)]
+        self.assertTrue(workers[0].add('version', 5, None))
+        self.assertFalse(workers[1].add('version', 7, None))
+        self.assertEqual([workers[i % 2].incr('version') for i in range(4)], [6, 7, 8, 9])
+        workers[0].set_many({'flag': True, 'roles': frozenset(['Manager'])})
+        self.assertEqual(workers[1].get_many(['flag', 'roles', 'missing']), {'flag': True, 'roles': frozenset(['Manager'])})
+        self.assertTrue(workers[1].delete('roles'))
+        self.assertIsNone(workers[0].get('roles'))
+        with self.assertRaises(ValueError):
+            workers[0].incr('flag')
+
+    def test_expired_entries_are_gone(self):
+        cache = SQLiteCache(self.path, {})
+        cache.set('marker', True, 0.05)
+        self.assertTrue(cache.has_key('marker'))
+        time.sleep(0.06)
+        self.assertFalse(cache.has_key('marker'))
+        self.assertTrue(cache.add('marker', 1))
+        self.assertEqual(cache.get('marker'), 1)
+
+    def test_culls_the_oldest_writes(self):
+        cache = SQLiteCache(self.path, {'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2}})
+        cache.set('version', 1, None)
+        for i in range(6):
+            cache.set(i, i)
+        cache.cull(cache.connection)
+        self.assertEqual(cache.get_many(['version', *range(6)]), {'version': 1, 3: 3, 4: 4, 5: 5})
+
+
+class WarmupTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager_group = Group.objects.create(name='Manager')
+        Group.objects.create(name='Deliver Crew')
+        cls.manager = User.objects.create_user('alfred', 'alfred@example.com', 'pass')
+        cls.manager.groups.add(cls.manager_group)
+        cls.customer = User.objects.create_user('brian', 'brian@example.com', 'pass')
+        MenuItem.objects.create(title='Soup', price=Decimal('4.00'), category=Category.objects.create(name='Starters'))
+
+    def setUp(self):
+        clear_caches()
+
+    def test_warm_up_primes_roles(self):
+        self.addCleanup(gc.unfreeze)
+        self.assertEqual([(name, error) for name, _, error in warm_up() if error], [])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_group('Manager'), self.manager_group)
+            self.assertEqual(get_roles(SimpleNamespace(user=self.manager)), frozenset(['Manager']))
+
+    def test_group_changes_reach_cached_groups(self):
+        get_group('Manager')
+        self.manager_group.delete()
+        with self.assertRaises(Group.DoesNotExist):
+            get_group('Manager')
+
+
+class CatalogCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('alfred', 'alfred@example.com', 'pass')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.mains = Category.objects.create(name='Mains')
+        cls.item = MenuItem.objects.create(title='Pasta', price=Decimal('8.50'), category=cls.mains)
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_cached_page_skips_database(self):
+        first = self.client.get('/api/menu-items?per_page=10&category=Mains')
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/api/menu-items?category=Mains&per_page=10')
+        self.assertEqual(first.data, second.data)
+        self.assertFalse([q for q in queries if 'menuitem' in q['sql'].lower()])
+
+    def test_cached_links_follow_the_request(self):
+        MenuItem.objects.create(title='Pizza', price=Decimal('9.00'), category=self.mains)
+        self.assertEqual(self.client.get('/api/menu-items?per_page=1').data['next'], 'http://testserver/api/menu-items?page=2&per_page=1')
+        self.assertEqual(self.client.get('/api/menu-items?per_page=1', secure=True).data['next'], 'https://testserver/api/menu-items?page=2&per_page=1')
+        self.assertEqual(self.client.get('/api/menu-items?per_page=1&format=json').data['next'], 'http://testserver/api/menu-items?format=json&page=2&per_page=1')
+
+    def test_if_none_match_returns_not_modified(self):
+        response = self.client.get('/api/menu-items/category')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        response = self.client.get('/api/menu-items/category', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_writes_bump_catalog_version(self):
+        path = f'/api/menu-items/category/{self.mains.id}'
+        etag = self.client.get(path)['ETag']
+        response = self.client.patch(f'/api/menu-items/{self.item.id}', {'price': '7.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data[0]['price'], '7.00')
+
+    def test_bumps_reach_other_workers(self):
+        etag = self.client.get('/api/menu-items')['ETag']
+        worker = OtherWorker(get_catalog_version)
+        self.assertEqual(worker.first, get_catalog_version())
+        bump_catalog_version()
+        self.assertEqual(worker.read_again(), get_catalog_version())
+        self.assertNotEqual(worker.first, get_catalog_version())
+        self.assertNotEqual(self.client.get('/api/menu-items')['ETag'], etag)
+
+
+class CursorPaginationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('alfred', 'alfred@example.com', 'pass')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.customer = User.objects.create_user('brian', 'brian@example.com', 'pass')
+        mains = Category.objects.create(name='Mains')
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f'Dish {i}', price=Decimal(i % 3 + 1), category=mains) for i in range(7)
+        )
+        for _ in range(7):
+            Order.objects.create(customer=cls.customer, total=Decimal('10.00'))
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def walk(self, url, direction='next'):
+        seen = []
+        while url:
+            clear_caches()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse([q for q in queries if 'COUNT(' in q['sql'] or 'OFFSET' in q['sql']])
+            seen.extend(response.data['results'] if direction == 'next' else reversed(response.data['results']))
+            url = response.data[direction]
+            last = response
+        return seen, last
+
+    def test_orders_cursor(self):
+        orders, _ = self.walk('/api/orders?pagination=cursor&per_page=3')
+        self.assertEqual([o['id'] for o in orders], list(Order.objects.order_by('-date', '-id').values_list('id', flat=True)))
+
+    def test_menu_items_cursor(self):
+        items, _ = self.walk('/api/menu-items?pagination=cursor&per_page=2&ordering=-price')
+        self.assertEqual([i['id'] for i in items], list(MenuItem.objects.order_by('-price', '-id').values_list('id', flat=True)))
+
+    def test_menu_items_cursor_seeks_past_equal_prices(self):
+        MenuItem.objects.bulk_create(MenuItem(title=f'Soup {i}', price=Decimal('2.00'), category=Category.objects.get()) for i in range(10))
+        expected = list(MenuItem.objects.order_by('price', 'id').values_list('id', flat=True))
+        items, last = self.walk('/api/menu-items?pagination=cursor&per_page=3&ordering=price')
+        self.assertEqual([i['id'] for i in items], expected)
+        # And back again from the last page.
+        items, _ = self.walk(last.data['previous'], 'previous')
+        self.assertEqual([i['id'] for i in items], expected[::-1][len(last.data['results']):])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(last.data['previous'])
+        self.assertTrue([q for q in queries if '"price" = ' in q['sql'] and '"id" < ' in q['sql']])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/menu-items?pagination=cursor&cursor=cD1bIjEiXQ==')
+        self.assertEqual(response.status_code, 404)
+
+    def test_users_cursor(self):
+        users, _ = self.walk('/api/users?pagination=cursor&per_page=1')
+        self.assertEqual([u['id'] for u in users], list(User.objects.order_by('id').values_list('id', flat=True)))
+
+
+class MenuSearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.mains = Category.objects.create(name='Mains')
+        cls.desserts = Category.objects.create(name='Desserts')
+        cls.pasta = MenuItem.objects.create(title='Pasta Carbonara', price=Decimal('9.00'), category=cls.mains)
+        cls.salad = MenuItem.objects.create(title='Pasta Salad', price=Decimal('6.00'), category=cls.mains)
+        cls.cake = MenuItem.objects.create(title='Lemon Cake', price=Decimal('4.00'), category=cls.desserts)
+
+    def search(self, query):
+        clear_caches()
+        response = APIClient().get('/api/menu-items', {'per_page': 10, **query})
+        self.assertEqual(response.status_code, 200)
+        return [item['title'] for item in response.data['results']]
+
+    def test_prefix_matches(self):
+        self.assertEqual(sorted(self.search({'search': 'pas'})), ['Pasta Carbonara', 'Pasta Salad'])
+        self.assertEqual(self.search({'search': 'pas sal'}), ['Pasta Salad'])
+
+    def test_matches_category_name(self):
+        self.assertEqual(self.search({'search': 'dessert'}), ['Lemon Cake'])
+
+    def test_combines_with_filters(self):
+        self.assertEqual(self.search({'search': 'pasta', 'to_price': '7', 'ordering': 'price'}), ['Pasta Salad'])
+
+    def test_index_follows_writes(self):
+        MenuItem.objects.filter(pk=self.cake.pk).update(title='Lime Tart')
+        self.assertEqual(self.search({'search': 'lemon'}), [])
+        Category.objects.filter(pk=self.desserts.pk).update(name='Sweets')
+        self.assertEqual(self.search({'search': 'sweets'}), ['Lime Tart'])
+        self.salad.delete()
+        self.assertEqual(self.search({'search': 'salad'}), [])
+
+
+class MenuImportTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('alfred', 'alfred@example.com', 'pass')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.mains = Category.objects.create(name='Mains')
+        cls.pasta = MenuItem.objects.create(title='Pasta', price=Decimal('8.50'), category=cls.mains)
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_json_import_reports_rows(self):
+        rows = [
+            {'id': self.pasta.id, 'title': 'Pasta', 'price': '9.50', 'category': 'Mains'},
+            {'title': 'Tiramisu', 'price': '5.00', 'category': 'Desserts', 'featured': True},
+            {'title': 'Soup', 'price': 'free', 'category': 'Starters'},
+            {'id': 999, 'title': 'Ghost', 'price': '1.00', 'category': 'Mains'},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/menu-items/import', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['categories_created']), (1, 1, 1))
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4])
+        self.assertEqual(MenuItem.objects.get(pk=self.pasta.pk).price, Decimal('9.50'))
+        self.assertTrue(MenuItem.objects.filter(title='Tiramisu', category__name='Desserts', featured=True).exists())
+        self.assertLessEqual(len(queries), QUERY_BUDGETS['menu-items/import']['post'])
+
+    def test_repeated_rows_are_rejected(self):
+        rows = [
+            {'title': 'Soup', 'price': '4.00', 'category': 'Starters'},
+            {'title': 'Soup', 'price': '5.00', 'category': 'Starters'},
+            {'id': self.pasta.id, 'title': 'Penne', 'price': '9.00', 'category': 'Mains'},
+            {'title': 'Pasta', 'price': '1.00', 'category': 'Mains'},
+            {'id': self.pasta.id, 'title': 'Fusilli', 'price': '2.00', 'category': 'Mains'},
+        ]
+        response = self.client.post('/api/menu-items/import', rows, format='json')
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual(response.data['errors'], [
+            {'row': 2, 'errors': {'title': ['Also on row 1']}},
+            {'row': 4, 'errors': {'title': ['Also on row 3']}},
+            {'row': 5, 'errors': {'id': ['Also on row 3']}},
+        ])
+        self.assertEqual(list(MenuItem.objects.order_by('id').values_list('title', 'price')), [('Penne', Decimal('9.00')), ('Soup', Decimal('4.00'))])
+
+    def test_csv_round_trip(self):
+        exported = b''.join(self.client.get('/api/menu-items/export?as=csv').streaming_content)
+        upload = SimpleUploadedFile('menu.csv', exported.replace(b'8.50', b'7.25') + b',Lemonade,2.00,Drinks,False\n')
+        response = self.client.post('/api/menu-items/import', {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['errors']), (1, 1, []))
+        with CaptureQueriesContext(connection) as queries:
+            exported = self.client.get('/api/menu-items/export').data
+        self.assertLessEqual(len(queries), QUERY_BUDGETS['menu-items/export']['get'])
+        self.assertEqual([(item['title'], item['price'], item['category']) for item in exported],
+                         [('Pasta', '7.25', 'Mains'), ('Lemonade', '2.00', 'Drinks')])
+
+    def test_requires_manager(self):
+        self.client.force_authenticate(User.objects.create_user('brian'))
+        self.assertEqual(self.client.post('/api/menu-items/import', [], format='json').status_code, 403)
+        self.assertEqual(self.client.get('/api/menu-items/export').status_code, 403)
+
+
+class AsyncReadViewsTestCase(ApiTestCase):
+    def get_both(self, user, path, view, **kwargs):
+        sync_response, _ = self.request(user, 'get', path)
+        clear_caches()
+        request = AsyncRequestFactory().get(path)
+        force_authenticate(request, user=user)
+        async_response = async_to_sync(view.as_view())(request, **kwargs)
+        async_response.render()
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+        return async_response
+
+    def test_async_views_match_sync_views(self):
+        order = self.seed_orders(2)[0]
+        Cart.objects.create(user=self.customer, item=self.items[0], quantity=2, itemprice=Decimal('17.00'))
+        for user in (self.manager, self.crew, self.customer):
+            self.get_both(user, '/api/orders', async_views.OrdersView)
+            self.get_both(user, '/api/users/me', async_views.CurrentUserView)
+        for user in (self.manager, self.customer):
+            self.get_both(user, f'/api/orders/{order.id}', async_views.OrderView, pk=order.id)
+        self.get_both(self.customer, '/api/orders/999', async_views.OrderView, pk=999)
+        self.get_both(self.customer, '/api/cart/menu-items', async_views.CartView)
+        self.get_both(self.customer, '/api/menu-items?per_page=2&page=2&ordering=price', async_views.MenuItemsView)
+        self.get_both(self.customer, '/api/menu-items?search=pa', async_views.MenuItemsView)
+        self.get_both(self.customer, '/api/menu-items?page=9', async_views.MenuItemsView)
+        self.get_both(self.customer, '/api/menu-items/category', async_views.MenuItemsCategoryView)
+        self.get_both(self.customer, f'/api/menu-items/category/{self.mains.id}', async_views.MenuItemsSingleCategoryView, pk=self.mains.id)
+        empty = Category.objects.create(name='Empty')
+        self.get_both(self.customer, f'/api/menu-items/category/{empty.id}', async_views.MenuItemsSingleCategoryView, pk=empty.id)
+
+    def test_async_reads_route_writes_to_sync_view(self):
+        view = async_views.async_reads(views.CartView.as_view(), async_views.CartView.as_view())
+        request = AsyncRequestFactory().post('/api/cart/menu-items', {'item': self.items[0].id, 'quantity': 1}, content_type='application/json')
+        force_authenticate(request, user=self.customer)
+        response = async_to_sync(view)(request)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Cart.objects.filter(user=self.customer, item=self.items[0]).exists())
+
+
+class OrderEventsTestCase(ApiTestCase):
+    async def open_stream(self, user):
+        await sync_to_async(get_roles)(SimpleNamespace(user=user))
+        request = AsyncRequestFactory().get('/api/orders/events', headers={'accept': 'text/event-stream'})
+        force_authenticate(request, user=user)
+        response = await async_views.OrderEventsView.as_view()(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        return stream
+
+    def patch(self, user, order, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response, _ = self.request(user, 'patch', f'/api/orders/{order.pk}', data)
+        self.assertEqual(response.status_code, 200)
+
+    async def disconnect(self, stream):
+        # The ASGI handler cancels the response when the client goes away.
+        read = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        read.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await read
+
+    async def next_event(self, stream):
+        event = dict(line.split(': ', 1) for line in (await asyncio.wait_for(anext(stream), 1)).decode().splitlines() if line)
+        self.assertEqual(event['event'], 'order')
+        return json.loads(event['data'])
+
+    async def test_changes_reach_customer_and_crew(self):
+        order = (await sync_to_async(self.seed_orders)(1))[0]
+        other_crew = await User.objects.acreate(username='carla')
+        customer, crew, manager = [await self.open_stream(user) for user in (self.customer, self.crew, self.manager)]
+        await sync_to_async(self.patch)(self.crew, order, {'status': '1'})
+        expected = {'order': order.pk, 'status': '1', 'deliver_crew': self.crew.pk}
+        self.assertEqual(await self.next_event(customer), expected)
+        self.assertEqual(await self.next_event(crew), expected)
+        # The previous crew learns the order was handed over.
+        await sync_to_async(self.patch)(self.manager, order, {'deliver_crew': other_crew.pk})
+        expected = {**expected, 'deliver_crew': other_crew.pk}
+        self.assertEqual(await self.next_event(customer), expected)
+        self.assertEqual(await self.next_event(crew), expected)
+        # Timing out cancels the manager's stream like a disconnect would.
+        with self.assertRaises(TimeoutError):
+            await asyncio.wait_for(anext(manager), 0.1)
+        for stream in (customer, crew):
+            await self.disconnect(stream)
+        self.assertEqual(order_events.connections(), 0)
+
+    async def test_engine_assignments_reach_customer_and_crew(self):
+        order = await Order.objects.acreate(customer=self.customer, total=Decimal('10.00'))
+        customer, crew = [await self.open_stream(user) for user in (self.customer, self.crew)]
+
+        def assign():
+            with self.captureOnCommitCallbacks(execute=True):
+                AssignmentEngine().run()
+        await sync_to_async(assign)()
+        expected = {'order': order.pk, 'status': '0', 'deliver_crew': self.crew.pk}
+        self.assertEqual(await self.next_event(customer), expected)
+        self.assertEqual(await self.next_event(crew), expected)
+        for stream in (customer, crew):
+            await self.disconnect(stream)
+
+    async def test_events_from_other_processes_are_relayed(self):
+        stream = await self.open_stream(self.customer)
+        data = {'order': 1, 'status': '1', 'deliver_crew': self.crew.pk}
+        # assign_orders, or another web worker, publishing.
+        worker = OtherWorker(lambda: order_events.publish({user_key(self.customer.pk)}, 'order', data))
+        self.assertEqual(await self.next_event(stream), data)
+        worker.read_again()
+        await self.disconnect(stream)
+
+    async def test_asgi_application_serves_streams(self):
+        # The view's synchronous steps run in a shared executor thread, outside this test's
+        # transaction, so the token and the roles are resolved from the caches.
+        token = Token(key='stream-token', user=self.customer)
+        credential_cache.set(('token', token.key), self.customer, token, time.time())
+        await sync_to_async(get_roles)(SimpleNamespace(user=self.customer))
+        passed = []
+
+        async def django(scope, receive, send):
+            passed.append(scope['path'])
+
+        application = EventStreamApplication(django)
+        await application({'type': 'http', 'method': 'GET', 'path': '/api/orders'}, None, None)
+        self.assertEqual(passed, ['/api/orders'])
+        incoming, sent = asyncio.Queue(), asyncio.Queue()
+        incoming.put_nowait({'type': 'http.request', 'body': b'', 'more_body': False})
+        served = asyncio.ensure_future(application({
+            'type': 'http', 'method': 'GET', 'path': '/api/orders/events', 'query_string': b'',
+            'headers': [(b'accept', b'text/event-stream'), (b'authorization', b'Token stream-token')],
+        }, incoming.get, sent.put))
+        start = await asyncio.wait_for(sent.get(), 1)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'Content-Type', b'text/event-stream'), start['headers'])
+        self.assertEqual((await sent.get())['body'], b'retry: 3000\n\n')
+        self.assertEqual(order_events.connections(), 1)
+        incoming.put_nowait({'type': 'http.disconnect'})
+        await asyncio.wait_for(served, 1)
+        self.assertEqual(order_events.connections(), 0)
+
+    @override_settings(ORDER_EVENTS_HEARTBEAT=0.01)
+    async def test_idle_streams_are_kept_alive(self):
+        stream = await self.open_stream(self.customer)
+        self.assertEqual(await anext(stream), b': keep-alive\n\n')
+        await self.disconnect(stream)
+
+    async def test_requires_authentication(self):
+        request = AsyncRequestFactory().get('/api/orders/events', headers={'accept': 'text/event-stream'})
+        response = await async_views.OrderEventsView.as_view()(request)
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(response.render().content.startswith(b'event: error\ndata: {"detail":'))
+
+
+class EventStreamSessionTestCase(TransactionTestCase):
+    # The stream authenticates in an executor thread, on its own connection: the session and its
+    # user have to be committed for it to find them.
+    async def serve(self, application, headers):
+        incoming, sent = asyncio.Queue(), asyncio.Queue()
+        incoming.put_nowait({'type': 'http.request', 'body': b'', 'more_body': False})
+        served = asyncio.ensure_future(application({
+            'type': 'http', 'method': 'GET', 'path': '/api/orders/events', 'query_string': b'', 'headers': headers,
+        }, incoming.get, sent.put))
+        start = await asyncio.wait_for(sent.get(), 1)
+        body = (await sent.get())['body']
+        incoming.put_nowait({'type': 'http.disconnect'})
+        await asyncio.wait_for(served, 1)
+        return start['status'], body
+
+    def test_session_cookie_authenticates(self):
+        self.client.force_login(User.objects.create_user('brian', 'brian@example.com', 'pass'))
+        session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        application = EventStreamApplication(None)
+        headers = [(b'accept', b'text/event-stream'), (b'cookie', f'{settings.SESSION_COOKIE_NAME}={session_key}'.encode())]
+        self.assertEqual(async_to_sync(self.serve)(application, headers), (200, b'retry: 3000\n\n'))
+        self.assertEqual(async_to_sync(self.serve)(application, headers[:1])[0], 401)
+
+
+class SalesRollupTestCase(ApiTestCase):
+    def checkout(self, customer, quantities):
+        for item, quantity in zip(self.items, quantities):
+            Cart.objects.create(user=customer, item=item, quantity=quantity, itemprice=item.price * quantity)
+        response, _ = self.request(customer, 'post', '/api/orders')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(rollups.compare(), [])
+        return Order.objects.filter(customer=customer).latest('id')
+
+    def test_writes_keep_rollups_in_step(self):
+        first = self.checkout(self.customer, [1, 2])
+        second = self.checkout(self.customer, [3, 1, 1])
+        self.checkout(self.manager, [2])
+        writes = [
+            (self.crew, 'patch', first, {'status': '1'}),
+            (self.manager, 'patch', second, {'deliver_crew': self.crew.id}),
+            (self.manager, 'patch', first, {'items': [{'item': self.items[2].id, 'quantity': 4}]}),
+            (self.customer, 'patch', second, {'items': [{'item': self.items[0].id, 'quantity': 5}]}),
+            (self.manager, 'delete', first, None),
+        ]
+        for user, method, order, data in writes:
+            response, _ = self.request(user, method, f'/api/orders/{order.id}', data)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(rollups.compare(), [], f'{method} {data}')
+
+    def test_deleting_an_ordered_menu_item_keeps_its_lines(self):
+        order = self.checkout(self.customer, [1, 2])
+        response, _ = self.request(self.manager, 'delete', f'/api/menu-items/{self.items[0].id}')
+        self.assertEqual(response.status_code, 200)
+        response, _ = self.request(self.customer, 'get', f'/api/orders/{order.id}')
+        self.assertEqual([(line['item']['title'], line['quantity']) for line in response.data['items']], [('Pasta', 1), ('Pizza', 2)])
+        self.assertEqual(sum(Decimal(line['item']['price']) * line['quantity'] for line in response.data['items']), Decimal(response.data['total']))
+        self.assertEqual(rollups.compare(), [])
+
+    def test_report(self):
+        order = self.checkout(self.customer, [1, 2])
+        self.checkout(self.manager, [4])
+        self.request(self.crew, 'patch', f'/api/orders/{order.id}', {'status': '1'})
+        response, _ = self.request(self.manager, 'get', '/api/reports/sales?top=2')
+        self.assertEqual(response.status_code, 200)
+        day = str(order.date.date())
+        self.assertEqual(response.data['days'], [{'day': order.date.date(), 'orders': 2, 'revenue': '60.50'}])
+        self.assertEqual(response.data['status'], [
+            {'status': '0', 'orders': 1, 'revenue': '34.00'},
+            {'status': '1', 'orders': 1, 'revenue': '26.50'},
+        ])
+        self.assertEqual(response.data['top_items'], [
+            {'item': self.items[0].id, 'title': 'Pasta', 'quantity': 5},
+            {'item': self.items[1].id, 'title': 'Pizza', 'quantity': 2},
+        ])
+        response, _ = self.request(self.manager, 'get', f'/api/reports/sales?from={day}&to={day}')
+        self.assertEqual(len(response.data['days']), 1)
+        self.assertEqual(self.request(self.customer, 'get', '/api/reports/sales')[0].status_code, 403)
+        self.assertEqual(self.request(self.manager, 'get', '/api/reports/sales?from=yesterday')[0].status_code, 400)
+
+
+class OrderSnapshotTestCase(ApiTestCase):
+    def test_orders_keep_checkout_prices(self):
+        Cart.objects.create(user=self.customer, item=self.items[0], quantity=2, itemprice=Decimal('17.00'))
+        Cart.objects.create(user=self.customer, item=self.items[1], quantity=1, itemprice=Decimal('9.00'))
+        self.assertEqual(self.request(self.customer, 'post', '/api/orders')[0].status_code, 201)
+        order = Order.objects.get(customer=self.customer)
+        MenuItem.objects.filter(pk=self.items[0].pk).update(title='Fresh pasta', price=Decimal('12.00'))
+        lines = [{'item': {'title': 'Pasta', 'price': '8.50'}, 'quantity': 2}, {'item': {'title': 'Pizza', 'price': '9.00'}, 'quantity': 1}]
+        self.client.force_authenticate(self.customer)
+        for path in (f'/api/orders/{order.id}', '/api/orders'):
+            clear_caches()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path)
+            data = response.data if 'items' in response.data else response.data[0]
+            self.assertEqual(json.loads(json.dumps(data['items'])), lines)
+            self.assertFalse([query['sql'] for query in queries if 'littlelemonapi_menuitem' in query['sql'].lower()])
+        # Lines already on the order keep their price; new ones are priced from the menu.
+        items = [{'item': self.items[0].id, 'quantity': 3}, {'item': self.items[2].id, 'quantity': 1}]
+        response, _ = self.request(self.manager, 'patch', f'/api/orders/{order.id}', {'items': items})
+        self.assertEqual(response.status_code, 200, response.data)
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('29.75'))
+        self.assertEqual(sorted(order.lines.values_list('title', 'price', 'quantity')), [('Cake', Decimal('4.25'), 1), ('Pasta', Decimal('8.50'), 3)])
+        response, _ = self.request(self.manager, 'patch', f'/api/orders/{order.id}', {'items': [{'item': 0, 'quantity': 1}]})
+        self.assertEqual(response.status_code, 400)
+
+
+class MigrationTestCase(TransactionTestCase):
+    def migrate(self, targets=None):
+        # Without targets, all the way forward again.
+        executor = MigrationExecutor(connection)
+        targets = targets or executor.loader.graph.leaf_nodes()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+
+class SalesRollupsMigrationTestCase(MigrationTestCase):
+    def test_backfills_from_historical_models(self):
+        old = self.migrate([('LittleLemonAPI', '0003_filter_indexes')])
+        try:
+            customer = old.get_model('auth', 'User').objects.create(username='brian')
+            category = old.get_model('LittleLemonAPI', 'Category').objects.create(name='Mains')
+            pasta = old.get_model('LittleLemonAPI', 'MenuItem').objects.create(title='Pasta', price=Decimal('8.50'), category=category)
+            line = old.get_model('LittleLemonAPI', 'OrderItem').objects.create(customer=customer, item=pasta, quantity=2)
+            Order = old.get_model('LittleLemonAPI', 'Order')
+            for _ in range(2):
+                Order.objects.create(customer=customer, total=Decimal('17.00')).items.add(line)
+            new = self.migrate([('LittleLemonAPI', '0004_sales_rollups')])
+            self.assertEqual(list(new.get_model('LittleLemonAPI', 'ItemSales').objects.values_list('item', 'quantity')), [(pasta.id, 4)])
+            self.assertEqual(list(new.get_model('LittleLemonAPI', 'DailySales').objects.values_list('status', 'orders', 'revenue')), [('0', 2, Decimal('34.00'))])
+        finally:
+            self.migrate()
+
+
+class SplitOrderItemsMigrationTestCase(MigrationTestCase):
+    before = [('LittleLemonAPI', '0006_orderline')]
+    after = [('LittleLemonAPI', '0008_remove_orderitem')]
+
+    def test_resumes_where_it_stopped(self):
+        old = self.migrate(self.before)
+        try:
+            customer = old.get_model('auth', 'User').objects.create(username='brian')
+            category = old.get_model('LittleLemonAPI', 'Category').objects.create(name='Mains')
+            MenuItem = old.get_model('LittleLemonAPI', 'MenuItem')
+            pasta, pizza = (MenuItem.objects.create(title=title, price=Decimal('9.00'), category=category) for title in ('Pasta', 'Pizza'))
+            OrderItem = old.get_model('LittleLemonAPI', 'OrderItem')
+            shared = OrderItem.objects.create(customer=customer, item=pasta, quantity=2, title='Pasta', price=Decimal('8.50'))
+            single = OrderItem.objects.create(customer=customer, item=pizza, quantity=1, title='Pizza', price=Decimal('9.00'))
+            Order = old.get_model('LittleLemonAPI', 'Order')
+            orders = [Order.objects.create(customer=customer, total=Decimal('17.00')) for _ in range(3)]
+            orders[0].items.add(shared)
+            orders[1].items.add(shared, single)
+            orders[2].items.add(shared)
+            # An earlier run that stopped after committing the first order's lines.
+            old.get_model('LittleLemonAPI', 'OrderLine').objects.create(order=orders[0], item=pasta, quantity=2, title='Pasta', price=Decimal('8.50'))
+            with mock.patch.object(import_module('LittleLemonAPI.migrations.0007_split_order_items'), 'BATCH_SIZE', 1):
+                self.migrate(self.after)
+            lines = OrderLine.objects.order_by('order', 'id').values_list('order', 'title', 'price', 'quantity')
+            self.assertEqual(list(lines), [
+                (orders[0].id, 'Pasta', Decimal('8.50'), 2),
+                (orders[1].id, 'Pasta', Decimal('8.50'), 2),
+                (orders[1].id, 'Pizza', Decimal('9.00'), 1),
+                (orders[2].id, 'Pasta', Decimal('8.50'), 2),
+            ])
+        finally:
+            self.migrate()
+
+    def test_item_sales_are_rebuilt_from_order_lines(self):
+        old = self.migrate(self.after)
+        try:
+            customer = old.get_model('auth', 'User').objects.create(username='brian')
+            category = old.get_model('LittleLemonAPI', 'Category').objects.create(name='Mains')
+            pasta = old.get_model('LittleLemonAPI', 'MenuItem').objects.create(title='Pasta', price=Decimal('8.50'), category=category)
+            Order, OrderLine = old.get_model('LittleLemonAPI', 'Order'), old.get_model('LittleLemonAPI', 'OrderLine')
+            for quantity in (2, 3):
+                OrderLine.objects.create(order=Order.objects.create(customer=customer, total=Decimal('17.00')), item=pasta, quantity=quantity, title='Pasta', price=Decimal('8.50'))
+            # What 0004 counted from the shared rows.
+            old.get_model('LittleLemonAPI', 'ItemSales').objects.create(item=pasta, quantity=4)
+            new = self.migrate([('LittleLemonAPI', '0009_rebuild_item_sales')])
+            self.assertEqual(list(new.get_model('LittleLemonAPI', 'ItemSales').objects.values_list('item', 'quantity')), [(pasta.id, 5)])
+        finally:
+            self.migrate()
+
+
+class AssignmentEngineTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.second_crew = User.objects.create_user('ellen', 'ellen@example.com', 'pass')
+        self.second_crew.groups.add(self.crew_group)
+        self.seed_orders(3)
+        self.orders = [Order.objects.create(customer=self.customer, total=Decimal('10.00')) for _ in range(7)]
+        rollups.rebuild()
+
+    def test_balances_open_orders(self):
+        engine = AssignmentEngine(batch_size=3)
+        self.assertEqual(engine.run(), 7)
+        loads = dict(Order.objects.values_list('deliver_crew').annotate(Count('id')).order_by())
+        self.assertEqual(loads, {self.crew.id: 5, self.second_crew.id: 5})
+        self.assertEqual(rollups.compare(), [])
+
+    def test_never_takes_an_order_assigned_elsewhere(self):
+        taken = self.orders[0]
+        class RacingEngine(AssignmentEngine):
+            def least_loaded(engine):
+                # Another worker assigns the first order between this engine's read and its update.
+                Order.objects.filter(pk=taken.pk, deliver_crew__isnull=True).update(deliver_crew=self.crew)
+                return super().least_loaded()
+        engine = RacingEngine()
+        self.assertEqual(engine.assign_batch(), 6)
+        taken.refresh_from_db()
+        self.assertEqual(taken.deliver_crew, self.crew)
+        self.assertEqual(sum(engine.loads.values()), 9)
+
+    def test_run_goes_on_past_orders_assigned_elsewhere(self):
+        taken = self.orders[0]
+        class RacingEngine(AssignmentEngine):
+            def least_loaded(engine):
+                Order.objects.filter(pk=taken.pk, deliver_crew__isnull=True).update(deliver_crew=self.crew)
+                return super().least_loaded()
+        self.assertEqual(RacingEngine(batch_size=3).run(), 6)
+        self.assertFalse(Order.objects.filter(deliver_crew__isnull=True).exists())
+
+
+class FastSerializationTestCase(ApiTestCase):
+    def assertSameJSON(self, serializer, fast):
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(serializer.data))
+
+    def test_menu_items(self):
+        self.items[1].featured = True
+        self.items[1].save()
+        items = MenuItem.objects.select_related('category').order_by('id')
+        self.assertSameJSON(MenuItemSerializer(items, many=True), menu_item_list_data(menu_item_values(items)))
+        ranked = search_menu_items(MenuItem.objects.select_related('category'), 'pa')
+        self.assertSameJSON(MenuItemSerializer(ranked, many=True), menu_item_list_data(menu_item_values(ranked)))
+
+    def test_cart(self):
+        for quantity, item in enumerate(self.items, start=1):
+            Cart.objects.create(user=self.customer, item=item, quantity=quantity, itemprice=item.price * quantity)
+        cart = Cart.objects.select_related('item').filter(user=self.customer).order_by('id')
+        self.assertSameJSON(CartSerializer(cart, many=True), cart_list_data(cart.values(*CART_VALUES)))
+
+    def test_orders(self):
+        self.seed_orders(3)
+        Order.objects.create(customer=self.manager, total=Decimal('0.50'), status='1')
+        orders = Order.objects.with_items().order_by('id')
+        self.assertSameJSON(OrderSerializer(orders, many=True), order_list_data(orders))
+        self.assertSameJSON(OrderDeliverCrewSerializer(orders, many=True), order_list_data(orders, deliver_crew_view=True))
+        page = list(order_values(orders)[1:3])
+        self.assertSameJSON(OrderSerializer(orders[1:3], many=True), order_list_data(page))
+
+
+class ORJSONTestCase(ApiTestCase):
+    def test_renders_same_bytes_as_drf(self):
+        self.seed_orders(3)
+        orders = Order.objects.with_items().order_by('id')
+        items = MenuItem.objects.select_related('category').order_by('id')
+        payloads = [
+            MenuItemSerializer(items, many=True).data,
+            OrderSerializer(orders, many=True).data,
+            {'price': Decimal('1.50'), 'date': orders[0].date, 'text': 'caf\u00e9 \u2028 </script>', 1: None},
+        ]
+        for data in payloads:
+            self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser(self):
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(b'{"quantity": 2, "title": "caf\xc3\xa9"}')), {'quantity': 2, 'title': 'caf\u00e9'})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"quantity": '))
+
+    def test_negotiated_renderers(self):
+        client = APIClient()
+        response = client.get('/api/menu-items', HTTP_ACCEPT='application/xml')
+        self.assertEqual(response['Content-Type'], 'application/xml; charset=utf-8')
+        self.assertIn(b'<root>', response.content)
+        self.assertIsInstance(LazyXMLRenderer().renderer, XMLRenderer)
+        response = client.get('/api/menu-items?format=api')
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        clear_caches()
+        response = client.post('/api/users', '{"username": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class MetricsTestCase(ApiTestCase):
+    def scrape(self):
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        lines = dict(line.rsplit(' ', 1) for line in response.content.decode().splitlines() if not line.startswith('#'))
+        return {series: float(value) for series, value in lines.items()}
+
+    def test_records_per_route(self):
+        order = self.seed_orders(1)[0]
+        self.client.force_authenticate(self.customer)
+        get_roles(SimpleNamespace(user=self.customer))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/orders/{order.pk}')
+        count = len(queries)
+        self.assertRegex(response['Server-Timing'], rf'^db;dur=[\d.]+;desc="{count} queries", serialize;dur=[\d.]+, app;dur=[\d.]+$')
+        labels = 'method="GET",route="api/orders/<int:pk>"'
+        metrics = self.scrape()
+        self.assertEqual(metrics[f'littlelemon_requests_total{{{labels},status="200"}}'], 1)
+        self.assertEqual(metrics[f'littlelemon_request_duration_seconds_bucket{{{labels},le="+Inf"}}'], 1)
+        self.assertEqual(metrics[f'littlelemon_request_duration_seconds_count{{{labels}}}'], 1)
+        self.assertEqual(metrics[f'littlelemon_db_queries_total{{{labels}}}'], count)
+        self.assertEqual(metrics[f'littlelemon_response_bytes_total{{{labels}}}'], len(response.content))
+        self.assertGreater(metrics[f'littlelemon_serialization_seconds_total{{{labels}}}'], 0)
+
+    def test_streamed_responses_are_recorded_when_done(self):
+        self.seed_orders(3)
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/orders/export')
+        body = b''.join(response.streaming_content)
+        metrics = self.scrape()
+        self.assertEqual(metrics['littlelemon_response_bytes_total{method="GET",route="api/orders/export"}'], len(body))
+        self.assertGreater(metrics['littlelemon_db_queries_total{method="GET",route="api/orders/export"}'], 0)
+
+    def test_managers_only(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/metrics').status_code, 403)
+
+    def test_store_follows_setting(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.sqlite3')
+            with override_settings(METRICS_DATABASE=path):
+                self.scrape()
+                metrics = self.scrape()
+            self.assertEqual(metrics['littlelemon_requests_total{method="GET",route="api/metrics",status="200"}'], 1)
+            with closing(sqlite3.connect(path)) as connection:
+                self.assertEqual(connection.execute("SELECT COUNT(*) FROM metrics_series WHERE name = 'littlelemon_requests_total'").fetchone(), (1,))
+
+    def test_workers_are_summed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.sqlite3')
+            workers = [MetricsStore(path, 60) for _ in range(2)]
+            for seconds, worker in zip((0.003, 0.2), workers):
+                worker.observe('api/orders', 'GET', 200, seconds, RequestStats(), 100)
+                worker.flush(force=True)
+            # A restarted worker's totals are kept in the file.
+            workers[0].close()
+            workers.append(MetricsStore(path, 60))
+            workers[2].observe('api/orders', 'GET', 200, 0.003, RequestStats(), 100)
+            workers[2].flush(force=True)
+            text = workers[1].exposition()
+            for worker in workers:
+                worker.close()
+        labels = 'method="GET",route="api/orders"'
+        self.assertIn(f'littlelemon_requests_total{{{labels},status="200"}} 3\n', text)
+        self.assertIn(f'littlelemon_request_duration_seconds_bucket{{{labels},le="0.005"}} 2\n', text)
+        self.assertIn(f'littlelemon_request_duration_seconds_bucket{{{labels},le="0.25"}} 3\n', text)
+        self.assertIn(f'littlelemon_response_bytes_total{{{labels}}} 300\n', text)
+
+
+    def test_exited_workers_are_folded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.sqlite3')
+            store = MetricsStore(path, 60)
+            store.observe('api/orders', 'GET', 200, 0.003, RequestStats(), 100)
+            store.flush(force=True)
+            before = store.collect()
+            exited = MetricsStore(path, 60)
+            exited.observe('api/orders', 'GET', 200, 0.003, RequestStats(), 100)
+            exited.close()
+            exited.observe('api/orders', 'GET', 200, 0.003, RequestStats(), 100)
+            exited.flush(force=True)
+            # And one that was killed, after counting two requests: it exits without closing.
+            killed = MetricsStore(path, 60)
+            def count():
+                killed.observe('api/orders', 'GET', 200, 0.003, RequestStats(), 100)
+                killed.flush(force=True)
+            OtherWorker(count).read_again()
+            collected = store.collect()
+            with closing(sqlite3.connect(path)) as connection:
+                workers = connection.execute('SELECT DISTINCT worker FROM metrics_series ORDER BY worker = ?', (RETIRED,)).fetchall()
+            store.close()
+        self.assertEqual(workers, [(store.worker_id,), (RETIRED,)])
+        self.assertEqual({key: value * 4 for key, value in before.items()}, collected)
+
+
+@override_settings(DATABASES={**settings.DATABASES, 'replica': {**settings.DATABASES['default'], 'TEST': {'MIRROR': 'default'}}})
+class ReadReplicaTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReadReplicaRouter()
+
+    def test_listings_read_from_replica(self):
+        self.assertIsNone(self.router.db_for_read(Order))
+        with replica_reads('catalog'):
+            self.assertEqual(self.router.db_for_read(MenuItem), 'replica')
+            self.assertEqual(self.router.db_for_read(Order), 'replica')
+            self.assertIsNone(self.router.db_for_read(User))
+            self.assertEqual(self.router.db_for_write(Order), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'LittleLemonAPI'))
+
+    def test_writes_stick_to_primary(self):
+        request = SimpleNamespace(user=SimpleNamespace(pk=7, is_authenticated=True))
+        listing = reads_from_replica()(lambda request: self.router.db_for_read(Order))
+        self.assertEqual(listing(request), 'replica')
+        wrote_primary('user:7')
+        self.assertIsNone(listing(request))
+        request.user.pk = 8
+        self.assertEqual(listing(request), 'replica')
+        bump_catalog_version()
+        with replica_reads('catalog'):
+            self.assertIsNone(self.router.db_for_read(MenuItem))
+
+    def test_writes_reach_other_workers(self):
+        worker = OtherWorker(lambda: replica_is_current(['user:7']))
+        self.assertTrue(worker.first)
+        wrote_primary('user:7')
+        self.assertFalse(worker.read_again())
+
+    def test_sync_replica(self):
+        with tempfile.TemporaryDirectory() as directory:
+            primary, replica = os.path.join(directory, 'primary.sqlite3'), os.path.join(directory, 'replica.sqlite3')
+            with closing(sqlite3.connect(primary)) as source:
+                source.execute('PRAGMA journal_mode=WAL')
+                source.execute('CREATE TABLE item (title TEXT)')
+                source.execute("INSERT INTO item VALUES ('Greek salad')")
+                source.commit()
+                # The row is still only in the -wal file.
+                sync_replica(primary, replica)
+            with closing(sqlite3.connect(replica)) as target:
+                self.assertEqual(target.execute('SELECT title FROM item').fetchall(), [('Greek salad',)])
+
+
+@register('test_flaky')
+def flaky_job(fail):
+    if fail:
+        raise ValueError('flaky')
+
+@register('test_crash_once')
+def crash_once_job(marker):
+    # The first run takes the whole worker process down with it.
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    with open(marker, 'a') as log:
+        log.write('ran\n')
+
+class JobQueueTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.queue = JobQueue(os.path.join(self.directory, 'jobs.sqlite3'))
+        # job_queue, which the views enqueue on, gets a file of its own too.
+        self.enterContext(override_settings(JOBS_DATABASE=os.path.join(self.directory, 'views.sqlite3')))
+
+    def work(self, queue, **options):
+        worker = Worker(queue, threading.Event(), **options)
+        worker.run(burst=True)
+        return worker
+
+    def test_order_jobs_run_after_commit(self):
+        self.customer.email = 'brian@example.com'
+        self.customer.save()
+        Cart.objects.create(user=self.customer, item=self.items[0], quantity=2, itemprice=Decimal('17.00'))
+        with self.captureOnCommitCallbacks() as callbacks:
+            response, _ = self.request(self.customer, 'post', '/api/orders')
+        self.assertEqual(response.status_code, 201)
+        # Nothing is queued until the checkout commits.
+        self.assertEqual(job_queue.counts()['queued'], 0)
+        for callback in callbacks:
+            callback()
+        order = Order.objects.get(customer=self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.request(self.crew, 'patch', f'/api/orders/{order.pk}', {'status': '1'})
+        self.assertEqual(job_queue.counts()['queued'], 2)
+        with closing(sqlite3.connect(os.path.join(self.directory, 'views.sqlite3'))) as connection:
+            self.assertEqual(connection.execute('SELECT COUNT(*) FROM job').fetchone(), (2,))
+        self.assertEqual(self.work(job_queue).done, 2)
+        self.assertEqual([message.subject for message in mail.outbox], [f'Little Lemon order {order.pk}', f'Little Lemon order {order.pk} delivered'])
+        self.assertIn('2 x Pasta', mail.outbox[0].body)
+
+    @override_settings(JOBS_MAX_ATTEMPTS=2, JOBS_BACKOFF=60)
+    def test_failures_are_retried_with_backoff(self):
+        job_id = self.queue.enqueue('test_flaky', fail=True)
+        self.assertEqual(self.work(self.queue).failed, 1)
+        run_at, attempts, last_error = self.queue.connection.execute('SELECT run_at, attempts, last_error FROM job WHERE id = ?', (job_id,)).fetchone()
+        self.assertEqual(attempts, 1)
+        self.assertGreaterEqual(run_at, time.time() + 29)
+        self.assertIn('ValueError: flaky', last_error)
+        # Not ready again before its backoff is over.
+        self.assertEqual(self.work(self.queue).failed, 0)
+        self.queue.connection.execute('UPDATE job SET run_at = 0')
+        self.work(self.queue)
+        self.assertEqual(self.queue.counts(), {'queued': 0, 'running': 0, 'failed': 1})
+
+    def test_jobs_of_a_crashed_worker_run_again(self):
+        marker = os.path.join(self.directory, 'marker')
+        self.queue.enqueue('test_crash_once', marker=marker)
+        crashed = multiprocessing.get_context('fork').Process(target=self.work, args=(self.queue,), kwargs={'lease': 0.2})
+        crashed.start()
+        crashed.join()
+        self.assertEqual(crashed.exitcode, 1)
+        self.assertEqual(self.queue.counts()['running'], 1)
+        # Still leased to the dead worker.
+        self.assertEqual(self.work(self.queue).done, 0)
+        time.sleep(0.25)
+        self.assertEqual(self.work(self.queue).done, 1)
+        self.assertEqual(self.queue.counts(), {'queued': 0, 'running': 0, 'failed': 0})
+        with open(marker) as log:
+            self.assertEqual(log.read(), 'ran\n')
+
+    def test_process_pool(self):
+        self.queue.enqueue_many([('test_flaky', {'fail': False})] * 200)
+        self.assertIsNone(run_pool(self.queue, processes=2, threads=2, burst=True, batch_size=10))
+        self.assertEqual(self.queue.counts(), {'queued': 0, 'running': 0, 'failed': 0})
+
+
+class CredentialCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('alfred', 'alfred@example.com', 'pass')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+
+    def setUp(self):
+        clear_caches()
+        credential_cache.clear()
+        self.token = Token.objects.create(user=self.manager)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get(self, path='/api/users/me'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        return response, queries
+
+    def test_token_is_resolved_once(self):
+        self.get()
+        response, queries = self.get('/api/users')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'authtoken_token' in q['sql'] or 'auth_group' in q['sql']])
+
+    def test_session_is_resolved_once(self):
+        client = APIClient()
+        client.login(username='alfred', password='pass')
+        client.get('/api/users/me')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/users/me')
+        self.assertEqual(response.json()['username'], 'alfred')
+        self.assertEqual(len(queries), 0)
+        client.logout()
+        self.assertEqual(client.get('/api/users/me').status_code, 401)
+
+    def test_token_delete_invalidates(self):
+        self.get()
+        self.token.delete()
+        self.assertEqual(self.get()[0].status_code, 401)
+
+    def test_password_change_and_deactivation_invalidate(self):
+        self.get()
+        self.manager.set_password('new-pass')
+        self.manager.save()
+        response, queries = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue([q for q in queries if 'authtoken_token' in q['sql']])
+        self.manager.is_active = False
+        self.manager.save()
+        self.assertEqual(self.get()[0].status_code, 401)
+
+    def test_revocations_reach_other_workers(self):
+        self.get()
+        worker = OtherWorker(lambda: credential_cache.get(('token', self.token.key)) is not None)
+        self.assertTrue(worker.first)
+        self.token.delete()
+        self.assertFalse(worker.read_again())
+
+    def test_revoking_users_changed_with_update(self):
+        self.get()
+        User.objects.filter(pk=self.manager.pk).update(is_active=False)
+        self.assertEqual(self.get()[0].status_code, 200)
+        credential_cache.revoke(('user', self.manager.pk))
+        self.assertEqual(self.get()[0].status_code, 401)
+
+
+class RoleThrottleTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('alfred', 'alfred@example.com', 'pass')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.customer = User.objects.create_user('brian', 'brian@example.com', 'pass')
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+
+    def statuses(self, user, count, path='/api/users/me'):
+        self.client.force_authenticate(user)
+        return [self.client.get(path).status_code for _ in range(count)]
+
+    def test_limits_follow_role(self):
+        self.assertEqual(self.statuses(self.customer, 6), [200] * 5 + [429])
+        self.assertEqual(self.statuses(self.manager, 6), [200] * 6)
+        self.assertEqual(self.statuses(None, 3, '/api/menu-items'), [200, 200, 429])
+
+    def test_workers_share_counters(self):
+        with tempfile.TemporaryDirectory() as directory:
+            workers = [SlidingWindowStore(os.path.join(directory, 'throttle.sqlite3')) for _ in range(2)]
+            allowed = [workers[i % 2].hit('customer:1', 5, 60, now=120)[0] for i in range(6)]
+            self.assertEqual(allowed, [True] * 5 + [False])
+
+    def test_store_follows_setting(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'throttle.sqlite3')
+            with override_settings(THROTTLE_DATABASE=path):
+                self.assertEqual(self.statuses(self.customer, 1), [200])
+            with closing(sqlite3.connect(path)) as connection:
+                self.assertEqual(connection.execute('SELECT SUM(hits) FROM throttle_window').fetchone(), (1,))
+
+    def test_previous_window_decays(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = SlidingWindowStore(os.path.join(directory, 'throttle.sqlite3'))
+            for _ in range(4):
+                store.hit('customer:1', 4, 60, now=100)
+            self.assertEqual(store.hit('customer:1', 4, 60, now=130), (True, None))
+            self.assertEqual(store.hit('customer:1', 4, 60, now=130), (False, 5.0))
+            self.assertEqual(store.hit('customer:1', 4, 60, now=136), (True, None))
+
+
+@override_settings(QUERY_COUNT_HEADER=True, REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}})
+class LoadTestHarnessTestCase(LiveServerTestCase):
+    def test_scenarios_cover_every_route(self):
+        clear_caches()
+        fixtures = prepare_loadtest(1)
+        report = asyncio.run(run_scenarios(self.live_server_url, list(SCENARIOS), 1, 1, fixtures))
+        self.assertEqual(report['uncovered_routes'], [])
+        self.assertEqual([route for route in report['routes'] if route['failures'] or route['errors']], [])
+        self.assertTrue(all(route['queries_max'] is not None for route in report['routes']))
@@ -0,0 +1,104 @@
+import math
+import random
+import sqlite3
+import threading
+import time
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+from .roles import get_roles, MANAGER, DELIVER_CREW
+
+class SlidingWindowStore:
+    # One row per (client, window) in a small SQLite file shared by every worker process.
+    # A check reads the current and previous window and bumps one counter, under one write lock.
+    # Without a path the store uses settings.THROTTLE_DATABASE, looked up on every use so that
+    # override_settings can point it at another file.
+    def __init__(self, path=None):
+        self.path = path
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        path = str(self.path or settings.THROTTLE_DATABASE)
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.path != path:
+            if connection is not None:
+                connection.close()
+            connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS throttle_window ('
+                'key TEXT NOT NULL, window INTEGER NOT NULL, hits INTEGER NOT NULL, '
+                'PRIMARY KEY (key, window)) WITHOUT ROWID'
+            )
+            self.local.connection, self.local.path = connection, path
+        return connection
+
+    def hit(self, key, limit, duration, now=None):
+        # Returns (allowed, seconds to wait). Rejected requests are not counted.
+        now = time.time() if now is None else now
+        elapsed = now % duration
+        window = int(now - elapsed)
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            counts = dict(connection.execute(
+                'SELECT window, hits FROM throttle_window WHERE key = ? AND window IN (?, ?)',
+                (key, window - duration, window),
+            ))
+            previous, current = counts.get(window - duration, 0), counts.get(window, 0)
+            weight = 1 - elapsed / duration
+            allowed = previous * weight + current < limit
+            if allowed:
+                connection.execute(
+                    'INSERT INTO throttle_window (key, window, hits) VALUES (?, ?, 1) '
+                    'ON CONFLICT (key, window) DO UPDATE SET hits = hits + 1',
+                    (key, window),
+                )
+            if random.random() < 0.01:
+                # Windows are keyed by their start time; nothing older than two daily windows is read again.
+                connection.execute('DELETE FROM throttle_window WHERE window < ?', (int(now) - 2 * 86400,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        if allowed:
+            return True, None
+        if current >= limit or not previous:
+            return False, duration - elapsed
+        # The previous window's share decays linearly; wait until it falls below what is left.
+        return False, max(0.0, (1 - (limit - current) / previous) * duration - elapsed)
+
+    def reset(self):
+        self.connection.execute('DELETE FROM throttle_window')
+
+throttle_store = SlidingWindowStore()
+
+class RoleRateThrottle(BaseThrottle):
+    # Rates come from DEFAULT_THROTTLE_RATES under 'anon', 'customer', 'deliver_crew' and 'manager'.
+    def get_scope(self, request):
+        if not request.user or not request.user.is_authenticated:
+            return 'anon'
+        roles = get_roles(request)
+        if MANAGER in roles:
+            return 'manager'
+        if DELIVER_CREW in roles:
+            return 'deliver_crew'
+        return 'customer'
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        limit, duration = SimpleRateThrottle.parse_rate(None, rate)
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        allowed, self.retry_after = throttle_store.hit(f'{scope}:{ident}', limit, duration)
+        return allowed
+
+    def wait(self):
+        return math.ceil(self.retry_after) if self.retry_after is not None else None
@@ -1,18 +1,31 @@
+from django.conf import settings
 from django.urls import path
-from. import views
+from. import views, async_views
+
+def reads(sync_view, async_view):
+    # Under ASGI the read-heavy GETs are served by the async variants.
+    if settings.ASYNC_READ_VIEWS:
+        return async_views.async_reads(sync_view, async_view.as_view())
+    return sync_view
 
 urlpatterns = [
-    path('menu-items/category', views.MenuItemsCategoryView.as_view()),
-    path('menu-items/category/<int:pk>', views.MenuItemsSingleCategoryView.as_view()),
-    path('menu-items', views.menu_items),
+    path('menu-items/category', reads(views.MenuItemsCategoryView.as_view(), async_views.MenuItemsCategoryView)),
+    path('menu-items/category/<int:pk>', reads(views.MenuItemsSingleCategoryView.as_view(), async_views.MenuItemsSingleCategoryView)),
+    path('menu-items', reads(views.menu_items, async_views.MenuItemsView)),
+    path('menu-items/import', views.MenuImportView.as_view()),
+    path('menu-items/export', views.MenuExportView.as_view()),
     path('menu-items/<int:pk>', views.SingleMenuItemView.as_view()),
-    path('cart/menu-items', views.CartView.as_view()),
-    path('orders', views.OrdersView.as_view()),
-    path('orders/<int:pk>', views.OrderView.as_view()),
+    path('cart/menu-items', reads(views.CartView.as_view(), async_views.CartView)),
+    path('cart/menu-items/batch', views.CartBatchView.as_view()),
+    path('orders', reads(views.OrdersView.as_view(), async_views.OrdersView)),
+    path('orders/export', views.OrdersExportView.as_view()),
+    path('orders/<int:pk>', reads(views.OrderView.as_view(), async_views.OrderView)),
+    path('reports/sales', views.SalesReportView.as_view()),
+    path('metrics', views.MetricsView.as_view()),
     path('users', views.UsersView.as_view()),
-    path('users/me', views.CurrentUserView.as_view()),
+    path('users/me', reads(views.CurrentUserView.as_view(), async_views.CurrentUserView)),
     path('groups/manager/users', views.ManagerUsersView.as_view()),
     path('groups/manager/users/<int:pk>', views.ManagerUserRemoveView.as_view()),
     path('groups/deliver-crew/users', views.DeliverCrewUsersView.as_view()),
     path('groups/deliver-crew/users/<int:pk>', views.DeliverCrewUserRemoveView.as_view())
-]
\ No newline at end of file
+]
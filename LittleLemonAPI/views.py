@@ -2,19 +2,32 @@ from rest_framework import generics, status
 from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
 from django.shortcuts import get_list_or_404, get_object_or_404
+from django.http import HttpResponse
 from rest_framework.response import Response
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
-from django.contrib.auth.models import User, Group
-from .models import MenuItem, Category, Cart, Order
-from .serializers import MenuItemSerializer, MenuItemCreateSerializer, CategorySerializer, UserRegisterSerializer, UsersSerializer, CurrentUserSerializer, ManagerUsersSerializer, DeliverCrewUsersSerializer, CartSerializer, CartCreateSerializer, OrderSerializer, OrderUpdateCompleteManagerSerializer, OrderUpdatePartialManagerSerializer, OrderUpdateCustomerSerializer, OrderItemCartSerializer, OrderDeliverCrewSerializer, OrderUpdateDeliverCrewSerializer
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q, Sum
+from .models import MenuItem, Category, Cart, Order, OrderLine, DailySales, ItemSales
+from .serializers import MenuItemSerializer, MenuItemCreateSerializer, CategorySerializer, UserRegisterSerializer, UsersSerializer, CurrentUserSerializer, ManagerUsersSerializer, DeliverCrewUsersSerializer, CartSerializer, CartCreateSerializer, CartBatchSerializer, OrderSerializer, OrderUpdateCompleteManagerSerializer, OrderUpdatePartialManagerSerializer, OrderUpdateCustomerSerializer, OrderUpdateDeliverCrewSerializer
 from .permissions import ManagerRole
-from rest_framework.decorators import api_view, permission_classes, throttle_classes
-import math
+from .roles import MANAGER, DELIVER_CREW, is_manager, is_deliver_crew, get_group
+from . import rollups
+from .catalog import cached_catalog_response, bump_catalog_version
+from .fast_serializers import menu_item_values, menu_item_list_data, CART_VALUES, cart_list_data, order_values, order_list_data
+from .metrics import metrics_store
+from .jobs import enqueue_on_commit
+from .exports import stream_orders, stream_menu_csv, menu_items_export
+from .menu_import import read_menu_rows, import_menu_rows
+from .search import search_menu_items
+from .routers import reads_from_replica
+from .pagination import use_cursor_pagination, MenuItemCursorPagination, OrderCursorPagination, UserCursorPagination
+from rest_framework.decorators import api_view, permission_classes
+import csv
+from datetime import date
 from decimal import Decimal
-from datetime import datetime
 
 # Create your views here.
 
@@ -22,125 +35,138 @@ class MenuItemsCategoryView(generics.ListAPIView, generics.CreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     def get(self, request):
-        if request.user.groups.filter(name = 'Manager').exists():
+        if is_manager(request):
             self.permission_classes = [IsAuthenticated]
-            self.throttle_classes = [UserRateThrottle]
         else:
             self.permission_classes = [AllowAny]
-            self.throttle_classes = [AnonRateThrottle]
+        return cached_catalog_response(request, 'categories', self.list_categories)
+    @reads_from_replica('catalog')
+    def list_categories(self):
         if self.queryset.exists():
             return Response(self.serializer_class(get_list_or_404(self.queryset), many=True).data)
         else:
             return Response({ "message" : "There are no categories" }, status=status.HTTP_404_NOT_FOUND)
     def post(self, request):
-        if request.user.groups.filter(name = 'Manager').exists():
+        if is_manager(request):
             self.permission_classes = [IsAuthenticated, ManagerRole]
-            self.throttle_classes = [UserRateThrottle]
             self.permission_classes = [ ManagerRole]
-            self.throttle_classes = [UserRateThrottle]
             if Category.objects.filter(name = request.data['name']).exists():
                 return Response({ "message" : "Category already exists" }, status=status.HTTP_400_BAD_REQUEST)
             else:
-                return Response(self.serializer_class(Category.objects.create(name=request.data['name']), many=False).data, status=status.HTTP_201_CREATED)
+                category = Category.objects.create(name=request.data['name'])
+                bump_catalog_version()
+                return Response(self.serializer_class(category, many=False).data, status=status.HTTP_201_CREATED)
         else:
             return Response({ "message" : "Unauthorized to create a category " }, status=status.HTTP_401_UNAUTHORIZED)
 
 class MenuItemsSingleCategoryView(generics.DestroyAPIView, generics.UpdateAPIView, generics.ListAPIView):
     def get(self, request, pk):
-        serializer_class = MenuItemSerializer
         self.permission_classes = [IsAuthenticated, AllowAny]
-        self.throttle_classes = [AnonRateThrottle]
+        return cached_catalog_response(request, f'categories/{pk}', lambda: self.list_items(pk))
+    @reads_from_replica('catalog')
+    def list_items(self, pk):
+        serializer_class = MenuItemSerializer
         if Category.objects.filter(id=pk).exists():
-            return Response(serializer_class(get_list_or_404(MenuItem.objects.filter(category=pk)), many=True).data)
+            return Response(serializer_class(get_list_or_404(MenuItem.objects.select_related('category').filter(category=pk)), many=True).data)
         else:
             return Response({ "message" : "Category does not exist" }, status=status.HTTP_404_NOT_FOUND)
     def patch(self, request, pk):
         self.permission_classes = [IsAuthenticated, ManagerRole]
-        self.throttle_classes = [UserRateThrottle]
         if Category.objects.filter(id=pk).exists():
             category = Category.objects.get(id=pk)
             category.name = request.data['name']
             category.save()
+            bump_catalog_version()
             return Response(CategorySerializer(get_list_or_404(Category.objects.filter(id=pk)), many=True).data, status=status.HTTP_200_OK)
         else:
             return Response({ "message" : "Category does not exist" }, status=status.HTTP_404_NOT_FOUND)
     def delete(self, request, pk):
         self.permission_classes = [IsAuthenticated, ManagerRole]
-        self.throttle_classes = [UserRateThrottle]
         if Category.objects.filter(id=pk).exists():
             Category.objects.get(id=pk).delete()
+            bump_catalog_version()
             return Response({ "message" : "Category Removed" }, status=status.HTTP_200_OK)
         else:
             return Response({ "message" : "Category does not exist" }, status=status.HTTP_404_NOT_FOUND)
 
+def menu_items_queryset(request):
+    items = MenuItem.objects.select_related('category')
+    category_name = request.query_params.get('category')
+    to_price = request.query_params.get('to_price')
+    search = request.query_params.get('search')
+    ordering = request.query_params.get('ordering')
+    if category_name is not None:
+        items = items.filter(category__name=category_name)
+    if to_price is not None:
+        items = items.filter(price__lte=to_price)
+    if search is not None:
+        items = search_menu_items(items, search, ranked=ordering is None)
+    if ordering is not None:
+        ordering_fields = ordering.split(',')
+        items = items.order_by(*ordering_fields)
+    return items
+
+@reads_from_replica('catalog')
+def menu_items_page(request):
+    items = menu_item_values(menu_items_queryset(request))
+    per_page = request.query_params.get('per_page', default=2)
+    if use_cursor_pagination(request):
+        paginator = MenuItemCursorPagination()
+        result_page = paginator.paginate_queryset(items, request)
+    else:
+        paginator = PageNumberPagination()
+        paginator.page_size = per_page
+        try:
+            result_page = paginator.paginate_queryset(items, request)
+        except EmptyPage:
+            result_page = []
+    return paginator.get_paginated_response(menu_item_list_data(result_page))
+
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
-@throttle_classes([AnonRateThrottle, UserRateThrottle])
 def menu_items(request):
     if request.user.is_authenticated:
         if request.method == 'GET':
-            items = MenuItem.objects.all()
-            category_name = request.query_params.get('category')
-            to_price = request.query_params.get('to_price')
-            search = request.query_params.get('search')
-            ordering = request.query_params.get('ordering')
-            per_page = request.query_params.get('per_page', default=2)
-            page = request.query_params.get('page', default=1)
-            if category_name is not None:
-                items = items.filter(category__name=category_name)
-            if to_price is not None:
-                items = items.filter(price__lte=to_price)
-            if search is not None:
-                items = items.filter(title__icontains=search)
-            if ordering is not None:
-                ordering_fields = ordering.split(',')
-                items = items.order_by(*ordering_fields)
-            paginator = PageNumberPagination()
-            paginator.page_size = per_page
-            try:
-                result_page = paginator.paginate_queryset(items, request)
-            except EmptyPage:
-                result_page = []
-            serializer = MenuItemSerializer(result_page, many=True)
-            return paginator.get_paginated_response(serializer.data)
+            return cached_catalog_response(request, 'menu-items', lambda: menu_items_page(request))
         
         elif request.method == 'POST':
-            if request.user.groups.filter(name="Manager").exists():
+            if is_manager(request):
                 serializer = MenuItemCreateSerializer(data=request.data)
                 serializer.is_valid(raise_exception=True)
                 serializer.save()
+                bump_catalog_version()
                 return Response({ "message" : "Menu Item added successfully" }, status=status.HTTP_201_CREATED)
             else:
                 return Response({ "message" : "You do not have permission to add menu items" }, status=status.HTTP_403_FORBIDDEN)
     else: 
          if request.method == 'GET':
-            items = MenuItem.objects.all()
-            category_name = request.query_params.get('category')
-            to_price = request.query_params.get('to_price')
-            search = request.query_params.get('search')
-            ordering = request.query_params.get('ordering')
-            per_page = request.query_params.get('per_page', default=2)
-            page = request.query_params.get('page', default=1)
-            if category_name is not None:
-                items = items.filter(category__name=category_name)
-            if to_price is not None:
-                items = items.filter(price__lte=to_price)
-            if search is not None:
-                items = items.filter(title__icontains=search)
-            if ordering is not None:
-                ordering_fields = ordering.split(',')
-                items = items.order_by(*ordering_fields)
-            paginator = PageNumberPagination()
-            paginator.page_size = per_page
+            return cached_catalog_response(request, 'menu-items', lambda: menu_items_page(request))
+
+class MenuImportView(APIView):
+    permission_classes = [IsAuthenticated, ManagerRole]
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is not None:
+            file_format = 'csv' if upload.name.endswith('.csv') or upload.content_type == 'text/csv' else 'json'
             try:
-                result_page = paginator.paginate_queryset(items, request)
-            except EmptyPage:
-                result_page = []
-            serializer = MenuItemSerializer(result_page, many=True)
-            return paginator.get_paginated_response(serializer.data)
+                rows = read_menu_rows(upload.read(), file_format)
+            except (ValueError, csv.Error):
+                return Response({ "message" : "Could not read the uploaded file" }, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            rows = request.data.get('items', []) if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list):
+            return Response({ "message" : "Expected a list of menu items" }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(import_menu_rows(rows), status=status.HTTP_200_OK)
+
+class MenuExportView(APIView):
+    permission_classes = [IsAuthenticated, ManagerRole]
+    def get(self, request):
+        if request.query_params.get('as') == 'csv':
+            return stream_menu_csv()
+        return Response(menu_items_export())
 
 class SingleMenuItemView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = MenuItem.objects.all()
+    queryset = MenuItem.objects.select_related('category')
     serializer_class = MenuItemSerializer
     def get_permissions(self):
         permission_classes = [AllowAny]
@@ -149,19 +175,19 @@ class SingleMenuItemView(generics.RetrieveUpdateDestroyAPIView):
         return[permission() for permission in permission_classes]
     def patch(self, request, pk):
         self.permission_classes = [IsAuthenticated, ManagerRole]
-        self.throttle_classes = [UserRateThrottle]
         if MenuItem.objects.filter(id=pk).exists():
             serializer = MenuItemSerializer(MenuItem.objects.get(id=pk), data=request.data, partial=True)
             serializer.is_valid(raise_exception=True)
             serializer.save()
+            bump_catalog_version()
             return Response({ "message" : "Menu Item updated successfully" }, status=status.HTTP_200_OK)
         else:
             return Response({ "message" : "Menu item does not exist" }, status=status.HTTP_404_NOT_FOUND)
     def delete(self, request, pk):
         self.permission_classes = [IsAuthenticated, ManagerRole]
-        self.throttle_classes = [UserRateThrottle]
         if MenuItem.objects.filter(id=pk).exists():
             MenuItem.objects.get(id=pk).delete()
+            bump_catalog_version()
             return Response({ "message" : "Menu Item Removed" }, status=status.HTTP_200_OK)
         else:
             return Response({ "message" : "Menu item does not exist" }, status=status.HTTP_404_NOT_FOUND)
@@ -170,7 +196,11 @@ class UsersView(generics.CreateAPIView, generics.ListAPIView):
     queryset = User.objects.all()
     def get (self, request):
         serializer_class = UsersSerializer
-        if request.user.groups.filter(name="Manager").exists():
+        if is_manager(request):
+            if use_cursor_pagination(request):
+                paginator = UserCursorPagination()
+                page = paginator.paginate_queryset(User.objects.all(), request, view=self)
+                return paginator.get_paginated_response(serializer_class(page, many=True).data)
             return Response(serializer_class(get_list_or_404(User.objects.all()), many=True).data)
         else:
             return Response({ "message" : "You are not authorized" }, status=status.HTTP_403_FORBIDDEN)
@@ -183,7 +213,6 @@ class UsersView(generics.CreateAPIView, generics.ListAPIView):
 
 class CurrentUserView(APIView):
     permission_classes = [IsAuthenticated]
-    throttle_classes = [UserRateThrottle]
     def get(self, request):
         serializer_class = CurrentUserSerializer(request.user)
         return Response(serializer_class.data)
@@ -192,12 +221,11 @@ class ManagerUsersView(generics.ListAPIView, generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = ManagerUsersSerializer
     permission_classes = [ManagerRole]
-    throttle_classes = [UserRateThrottle]
     def get (self, request):
         return Response(self.serializer_class(get_list_or_404(User.objects.filter(groups__name= 'Manager')) , many=True).data)
     def post(self, request):
         userExist = User.objects.filter(username = request.data['username'])
-        managerGroup = Group.objects.get(name='Manager')
+        managerGroup = get_group(MANAGER)
         if userExist.exists():
             user = User.objects.get(username = request.data['username'])
             user.save()
@@ -211,11 +239,10 @@ class ManagerUserRemoveView(generics.DestroyAPIView):
     queryset = User.objects.all()
     serializer_class = ManagerUsersSerializer
     permission_classes = [IsAuthenticated, ManagerRole]
-    throttle_classes = [UserRateThrottle]
     def delete(self, request, pk):
         if User.objects.filter(pk = pk).exists():
             user = User.objects.get(pk = pk)
-            user.groups.remove(Group.objects.get(name='Manager'))
+            user.groups.remove(get_group(MANAGER))
             user.save()
             return Response({ "message" : "User removed from manager group" }, status=status.HTTP_200_OK)
         else:
@@ -225,12 +252,11 @@ class DeliverCrewUsersView(generics.ListAPIView, generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = DeliverCrewUsersSerializer
     permission_classes = [ManagerRole]
-    throttle_classes = [UserRateThrottle]
     def get (self, request):
         return Response(self.serializer_class(get_list_or_404(User.objects.filter(groups__name= 'Deliver Crew')) , many=True).data)
     def post(self, request):
         userExist = User.objects.filter(username = request.data['username'])
-        deliverCrewGroup = Group.objects.get(name='Deliver Crew')
+        deliverCrewGroup = get_group(DELIVER_CREW)
         if userExist.exists():
             user = User.objects.get(username = request.data['username'])
             user.save()
@@ -244,11 +270,10 @@ class DeliverCrewUserRemoveView(generics.DestroyAPIView):
     queryset = User.objects.all()
     serializer_class = DeliverCrewUsersSerializer
     permission_classes = [IsAuthenticated, ManagerRole]
-    throttle_classes = [UserRateThrottle]
     def delete(self, request, pk):
         if User.objects.filter(pk = pk).exists():
             user = User.objects.get(pk = pk)
-            user.groups.remove(Group.objects.get(name='Deliver Crew'))
+            user.groups.remove(get_group(DELIVER_CREW))
             user.save()
             return Response({ "message" : "User removed from deliver crew group" }, status=status.HTTP_200_OK)
         else:
@@ -257,12 +282,10 @@ class DeliverCrewUserRemoveView(generics.DestroyAPIView):
 class CartView(generics.ListAPIView, generics.CreateAPIView):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
-    throttle_classes = [UserRateThrottle]
     def get(self, request):
         user = request.user
-        queryset = Cart.objects.filter(user=user)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        queryset = Cart.objects.filter(user=user).values(*CART_VALUES)
+        return Response(cart_list_data(queryset))
     
     def post(self, request, *arg, **kwargs):
         serializer= CartCreateSerializer(data=request.data)
@@ -291,88 +314,191 @@ class CartView(generics.ListAPIView, generics.CreateAPIView):
             Cart.objects.filter(user=user).delete()
             return Response({ "message" : "All items removed from cart successfully" }, status=status.HTTP_200_OK)
         
+class CartBatchView(APIView):
+    permission_classes = [IsAuthenticated]
+    def post(self, request):
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lines = serializer.validated_data.get('items', [])
+        remove = serializer.validated_data.get('remove', [])
+        prices = dict(MenuItem.objects.filter(id__in=[line['item'] for line in lines]).values_list('id', 'price'))
+        missing = [line['item'] for line in lines if line['item'] not in prices]
+        if missing:
+            return Response({ "message" : "Menu items do not exist", "items" : missing }, status=status.HTTP_404_NOT_FOUND)
+        with transaction.atomic():
+            if remove:
+                Cart.objects.filter(user=request.user, item_id__in=remove).delete()
+            if lines:
+                Cart.objects.bulk_create(
+                    [Cart(user=request.user, item_id=line['item'], quantity=line['quantity'], itemprice=line['quantity'] * prices[line['item']]) for line in lines],
+                    update_conflicts=True,
+                    unique_fields=['user', 'item'],
+                    update_fields=['quantity', 'itemprice'],
+                )
+        cart = Cart.objects.select_related('item').filter(user=request.user)
+        return Response(CartSerializer(cart, many=True).data, status=status.HTTP_200_OK)
+
+def filter_orders(request, queryset):
+    customer = request.query_params.get('customer')
+    deliver_crew = request.query_params.get('deliver_crew')
+    status = request.query_params.get('status')
+    ordering = request.query_params.get('ordering')
+    if customer :
+        queryset = queryset.filter(customer__username=customer)
+    if deliver_crew :
+        queryset = queryset.filter(deliver_crew__username=deliver_crew)
+    if status:
+        queryset = queryset.filter(status=status)
+    if ordering:
+        queryset = queryset.order_by(ordering)
+    return queryset
+
+def price_order_lines(order_id, items_data):
+    # Fills in each line's title and price and returns the order's total, or None if an item is not on the menu.
+    # Items already on the order keep the price they were ordered at; only new ones are priced from the menu, in one query.
+    prices = {
+        item_id: (title, price)
+        for item_id, title, price in OrderLine.objects.filter(order_id=order_id).values_list('item', 'title', 'price')
+    }
+    new_item_ids = {int(item['item']) for item in items_data} - prices.keys()
+    prices.update((item_id, (title, price)) for item_id, title, price in MenuItem.objects.filter(id__in=new_item_ids).values_list('id', 'title', 'price'))
+    total = Decimal('0.00')
+    for item in items_data:
+        if int(item['item']) not in prices:
+            return None
+        item['title'], item['price'] = prices[int(item['item'])]
+        total += int(item['quantity']) * item['price']
+    return total
+
 class OrdersView(generics.ListAPIView, generics.CreateAPIView):
     serializer_class = OrderSerializer
     queryset = Order.objects.all()
     permission_classes = [IsAuthenticated]
-    throttle_classes = [UserRateThrottle]
     def get(self, request):
-        if self.request.user.groups.filter(name='Manager').exists():
-            customer = request.query_params.get('customer')
-            deliver_crew = request.query_params.get('deliver_crew')
-            status = request.query_params.get('status')
-            ordering = request.query_params.get('ordering')
-            queryset = Order.objects.all()
-            if customer :
-                queryset = queryset.filter(customer__username=customer)
-            if deliver_crew :
-                queryset = queryset.filter(deliver_crew__username=deliver_crew)
-            if status:
-                queryset = queryset.filter(status=status)
-            if ordering:
-                queryset = queryset.order_by(ordering)  
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data)
+        if is_manager(self.request):
+            queryset = filter_orders(request, Order.objects.all())
+            return self.list_orders(request, queryset)
         else:
-            if self.request.user.groups.filter(name='Deliver Crew').exists():
+            if is_deliver_crew(self.request):
                 queryset = Order.objects.filter(deliver_crew=request.user)
-                serializer = OrderDeliverCrewSerializer(queryset, many=True)
-                return Response(serializer.data)
+                return self.list_orders(request, queryset, deliver_crew_view=True)
             else:
                 customer = request.user
                 queryset = Order.objects.filter(customer=customer)
-                serializer = self.get_serializer(queryset, many=True)
-                return Response(serializer.data)
+                return self.list_orders(request, queryset)
+    @reads_from_replica()
+    def list_orders(self, request, queryset, deliver_crew_view=False):
+        if use_cursor_pagination(request):
+            paginator = OrderCursorPagination()
+            page = paginator.paginate_queryset(order_values(queryset), request, view=self)
+            return paginator.get_paginated_response(order_list_data(page, deliver_crew_view))
+        return Response(order_list_data(queryset, deliver_crew_view))
     def post(self, request, format=None):
-        if(Cart.objects.filter(user=request.user).count() == 0):
-            return Response({ "message" : "Cart is empty" }, status=status.HTTP_400_BAD_REQUEST)
-        else: 
-            customer = request.user
-            cart_items = Cart.objects.filter(user=customer)
-            total = math.fsum([item.itemprice for item in cart_items])
-            date = datetime.now()
+        customer = request.user
+        with transaction.atomic():
+            cart_items = list(Cart.objects.select_for_update(of=('self',)).filter(user=customer).values('id', 'item_id', 'item__title', 'quantity', 'itemprice'))
+            if len(cart_items) == 0:
+                return Response({ "message" : "Cart is empty" }, status=status.HTTP_400_BAD_REQUEST)
+            cart_ids = [item['id'] for item in cart_items]
+            total = Cart.objects.filter(id__in=cart_ids).aggregate(total=Sum('itemprice'))['total']
             items_data = [
                 {
-                    "customer_id": customer.id,
-                    "item_id": item.item.id,
-                    "quantity": item.quantity,
+                    "item_id": item['item_id'],
+                    "quantity": item['quantity'],
+                    # itemprice is the line total, as priced when the item went into the cart.
+                    "title": item['item__title'],
+                    "price": (item['itemprice'] / item['quantity']).quantize(Decimal('0.01')),
                 }
                 for item in cart_items
             ]
             order_data = {
                 "customer_id": customer.id,
-                "customer": customer.id,
                 "total": total,
-                "date": date,
                 "items": items_data,
             }
             serialized_order = OrderSerializer(data=order_data)
             serialized_order.is_valid(raise_exception=True)
-            serialized_order.save()
-            Cart.objects.filter(user=customer).delete()
-            return Response({ "message" : "Order created successfully" }, status=status.HTTP_201_CREATED)
+            order = serialized_order.save()
+            # A concurrent checkout that already consumed these cart rows wins; undo this one.
+            deleted, _ = Cart.objects.filter(id__in=cart_ids).delete()
+            if deleted != len(cart_ids):
+                transaction.set_rollback(True)
+                return Response({ "message" : "Cart changed during checkout" }, status=status.HTTP_409_CONFLICT)
+            # The order and its lines are all new, so there is nothing to count before.
+            rollups.apply(rollups.snapshot([]), rollups.snapshot([order.id], Q(order=order.id)))
+            enqueue_on_commit('order_receipt', order_id=order.id)
+        return Response({ "message" : "Order created successfully" }, status=status.HTTP_201_CREATED)
+
+class OrdersExportView(APIView):
+    permission_classes = [IsAuthenticated, ManagerRole]
+    def get(self, request):
+        export_format = request.query_params.get('as', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            return Response({ "message" : "Export format must be ndjson or csv" }, status=status.HTTP_400_BAD_REQUEST)
+        queryset = filter_orders(request, Order.objects.with_items().order_by('id'))
+        return stream_orders(queryset, export_format)
+
+class SalesReportView(APIView):
+    permission_classes = [IsAuthenticated, ManagerRole]
+    def get(self, request):
+        days = DailySales.objects.all()
+        try:
+            if request.query_params.get('from'):
+                days = days.filter(day__gte=date.fromisoformat(request.query_params['from']))
+            if request.query_params.get('to'):
+                days = days.filter(day__lte=date.fromisoformat(request.query_params['to']))
+            top = min(int(request.query_params.get('top', 10)), 100)
+        except ValueError:
+            return Response({ "message" : "from and to must be YYYY-MM-DD dates and top a number" }, status=status.HTTP_400_BAD_REQUEST)
+        def totals(field, name=None):
+            rows = days.values(field).annotate(orders=Sum('orders'), revenue=Sum('revenue')).filter(orders__gt=0).order_by(field)
+            return [{ name or field : row[field], "orders" : row['orders'], "revenue" : str(row['revenue'].quantize(Decimal('0.01'))) } for row in rows]
+        # Item quantities are kept for all time; from and to only narrow the order figures.
+        top_items = ItemSales.objects.select_related('item').filter(quantity__gt=0).order_by('-quantity', 'item_id')[:top]
+        return Response({
+            "days" : totals('day'),
+            "status" : totals('status'),
+            "deliver_crew" : totals('deliver_crew__username', 'deliver_crew'),
+            "top_items" : [{ "item" : row.item_id, "title" : row.item.title, "quantity" : row.quantity } for row in top_items],
+        })
+
+class MetricsView(APIView):
+    permission_classes = [IsAuthenticated, ManagerRole]
+    def get(self, request):
+        # Make this worker's latest numbers part of the scrape.
+        metrics_store.flush(force=True)
+        return HttpResponse(metrics_store.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 class OrderView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = OrderSerializer
     queryset = Order.objects.all()
     permission_classes = [IsAuthenticated]
-    throttle_classes = [UserRateThrottle]
     def get(self, request, pk):
-        if self.request.user.groups.filter(name='Manager').exists():
-            order = Order.objects.filter(pk=pk).first()
+        if is_manager(self.request):
+            order = Order.objects.with_items().filter(pk=pk).first()
             if order is not None:
                 return Response(self.get_serializer(order).data)
             else:
                 return Response({ "message" : "Order does not exist" }, status=status.HTTP_404_NOT_FOUND)
         else:
-            customer_orders = Order.objects.filter(customer=request.user)
+            customer_orders = Order.objects.with_items().filter(customer=request.user)
             order = customer_orders.filter(pk=pk).first()
             if order is not None:    
                 return Response(self.get_serializer(order).data)
             else:
                 return Response({ "message" : "Order does not exist" }, status=status.HTTP_404_NOT_FOUND)
     def patch(self, request, pk):
-        if self.request.user.groups.filter(name='Deliver Crew').exists() :
+        lines = Q(order=pk) if 'items' in request.data else None
+        with transaction.atomic():
+            before = rollups.snapshot([pk], lines)
+            response = self.update_order(request, pk)
+            if response.status_code == status.HTTP_200_OK:
+                rollups.apply(before, rollups.snapshot([pk], lines))
+                if str(request.data.get('status')) == '1':
+                    enqueue_on_commit('order_delivered', order_id=pk)
+        return response
+    def update_order(self, request, pk):
+        if is_deliver_crew(self.request):
             order = Order.objects.filter(pk=pk).first()
             if order is not None:
                 if len(request.data) > 2:
@@ -388,14 +514,15 @@ class OrderView(generics.RetrieveUpdateDestroyAPIView):
             else:
                 return Response({ "message" : "Order does not exist" }, status=status.HTTP_400_BAD_REQUEST)
         else:
-            if self.request.user.groups.filter(name='Manager').exists() :
+            if is_manager(self.request):
                 order = Order.objects.get(pk=pk)
                 if order is not None:
                     if 'items' in request.data: 
                         items_data = request.data['items']
-                        order_data = [ { "item" : OrderItemCartSerializer(MenuItemSerializer(MenuItem.objects.get(id=item['item'])).data).data, "quantity" : item['quantity'] } for item in items_data]
-                        total = str(math.fsum([ int(item['quantity']) * Decimal(item['item']['price']) for item in order_data]))
-                        request.data['total'] = total
+                        total = price_order_lines(pk, items_data)
+                        if total is None:
+                            return Response({ "message" : "Menu item does not exist" }, status=status.HTTP_400_BAD_REQUEST)
+                        request.data['total'] = str(total)
                         request.data['customer_id'] = order.customer.id
                         serializer = OrderUpdateCompleteManagerSerializer(order, data=request.data, partial=True)
                         serializer.is_valid(raise_exception=True)
@@ -417,9 +544,10 @@ class OrderView(generics.RetrieveUpdateDestroyAPIView):
                     else:
                         if 'items' in request.data:
                             items_data = request.data['items']
-                            order_data = [ { "item" : OrderItemCartSerializer(MenuItemSerializer(MenuItem.objects.get(id=item['item'])).data).data, "quantity" : item['quantity'] } for item in items_data]
-                            total = str(math.fsum([ int(item['quantity']) * Decimal(item['item']['price']) for item in order_data]))
-                            request.data['total'] = total
+                            total = price_order_lines(pk, items_data)
+                            if total is None:
+                                return Response({ "message" : "Menu item does not exist" }, status=status.HTTP_400_BAD_REQUEST)
+                            request.data['total'] = str(total)
                             request.data['customer_id'] = order.customer.id
                             serializer = OrderUpdateCustomerSerializer(order, data=request.data, partial=True)
                             serializer.is_valid(raise_exception=True)
@@ -428,10 +556,14 @@ class OrderView(generics.RetrieveUpdateDestroyAPIView):
                         else: 
                             return Response({ "message" : "Unauthorized to update the order" }, status=status.HTTP_401_UNAUTHORIZED)                   
     def delete(self, request, pk):
-        if self.request.user.groups.filter(name='Manager').exists() :
+        if is_manager(self.request):
             order = Order.objects.filter(pk=pk).first()
             if order is not None:
-                order.delete()
+                with transaction.atomic():
+                    before = rollups.snapshot([pk], Q(order=pk))
+                    order.delete()
+                    # Nothing of a deleted order is left to count.
+                    rollups.apply(before, rollups.snapshot([]))
                 return Response({ "message" : "Order deleted successfully" }, status=status.HTTP_200_OK)
             else:
                 return Response({ "message" : "Order does not exist" }, status=status.HTTP_404_NOT_FOUND)
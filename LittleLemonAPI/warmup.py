@@ -0,0 +1,103 @@
+import asyncio
+import gc
+import threading
+import time
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.db import connections
+from django.urls import get_resolver
+from rest_framework.serializers import BaseSerializer
+from . import serializers
+from .catalog import get_catalog_version
+from .fast_serializers import menu_item_values, menu_item_list_data
+from .models import Category, MenuItem
+from .renderers import ORJSONRenderer
+from .roles import MANAGER, DELIVER_CREW, get_group, prime_roles
+
+# What the first requests of a fresh worker would otherwise pay for, done before it serves any.
+
+def warm_urls():
+    # Compiles every route's pattern and builds the reverse lookup tables.
+    get_resolver().reverse_dict
+
+def warm_serializers():
+    # Fields are built per serializer instance, but the first build of each fills the per-model
+    # metadata Django and DRF keep for good.
+    for serializer_class in vars(serializers).values():
+        if isinstance(serializer_class, type) and issubclass(serializer_class, BaseSerializer) and serializer_class.__module__ == serializers.__name__:
+            serializer_class().fields
+    ORJSONRenderer().render({'warm': [1, '1.00']})
+
+def warm_content_types():
+    ContentType.objects.get_for_models(*apps.get_models())
+
+def warm_roles():
+    for name in (MANAGER, DELIVER_CREW):
+        try:
+            get_group(name)
+        except Group.DoesNotExist:
+            pass
+    prime_roles()
+
+def warm_catalog():
+    # The first menu page and the categories, on every database (the replica too), so the first
+    # catalog requests find compiled queries and the database files in the OS cache.
+    get_catalog_version()
+    for alias in connections:
+        items = menu_item_values(MenuItem.objects.using(alias).select_related('category').order_by('id'))
+        items.count()
+        menu_item_list_data(items[:2])
+        serializers.CategorySerializer(Category.objects.using(alias).all(), many=True).data
+
+def warm_caches():
+    # Opens the client of every configured cache backend.
+    for alias in settings.CACHES:
+        caches[alias].get('littlelemon:warmup')
+
+STEPS = [
+    ('urls', warm_urls),
+    ('serializers', warm_serializers),
+    ('caches', warm_caches),
+    ('content types', warm_content_types),
+    ('roles', warm_roles),
+    ('catalog', warm_catalog),
+]
+
+def run_steps():
+    # (step, seconds, error) for each step. A step that fails, say on a database that is not migrated
+    # yet, is reported and skipped: warming up must never keep a worker from starting.
+    report = []
+    try:
+        for name, step in STEPS:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as exc:
+                report.append((name, time.perf_counter() - start, exc))
+            else:
+                report.append((name, time.perf_counter() - start, None))
+    finally:
+        # A server that forks its workers after loading the application must not hand them these.
+        connections.close_all()
+    return report
+
+def warm_up():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        report = run_steps()
+    else:
+        # ASGI servers import the application inside their event loop, where the ORM refuses to run.
+        # Nothing is being served yet, so the loop can wait for a thread to do it.
+        report = []
+        thread = threading.Thread(target=lambda: report.extend(run_steps()))
+        thread.start()
+        thread.join()
+    # What exists by now lives as long as the worker. Kept out of the collector's passes, it is not
+    # written to by them either, so forked workers keep sharing those pages instead of copying them.
+    gc.collect()
+    gc.freeze()
+    return report